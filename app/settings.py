@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,12 +44,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tournaments.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tournaments.middleware.ProfilingMiddleware',
+    'tournaments.middleware.ConcurrencyLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tournaments.middleware.TrafficRecordMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -83,6 +88,71 @@ DATABASES = {
     }
 }
 
+# Профиль БД для боевого запуска: DJANGO_DATABASE_PROFILE=production
+DATABASE_PROFILE = os.environ.get('DJANGO_DATABASE_PROFILE', 'development')
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        # Соединение живёт между запросами, а не открывается заново на каждый
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # timeout - это busy_timeout SQLite в секундах
+            'timeout': 20,
+            # Блокировка на запись берётся в начале транзакции, а не посреди неё
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    })
+
+# Повторы записи при "database is locked"
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_BACKOFF = 0.05
+
+
+# Кеши: default - для ограничений входа и прочего, sessions - слой над сессиями в БД.
+# Сессия из локального кеша видна только своему процессу, поэтому при нескольких
+# воркерах (uvicorn --workers) сессии кешируются в файлах, общих для всех процессов.
+# Бэкенды из tournaments.cache - стандартные, со счётчиком попаданий для /metrics
+
+CACHES = {
+    'default': {
+        'BACKEND': 'tournaments.cache.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'tournaments.cache.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+    # Корзины ограничения попыток входа (tournaments.throttling)
+    'throttle': {
+        'BACKEND': 'tournaments.cache.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+if DATABASE_PROFILE == 'production':
+    CACHES['sessions'] = {
+        'BACKEND': 'tournaments.cache.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+    # Общий для воркеров uvicorn: с кешем в памяти каждый процесс вёл бы свою корзину
+    CACHES['throttle'] = {
+        'BACKEND': 'tournaments.cache.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'throttle',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+
+# Чтение сессии - из кеша, запись - в кеш и в БД (django_session остаётся источником истины)
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,4 +195,178 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_ROOT = BASE_DIR / "media"
-MEDIA_URL = "/media/"
\ No newline at end of file
+MEDIA_URL = "/media/"
+
+# Загрузки Team.logo и Player.photo хранятся по хешу содержимого (tournaments.storage)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    "media": {
+        "BACKEND": "tournaments.storage.ContentAddressedStorage",
+    },
+}
+
+
+# Журнал трафика для нагрузочного воспроизведения (команда replay_traffic)
+
+TRAFFIC_LOG_ENABLED = False
+TRAFFIC_LOG_PATH = BASE_DIR / "traffic.jsonl"
+
+# Лимиты SQL-запросов на действия вьюсетов (атрибут query_budget): "log", "raise" или "off"
+
+QUERY_BUDGET_MODE = "log"
+
+# Лента событий матчей (SSE)
+
+LIVE_FEED_QUEUE_SIZE = 100
+LIVE_FEED_BACKLOG = 1000
+LIVE_FEED_KEEPALIVE = 15
+LIVE_FEED_RETRY_MS = 3000
+
+# Производные изображения (миниатюры, WebP) строятся в фоновом потоке после загрузки
+
+IMAGE_DERIVATIVES_ASYNC = True
+
+# Раздача медиа (tournaments.views.serve_media): None - отдаёт приложение,
+# "x-accel-redirect" (nginx, internal location MEDIA_ACCEL_PREFIX) или "x-sendfile" (Apache, lighttpd)
+
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = "/protected-media/"
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Ограничение попыток входа и проверки TOTP (tournaments.throttling), корзина токенов в кеше:
+# "N/min" - всплеск до N попыток, дальше не чаще N в минуту. None отключает ограничение
+
+LOGIN_THROTTLE_RATES = {
+    "login_ip": "30/min",
+    "login_username": "5/min",
+    "totp_ip": "30/min",
+    "totp_user": "5/min",
+}
+# Каталог файлов блокировок корзин (flock), общий для процессов; None - блокировка только внутри процесса
+THROTTLE_LOCK_DIR = BASE_DIR / "locks"
+
+# Очередь фоновых задач в БД (tournaments.tasks, воркер run_tasks)
+
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 30
+
+# Админка: начиная с этого числа строк список без фильтров показывает примерное количество
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 50000
+
+# Импорт матчей и команд из CSV/XLSX (tournaments.importer): строк в одной транзакции,
+# каталог отчётов об ошибках (вне MEDIA_ROOT - отчёты отдаются только администраторам)
+# и срок хранения отчётов в секундах (старые удаляются при следующем импорте)
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_REPORTS_DIR = BASE_DIR / "import_reports"
+IMPORT_REPORTS_MAX_AGE = 7 * 86400
+
+# Upsert внешних лент результатов (/api/teams|tournaments|matches/upsert/): записей за запрос
+
+UPSERT_MAX_BATCH = 1000
+
+# Лента изменений /api/changes/: записей журнала на страницу (и максимум для ?limit=)
+
+CHANGE_FEED_LIMIT = 500
+
+# Вебхуки (tournaments.webhooks, воркер deliver_webhooks): событий в пачке, таймаут запроса, с,
+# задержка повтора (удваивается до WEBHOOK_MAX_RETRY_DELAY), неудач подряд до отключения подписки,
+# одновременных запросов на один хост и всего, сколько секунд отключённая подписка удерживает события в очереди
+
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_TIMEOUT = 5
+WEBHOOK_RETRY_DELAY = 10
+WEBHOOK_MAX_RETRY_DELAY = 3600
+WEBHOOK_MAX_ATTEMPTS = 10
+WEBHOOK_HOST_CONCURRENCY = 2
+WEBHOOK_WORKERS = 8
+WEBHOOK_DISABLED_RETENTION = 7 * 86400
+
+# Профилирование запросов администраторами (X-Profile: cpu,mem, см. tournaments.profiling):
+# каталог снимков (вне MEDIA_ROOT), сколько последних снимков хранить,
+# строк в топе выделений памяти и глубина трассировки tracemalloc
+
+PROFILES_DIR = BASE_DIR / "profiles"
+PROFILES_MAX_CAPTURES = 20
+PROFILE_TOP_ALLOCATIONS = 25
+PROFILE_TRACEBACK_FRAMES = 1
+
+# Метрики (tournaments.metrics, /metrics в формате Prometheus). При нескольких процессах
+# каждый сбрасывает свои значения в METRICS_DIR раз в METRICS_FLUSH_INTERVAL секунд,
+# /metrics суммирует все файлы; None - только метрики текущего процесса.
+# /metrics доступен администраторам и с адресов METRICS_ALLOWED_IPS
+
+METRICS_DIR = BASE_DIR / "metrics" if DATABASE_PROFILE == "production" else None
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Журнал медленных SQL-запросов (tournaments.slowlog, сводка - команда slow_queries):
+# порог в миллисекундах (None - выключен), файл с ротацией по размеру
+
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_LOG_PATH = BASE_DIR / "slow_queries.log"
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUP_COUNT = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_QUERY_LOG_PATH,
+            "maxBytes": SLOW_QUERY_LOG_MAX_BYTES,
+            "backupCount": SLOW_QUERY_LOG_BACKUP_COUNT,
+            "encoding": "utf-8",
+            "delay": True,
+            "formatter": "message",
+        },
+    },
+    "loggers": {
+        "tournaments.slow_queries": {
+            "handlers": ["slow_queries"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
+# Бюджет времени импорта при старте воркера (django.setup() и app.urls), мс:
+# проверяют тест и команда import_time --check
+
+IMPORT_TIME_BUDGET_MS = 1000
+
+# Ограничение одновременных дорогих запросов (ConcurrencyLimitMiddleware, атрибут вьюсета
+# concurrency_class): limit - слотов на класс для всех процессов, timeout - сколько секунд
+# запрос ждёт слот до ответа 503, target - целевое время запроса, при превышении которого
+# число слотов временно уменьшается. Слоты - файлы под flock в CONCURRENCY_LOCK_DIR
+
+CONCURRENCY_LIMITS = {
+    "export": {"limit": 2, "timeout": 0, "target": 10.0},
+    "stats": {"limit": 4, "timeout": 2, "target": 1.0},
+    "list": {"limit": 8, "timeout": 5, "target": 1.0},
+}
+CONCURRENCY_LOCK_DIR = BASE_DIR / "locks"
+
+# Прогноз турнира (/api/tournaments/{id}/forecast/): число симулированных завершений,
+# время жизни кеша (кеш сбрасывается и при изменении любого матча) и число процессов
+# для симуляции; 1 - в процессе запроса
+
+FORECAST_SIMULATIONS = 20000
+FORECAST_CACHE_TIMEOUT = 600
+FORECAST_PROCESSES = 1
+# Ячеек (прогоны x оставшиеся матчи) в одном блоке симуляции: около 30 байт на ячейку
+FORECAST_CHUNK_CELLS = 1000000
+
+# Генерация расписания турнира (/api/tournaments/{id}/schedule/): предел числа команд
+
+SCHEDULE_MAX_TEAMS = 256
@@ -1,9 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from tournaments import views
 from rest_framework.routers import DefaultRouter
-from tournaments.api import TeamsViewSet, PlayersViewSet, TournamentsViewSet, MatchesViewSet, TournamentCategoriesViewSet, UserViewSet
-from django.conf.urls.static import static
+from tournaments.api import TeamsViewSet, PlayersViewSet, TournamentsViewSet, MatchesViewSet, TournamentCategoriesViewSet, UserViewSet, StatsViewSet, ChangesViewSet, ProfilesViewSet
 from django.conf import settings
 
 router = DefaultRouter()
@@ -13,9 +12,15 @@ router.register("tournament-categories", TournamentCategoriesViewSet, basename="
 router.register("tournaments", TournamentsViewSet, basename="tournaments")
 router.register("matches", MatchesViewSet, basename="matches")
 router.register("user", UserViewSet, basename="user")
+router.register("stats", StatsViewSet, basename="stats")
+router.register("changes", ChangesViewSet, basename="changes")
+router.register("profiles", ProfilesViewSet, basename="profiles")
 
 urlpatterns = [
     path('', views.ShowTournamentsView.as_view()),
     path('admin/', admin.site.urls),
+    path('metrics', views.metrics),
+    path('api/async/', include('tournaments.async_api')),
     path('api/', include(router.urls)), 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), views.serve_media),
+]
@@ -0,0 +1,45 @@
+import axios from "axios";
+
+// Дельта-синхронизация списка через /api/changes/: после первой полной загрузки
+// запрашиваются только изменения с последнего курсора.
+export function useChangeFeed(type, list, reload) {
+    let cursor = null;
+
+    async function sync() {
+        if (cursor === null) {
+            // Курсор берётся до загрузки, чтобы не потерять изменения во время неё
+            const r = await axios.get("/api/changes/");
+            cursor = r.data.cursor;
+            await reload();
+            return;
+        }
+        let hasMore = true;
+        while (hasMore) {
+            const r = await axios.get("/api/changes/", { params: { since: cursor } });
+            if (r.data.reset) {
+                cursor = r.data.cursor;
+                await reload();
+                return;
+            }
+            for (const change of r.data.changes) {
+                if (change.type !== type) {
+                    continue;
+                }
+                const index = list.value.findIndex((item) => item.id === change.id);
+                if (change.op === "delete") {
+                    if (index !== -1) {
+                        list.value.splice(index, 1);
+                    }
+                } else if (index !== -1) {
+                    list.value[index] = change.data;
+                } else {
+                    list.value.push(change.data);
+                }
+            }
+            cursor = r.data.cursor;
+            hasMore = r.data.has_more;
+        }
+    }
+
+    return { sync };
+}
@@ -1,22 +1,124 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Team, Player, Tournament, Match, TournamentCategory
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Max, QuerySet
+from django.utils.functional import cached_property
+from .models import Team, Player, Tournament, Match, ArchivedMatch, TournamentCategory, Task, ChangeLog, WebhookSubscription, WebhookEvent
+
+
+def estimate_row_count(model):
+    """
+    Примерное число строк таблицы без COUNT(*): из статистики ANALYZE (sqlite_stat1,
+    её обновляет команда db_maintenance), а если её нет - по максимальному id.
+    """
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [model._meta.db_table])
+                row = cursor.fetchone()
+        except DatabaseError:
+            row = None
+        if row:
+            return int(row[0].split()[0])
+    return model._default_manager.aggregate(max_id=Max('pk'))['max_id'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для больших таблиц без фильтров показывает примерное число записей вместо COUNT(*)"""
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if isinstance(object_list, QuerySet) and not object_list.query.where:
+            estimate = estimate_row_count(object_list.model)
+            if estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Без второго COUNT(*) по всей таблице при поиске и фильтрах
+    show_full_result_count = False
+
 
 @admin.register(Team)
-class TeamsAdmin(admin.ModelAdmin):
+class TeamsAdmin(LargeTableAdmin):
     list_display = ['id', 'name', 'created_at']
+    search_fields = ['^name']
 
 @admin.register(Player)
-class PlayersAdmin(admin.ModelAdmin):
+class PlayersAdmin(LargeTableAdmin):
     list_display = ['id', 'name', 'nickname', 'team']
+    list_select_related = ['team']
+    search_fields = ['^name', '^nickname']
+    autocomplete_fields = ['team']
+    raw_id_fields = ['user']
 
 @admin.register(TournamentCategory)
 class TournamentCategoriesAdmin(admin.ModelAdmin):
     list_display = ['id', 'name']
+    search_fields = ['name']
 
 @admin.register(Tournament)
-class TournamentsAdmin(admin.ModelAdmin):
+class TournamentsAdmin(LargeTableAdmin):
     list_display = ['id', 'name', 'category', 'start_date', 'end_date']
+    list_select_related = ['category']
+    search_fields = ['^name']
+    autocomplete_fields = ['category']
 
 @admin.register(Match)
-class MatchesAdmin(admin.ModelAdmin):
-    list_display = ['id', 'tournament', 'team1', 'team2', 'match_date', 'team1_score', 'team2_score', 'winner']
\ No newline at end of file
+class MatchesAdmin(LargeTableAdmin):
+    list_display = ['id', 'tournament', 'team1', 'team2', 'match_date', 'team1_score', 'team2_score', 'winner']
+    list_select_related = ['tournament', 'team1', 'team2', 'winner']
+    search_fields = ['^tournament__name']
+    date_hierarchy = 'match_date'
+    autocomplete_fields = ['tournament', 'team1', 'team2', 'winner']
+
+@admin.register(ArchivedMatch)
+class ArchivedMatchesAdmin(LargeTableAdmin):
+    list_display = ['id', 'tournament', 'team1', 'team2', 'match_date', 'team1_score', 'team2_score', 'winner']
+    list_select_related = ['tournament', 'team1', 'team2', 'winner']
+    search_fields = ['^tournament__name']
+    date_hierarchy = 'match_date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Task)
+class TasksAdmin(LargeTableAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'name']
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(LargeTableAdmin):
+    list_display = ['id', 'model', 'object_id', 'deleted', 'created_at']
+    list_filter = ['model', 'deleted']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionsAdmin(admin.ModelAdmin):
+    list_display = ['id', 'url', 'active', 'tournament', 'cursor', 'attempts', 'next_attempt_at']
+    list_filter = ['active']
+    readonly_fields = ['cursor', 'attempts', 'next_attempt_at', 'last_error']
+    raw_id_fields = ['tournament']
+
+@admin.register(WebhookEvent)
+class WebhookEventsAdmin(LargeTableAdmin):
+    list_display = ['id', 'event_type', 'tournament_id', 'created_at']
+    list_filter = ['event_type']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
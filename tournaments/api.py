@@ -1,21 +1,37 @@
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 import io
-import pyotp
+import json
+from dataclasses import asdict
 from rest_framework import status
-from django.utils import timezone
-from datetime import timedelta
-import random
 from rest_framework.viewsets import GenericViewSet
 from rest_framework import mixins, viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
+from rest_framework.reverse import reverse
 from rest_framework.response import Response
+from rest_framework.renderers import BaseRenderer
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework import serializers
-from django.db.models import Q, Count, Avg, Max, Min
+from django.db.models import Q
 from django.contrib.auth import authenticate, login, logout
 
-from .models import Team, Player, Tournament, Match, TournamentCategory
+from .changes import read_changes
+from .archive import TRUE_VALUES, filter_match_dates, include_archived, merge_matches, parse_date_range
+from .db import LockRetryMixin
+from .events import Subscription, stream_events, parse_last_event_id
+from .forecast import get_forecast
+from .scheduler import FORMATS, schedule_tournament
+from .profiling import CAPTURE_ID, cpu_summary, list_captures, profile_storage
+from .importer import ImportFileError, import_file, report_storage
+from .upsert import TeamUpsert, TournamentUpsert, MatchUpsert
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, TotpIPThrottle, TotpUserThrottle
+from .stats import (
+    get_team_stats, get_player_stats, get_category_stats,
+    get_tournament_stats, get_match_stats, get_summary_stats
+)
+from .models import Team, Player, Tournament, Match, ArchivedMatch, TournamentCategory
 from .serializers import (
     TeamsCRSerializer, TeamsUDSerializer,
     PlayersCRSerializer, PlayersUDSerializer,
@@ -24,6 +40,15 @@ from .serializers import (
     TournamentCategoriesCRSerializer, TournamentCategoriesUDSerializer
 )
 
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Сам поток отдаёт StreamingHttpResponse, сюда попадают только ошибки
+        return json.dumps(data, ensure_ascii=False).encode()
+
 class UserViewSet(viewsets.GenericViewSet):
     permission_classes = [permissions.AllowAny]
 
@@ -44,7 +69,8 @@ class UserViewSet(viewsets.GenericViewSet):
         
         return Response(user_info)
 
-    @action(detail=False, url_path="login", methods=["POST"])
+    @action(detail=False, url_path="login", methods=["POST"],
+            throttle_classes=[LoginIPThrottle, LoginUsernameThrottle])
     def login_user(self, request, *args, **kwargs):
         username = self.request.data['username']
         password = self.request.data['password']
@@ -60,8 +86,11 @@ class UserViewSet(viewsets.GenericViewSet):
             'success': False,
         })
     
-    @action(url_path="get-totp", methods=['GET'], detail=False)
+    @action(url_path="get-totp", methods=['GET'], detail=False,
+            throttle_classes=[TotpIPThrottle, TotpUserThrottle])
     def get_totp(self, *args, **kwargs):
+        import pyotp
+
         player = Player.objects.get(user=self.request.user)
         player.totp_key = pyotp.random_base32()
         player.save()
@@ -73,8 +102,11 @@ class UserViewSet(viewsets.GenericViewSet):
             "url": url
         })
     
-    @action(detail=False, url_path="second-login", methods=["POST"])
+    @action(detail=False, url_path="second-login", methods=["POST"],
+            throttle_classes=[TotpIPThrottle, TotpUserThrottle])
     def second_login(self, *args, **kwargs):
+        import pyotp
+
         player = Player.objects.get(user=self.request.user) 
         key = player.totp_key  
         t = pyotp.totp.TOTP(key)
@@ -85,6 +117,10 @@ class UserViewSet(viewsets.GenericViewSet):
                 'success': True,
             })
 
+        return Response({
+            'success': False,
+        })
+
     @action(detail=False, url_path="logout", methods=["POST"])
     def logout_user(self, request, *args, **kwargs):
         request.session.flush()
@@ -93,7 +129,18 @@ class UserViewSet(viewsets.GenericViewSet):
             'success': True,
         }, status=status.HTTP_200_OK)
 
+class UpsertMixin:
+    """Действие upsert: пачка записей внешней ленты по external_id (см. tournaments.upsert)"""
+    upsert_class = None
+
+    @action(detail=False, methods=['POST'], url_path='upsert')
+    def upsert(self, request, *args, **kwargs):
+        result = self.upsert_class(request.data).run()
+        return Response(asdict(result))
+
 class TeamsViewSet(
+    LockRetryMixin,
+    UpsertMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.RetrieveModelMixin,
@@ -103,8 +150,13 @@ class TeamsViewSet(
 ):
     queryset = Team.objects.all()
     serializer_class = TeamsCRSerializer
+    upsert_class = TeamUpsert
+    query_budget = {"list": 1, "retrieve": 1, "get_team_stats": 1, "upsert": 4}
+    concurrency_class = {"list": "list", "get_team_stats": "stats"}
     
     def get_permissions(self):
+        if self.action == 'upsert':
+            return [permissions.IsAdminUser()]
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [permissions.IsAuthenticated()]
         return [permissions.IsAuthenticated()]
@@ -124,30 +176,13 @@ class TeamsViewSet(
         
     @action(detail=False, methods=["GET"], url_path="stats")
     def get_team_stats(self, request, *args, **kwargs):
-        team_stats = Team.objects.annotate(
-            player_count=Count('player')
-        ).aggregate(
-            total_teams=Count("*"),
-            teams_with_players=Count("id", filter=Q(player_count__gt=0)),
-            teams_without_players=Count("id", filter=Q(player_count=0)),
-            avg_players_per_team=Avg("player_count"),
-            max_players_in_team=Max("player_count"),
-            min_players_in_team=Min("player_count"),
-        )
-        
-        stats = {
-            'total_teams': team_stats['total_teams'],
-            'teams_with_players': team_stats['teams_with_players'],
-            'teams_without_players': team_stats['teams_without_players'],
-            'avg_players_per_team': round(team_stats['avg_players_per_team'] or 0, 1),
-            'max_players_in_team': team_stats['max_players_in_team'] or 0,
-            'min_players_in_team': team_stats['min_players_in_team'] or 0,
-        }
+        stats = get_team_stats()
         
         serializer = self.TeamStatsSerializer(instance=stats)
         return Response(serializer.data)
 
 class PlayersViewSet(
+    LockRetryMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.RetrieveModelMixin,
@@ -155,8 +190,10 @@ class PlayersViewSet(
     mixins.ListModelMixin, 
     GenericViewSet
 ):
-    queryset = Player.objects.all()
+    queryset = Player.objects.select_related('team')
     serializer_class = PlayersCRSerializer
+    query_budget = {"list": 1, "retrieve": 1, "get_player_stats": 1}
+    concurrency_class = {"list": "list", "get_player_stats": "stats"}
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -177,26 +214,13 @@ class PlayersViewSet(
         
     @action(detail=False, methods=["GET"], url_path="stats")
     def get_player_stats(self, request, *args, **kwargs):
-        player_stats = Player.objects.aggregate(
-            total_players=Count("*"),
-            players_with_team=Count("id", filter=Q(team__isnull=False)),
-            players_without_team=Count("id", filter=Q(team__isnull=True)),
-            players_with_user=Count("id", filter=Q(user__isnull=False)),
-            players_without_user=Count("id", filter=Q(user__isnull=True)),
-        )
-        
-        stats = {
-            'total_players': player_stats['total_players'],
-            'players_with_team': player_stats['players_with_team'],
-            'players_without_team': player_stats['players_without_team'],
-            'players_with_user': player_stats['players_with_user'],
-            'players_without_user': player_stats['players_without_user'],
-        }
+        stats = get_player_stats()
         
         serializer = self.PlayerStatsSerializer(instance=stats)
         return Response(serializer.data)
 
 class TournamentCategoriesViewSet(
+    LockRetryMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.RetrieveModelMixin,
@@ -206,6 +230,8 @@ class TournamentCategoriesViewSet(
 ):
     queryset = TournamentCategory.objects.all()
     serializer_class = TournamentCategoriesCRSerializer
+    query_budget = {"list": 1, "retrieve": 1, "get_category_stats": 1}
+    concurrency_class = {"get_category_stats": "stats"}
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -226,28 +252,14 @@ class TournamentCategoriesViewSet(
         
     @action(detail=False, methods=["GET"], url_path="stats")
     def get_category_stats(self, request, *args, **kwargs):
-        category_stats = TournamentCategory.objects.annotate(
-            tournament_count=Count('tournament')
-        ).order_by('-tournament_count')
-        
-        total_categories = category_stats.count()
-        categories_with_tournaments = category_stats.filter(tournament_count__gt=0).count()
-        categories_without_tournaments = total_categories - categories_with_tournaments
-        
-        most_popular = category_stats.first()
-        
-        stats = {
-            'total_categories': total_categories,
-            'categories_with_tournaments': categories_with_tournaments,
-            'categories_without_tournaments': categories_without_tournaments,
-            'most_popular_category': most_popular.name if most_popular else "Нет данных",
-            'tournaments_in_popular_category': most_popular.tournament_count if most_popular else 0,
-        }
+        stats = get_category_stats()
         
         serializer = self.CategoryStatsSerializer(instance=stats)
         return Response(serializer.data)
 
 class TournamentsViewSet(
+    LockRetryMixin,
+    UpsertMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.RetrieveModelMixin,
@@ -255,10 +267,17 @@ class TournamentsViewSet(
     mixins.ListModelMixin, 
     GenericViewSet
 ):
-    queryset = Tournament.objects.all()
+    queryset = Tournament.objects.select_related('category')
     serializer_class = TournamentsCRSerializer
+    upsert_class = TournamentUpsert
+    # upsert: существующие турниры, вставка, обновление, журнал изменений и очередь вебхуков
+    # forecast: турнир, версия кеша; при промахе - матчи турнира, архив, история команд, названия
+    query_budget = {"list": 1, "retrieve": 1, "get_tournament_stats": 1, "upsert": 5, "forecast": 8}
+    concurrency_class = {"list": "list", "get_tournament_stats": "stats", "forecast": "stats", "schedule": "export"}
     
     def get_permissions(self):
+        if self.action in ['upsert', 'schedule']:
+            return [permissions.IsAdminUser()]
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [permissions.IsAuthenticated()]
         return [permissions.IsAuthenticated()]
@@ -279,49 +298,37 @@ class TournamentsViewSet(
         
     @action(detail=False, methods=["GET"], url_path="stats")
     def get_tournament_stats(self, request, *args, **kwargs):
-        from django.utils import timezone
-        
-        now = timezone.now().date()
-        
-        tournament_stats = Tournament.objects.annotate(
-            match_count=Count('match'),
-            duration=Max('end_date') - Min('start_date')
-        ).aggregate(
-            total_tournaments=Count("*"),
-            active_tournaments=Count("id", filter=Q(start_date__lte=now, end_date__gte=now)),
-            completed_tournaments=Count("id", filter=Q(end_date__lt=now)),
-            upcoming_tournaments=Count("id", filter=Q(start_date__gt=now)),
-            tournaments_with_matches=Count("id", filter=Q(match_count__gt=0)),
-            tournaments_without_matches=Count("id", filter=Q(match_count=0)),
-        )
-        
-        # Средняя продолжительность турниров в днях
-        tournaments_with_dates = Tournament.objects.filter(
-            start_date__isnull=False, 
-            end_date__isnull=False
-        )
-        if tournaments_with_dates.exists():
-            avg_duration = tournaments_with_dates.aggregate(
-                avg_days=Avg(Max('end_date') - Min('start_date'))
-            )['avg_days']
-            avg_duration_days = avg_duration.days if avg_duration else 0
-        else:
-            avg_duration_days = 0
-        
-        stats = {
-            'total_tournaments': tournament_stats['total_tournaments'],
-            'active_tournaments': tournament_stats['active_tournaments'],
-            'completed_tournaments': tournament_stats['completed_tournaments'],
-            'upcoming_tournaments': tournament_stats['upcoming_tournaments'],
-            'avg_tournament_duration': round(avg_duration_days, 1),
-            'tournaments_with_matches': tournament_stats['tournaments_with_matches'],
-            'tournaments_without_matches': tournament_stats['tournaments_without_matches'],
-        }
+        stats = get_tournament_stats()
         
         serializer = self.TournamentStatsSerializer(instance=stats)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["GET"], url_path="forecast")
+    def forecast(self, request, *args, **kwargs):
+        """Вероятности исходов оставшихся матчей и победы в турнире (Монте-Карло, см. forecast.py)"""
+        return Response(get_forecast(self.get_object()))
+
+    class ScheduleSerializer(serializers.Serializer):
+        format = serializers.ChoiceField(choices=FORMATS)
+        # В порядке посева: первая команда сильнейшая
+        teams = serializers.ListField(child=serializers.IntegerField())
+        legs = serializers.IntegerField(min_value=1, max_value=2, default=1)
+        rounds = serializers.IntegerField(min_value=1, required=False)
+
+    @action(detail=True, methods=["POST"], url_path="schedule")
+    def schedule(self, request, *args, **kwargs):
+        """Матчи по формату турнира: круговая система целиком, швейцарская и сетка - следующий тур"""
+        serializer = self.ScheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = schedule_tournament(
+            self.get_object(), data["format"], data["teams"], legs=data["legs"], rounds=data.get("rounds"),
+        )
+        return Response(result, status=status.HTTP_201_CREATED)
+
 class MatchesViewSet(
+    LockRetryMixin,
+    UpsertMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.RetrieveModelMixin,
@@ -329,10 +336,22 @@ class MatchesViewSet(
     mixins.ListModelMixin, 
     GenericViewSet
 ):
-    queryset = Match.objects.all()
+    queryset = Match.objects.select_related('tournament__category', 'team1', 'team2', 'winner')
     serializer_class = MatchesCRSerializer
+    upsert_class = MatchUpsert
+    # +1 запрос на поиск игрока в get_queryset
+    # С ?include_archived=1 list и retrieve читают ещё и архив, статистика и выгрузка - всегда
+    # upsert: ссылки на турниры и команды, существующие матчи, архив, вставка и обновление, журнал и вебхуки
+    query_budget = {"list": 3, "retrieve": 3, "get_match_stats": 2, "export_matches_to_excel": 2, "upsert": 8}
+    # Выгрузка и импорт читают или пишут всю таблицу: не больше нескольких одновременно на все процессы
+    concurrency_class = {
+        "list": "list", "get_match_stats": "stats",
+        "export_matches_to_excel": "export", "import_matches": "export",
+    }
     
     def get_permissions(self):
+        if self.action in ['import_matches', 'import_report', 'upsert']:
+            return [permissions.IsAdminUser()]
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [permissions.IsAuthenticated()]
         return [permissions.IsAuthenticated()]
@@ -343,34 +362,61 @@ class MatchesViewSet(
         return super().get_serializer_class()
     
     def get_queryset(self):
+        return self.filter_dates(self.filter_for_user(super().get_queryset()))
+
+    def get_archive_queryset(self):
+        """Архив матчей (ArchivedMatch) с теми же ограничениями доступа и фильтром по датам"""
+        queryset = ArchivedMatch.objects.select_related('tournament__category', 'team1', 'team2', 'winner')
+        return self.filter_dates(self.filter_for_user(queryset))
+
+    def include_archived(self):
+        return include_archived(self.request.query_params)
+
+    def filter_dates(self, queryset):
+        try:
+            date_from, date_to = parse_date_range(self.request.query_params)
+        except ValueError as e:
+            raise ValidationError(str(e))
+        return filter_match_dates(queryset, date_from, date_to)
+
+    def filter_for_user(self, queryset):
         """
-        Переопределяем queryset для фильтрации матчей:
+        Фильтрация матчей по пользователю:
         - Администраторы видят все матчи
         - Игроки видят только матчи своей команды
         - Неавторизованные пользователи видют все матчи
         """
-        queryset = super().get_queryset()
-        
         # Если пользователь администратор или неавторизован - возвращаем все матчи
         if not self.request.user.is_authenticated or self.request.user.is_staff:
             return queryset
         
         # Для авторизованных игроков фильтруем матчи по их команде
+        if not hasattr(self, '_player_team_id'):
+            player = Player.objects.filter(user=self.request.user).only('team_id').first()
+            self._player_team_id = player.team_id if player else None
+        if self._player_team_id:
+            # Фильтруем матчи, где команда игрока участвует как team1 или team2
+            return queryset.filter(
+                Q(team1_id=self._player_team_id) | Q(team2_id=self._player_team_id)
+            )
+        # Если пользователь не игрок или у игрока нет команды, возвращаем пустой queryset
+        return queryset.none()
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+        matches = merge_matches(self.get_archive_queryset(), self.get_queryset())
+        serializer = self.get_serializer(matches, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
         try:
-            player = Player.objects.get(user=self.request.user)
-            if player.team:
-                # Фильтруем матчи, где команда игрока участвует как team1 или team2
-                queryset = queryset.filter(
-                    Q(team1=player.team) | Q(team2=player.team)
-                )
-            else:
-                # Если у игрока нет команды, возвращаем пустой queryset
-                queryset = queryset.none()
-        except Player.DoesNotExist:
-            # Если пользователь не является игроком, возвращаем пустой queryset
-            queryset = queryset.none()
-        
-        return queryset
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived():
+                raise
+        instance = get_object_or_404(self.get_archive_queryset(), pk=kwargs['pk'])
+        return Response(self.get_serializer(instance).data)
 
     class MatchStatsSerializer(serializers.Serializer):
         total_matches = serializers.IntegerField()
@@ -384,38 +430,87 @@ class MatchesViewSet(
         
     @action(detail=False, methods=["GET"], url_path="stats")
     def get_match_stats(self, request, *args, **kwargs):
-        match_stats = Match.objects.aggregate(
-            total_matches=Count("*"),
-            tournament_matches=Count("id", filter=Q(tournament__isnull=False)),
-            non_tournament_matches=Count("id", filter=Q(tournament__isnull=True)),
-            matches_with_winner=Count("id", filter=Q(winner__isnull=False)),
-            draws=Count("id", filter=Q(winner__isnull=True)),
-            avg_team1_score=Avg("team1_score"),
-            avg_team2_score=Avg("team2_score"),
-            highest_scoring_match=Max("team1_score") + Max("team2_score"),
-        )
-        
-        stats = {
-            'total_matches': match_stats['total_matches'],
-            'tournament_matches': match_stats['tournament_matches'],
-            'non_tournament_matches': match_stats['non_tournament_matches'],
-            'matches_with_winner': match_stats['matches_with_winner'],
-            'draws': match_stats['draws'],
-            'avg_team1_score': round(match_stats['avg_team1_score'] or 0, 1),
-            'avg_team2_score': round(match_stats['avg_team2_score'] or 0, 1),
-            'highest_scoring_match': match_stats['highest_scoring_match'] or 0,
-        }
+        stats = get_match_stats()
         
         serializer = self.MatchStatsSerializer(instance=stats)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['GET'], url_path='live', renderer_classes=[EventStreamRenderer])
+    def live(self, request, *args, **kwargs):
+        """
+        Лента событий матчей (Server-Sent Events): match.created, match.updated,
+        match.score и match.deleted. Фильтры ?tournament= и ?team=, возобновление
+        по заголовку Last-Event-ID.
+        """
+        response = StreamingHttpResponse(
+            stream_events(self.get_live_subscription(), parse_last_event_id(request)),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def get_live_subscription(self, loop=None):
+        tournament = self.request.query_params.get('tournament')
+        team = self.request.query_params.get('team')
+        if not self.request.user.is_staff:
+            # Игроки получают только события своей команды, как и в get_queryset
+            player = Player.objects.filter(user=self.request.user).only('team_id').first()
+            if player is None or not player.team_id:
+                raise PermissionDenied('Лента доступна только игрокам с командой')
+            team = player.team_id
+        try:
+            return Subscription(
+                tournament=int(tournament) if tournament else None,
+                team=int(team) if team else None,
+                maxsize=settings.LIVE_FEED_QUEUE_SIZE,
+                loop=loop,
+            )
+        except ValueError:
+            raise ValidationError('tournament и team должны быть числами')
+
+    @action(detail=False, methods=['POST'], url_path='import', parser_classes=[MultiPartParser])
+    def import_matches(self, request, *args, **kwargs):
+        """
+        Импорт матчей (kind=matches) или команд (kind=teams) из CSV/XLSX в поле file.
+        Строки с ошибками пропускаются и попадают в отчёт, ссылка на него - в поле report.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Файл не передан'})
+        create_teams = str(request.data.get('create_teams', '1')).lower() in TRUE_VALUES
+        try:
+            result, report = import_file(upload.file, upload.name, request.data.get('kind', 'matches'), create_teams)
+        except ImportFileError as e:
+            raise ValidationError(str(e))
+
+        return Response({
+            'created': result.created,
+            'teams_created': result.teams_created,
+            'failed': result.failed,
+            'report': reverse('matches-import-report', kwargs={'name': report}, request=request) if report else None,
+        }, status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['GET'], url_path=r'import-reports/(?P<name>[0-9a-f]{32}\.csv)')
+    def import_report(self, request, name, *args, **kwargs):
+        storage = report_storage()
+        if not storage.exists(name):
+            raise Http404
+        return FileResponse(storage.open(name, 'rb'), as_attachment=True,
+                            filename=f'import-errors-{name}', content_type='text/csv')
+
     @action(detail=False, methods=['GET'], url_path='export-excel')
     def export_matches_to_excel(self, request, *args, **kwargs):
         # Получаем матчи с предварительной загрузкой связанных данных
-        matches = Match.objects.select_related(
-            'tournament', 'team1', 'team2', 'winner'
-        ).all()
-       
+        # Выгрузка включает и архив матчей
+        matches = merge_matches(
+            ArchivedMatch.objects.select_related('tournament', 'team1', 'team2', 'winner'),
+            Match.objects.select_related('tournament', 'team1', 'team2', 'winner'),
+        )
+        # openpyxl загружается при первой выгрузке, а не при старте каждого воркера
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment
+
         wb = Workbook()
         ws = wb.active
         ws.title = "Матчи турнирной системы"
@@ -483,4 +578,115 @@ class MatchesViewSet(
         )
         response['Content-Disposition'] = 'attachment; filename="tournament_matches.xlsx"'
         
-        return response
\ No newline at end of file
+        return response
+
+
+class StatsViewSet(GenericViewSet):
+    """Сводная статистика по всем таблицам: по одному запросу на таблицу"""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {"list": 6}
+    concurrency_class = {"list": "stats"}
+
+    class SummarySerializer(serializers.Serializer):
+
+        class CategorySummarySerializer(TournamentCategoriesViewSet.CategoryStatsSerializer):
+
+            class BreakdownSerializer(serializers.Serializer):
+                id = serializers.IntegerField()
+                name = serializers.CharField()
+                tournament_count = serializers.IntegerField()
+                avg_tournament_duration = serializers.FloatField()
+
+            breakdown = BreakdownSerializer(many=True)
+
+        teams = TeamsViewSet.TeamStatsSerializer()
+        players = PlayersViewSet.PlayerStatsSerializer()
+        categories = CategorySummarySerializer()
+        tournaments = TournamentsViewSet.TournamentStatsSerializer()
+        matches = MatchesViewSet.MatchStatsSerializer()
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.SummarySerializer(instance=get_summary_stats())
+        return Response(serializer.data)
+
+
+class ChangesViewSet(GenericViewSet):
+    """
+    Лента изменений для дельта-синхронизации: ?since=<курсор>&limit=.
+    Клиент хранит cursor из ответа и при has_more запрашивает следующую страницу;
+    reset (первый запрос без since или курсор старше журнала) - нужно заново
+    загрузить списки целиком и продолжить с нового курсора.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # горизонт, страница журнала, по запросу на тип объектов и поиск игрока для матчей
+    query_budget = {"list": 8}
+    source_viewsets = {
+        "team": TeamsViewSet,
+        "player": PlayersViewSet,
+        "tournamentcategory": TournamentCategoriesViewSet,
+        "tournament": TournamentsViewSet,
+        "match": MatchesViewSet,
+    }
+
+    def int_param(self, name, default, maximum=None):
+        value = self.request.query_params.get(name)
+        if value in (None, ""):
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({name: "Ожидается целое число"})
+        if value < 0:
+            raise ValidationError({name: "Не может быть отрицательным"})
+        return min(value, maximum) if maximum else value
+
+    def get_sources(self):
+        """Тип -> (queryset, сериализатор, контекст) с теми же правилами доступа, что и в списках"""
+        sources = {}
+        for model_name, viewset_class in self.source_viewsets.items():
+            viewset = viewset_class(request=self.request, format_kwarg=None, action="list", kwargs={})
+            sources[model_name] = (
+                viewset.get_queryset(), viewset.get_serializer_class(), viewset.get_serializer_context()
+            )
+        return sources
+
+    def list(self, request, *args, **kwargs):
+        since = self.int_param("since", None)
+        limit = self.int_param("limit", settings.CHANGE_FEED_LIMIT, settings.CHANGE_FEED_LIMIT) or 1
+        return Response(read_changes(since, limit, self.get_sources()))
+
+
+class ProfilesViewSet(GenericViewSet):
+    """Снимки профилирования запросов (ProfilingMiddleware): список, сводка и скачивание файлов"""
+    permission_classes = [permissions.IsAdminUser]
+    lookup_value_regex = CAPTURE_ID
+
+    def get_capture(self, pk):
+        for meta in list_captures():
+            if meta["id"] == pk:
+                return meta
+        raise Http404
+
+    def list(self, request, *args, **kwargs):
+        return Response(list_captures())
+
+    def retrieve(self, request, pk=None, *args, **kwargs):
+        meta = self.get_capture(pk)
+        storage = profile_storage()
+        data = dict(meta)
+        if "cpu" in meta["files"]:
+            data["cpu_summary"] = cpu_summary(storage.path(meta["files"]["cpu"]))
+        if "mem" in meta["files"]:
+            with storage.open(meta["files"]["mem"], "rb") as mem_file:
+                data["mem_summary"] = mem_file.read().decode()
+        return Response(data)
+
+    @action(detail=True, methods=["GET"], url_path=r"download/(?P<kind>cpu|mem)")
+    def download(self, request, pk=None, kind=None, *args, **kwargs):
+        meta = self.get_capture(pk)
+        if kind not in meta["files"]:
+            raise Http404
+        name = meta["files"][kind]
+        content_type = "application/octet-stream" if kind == "cpu" else "text/plain; charset=utf-8"
+        return FileResponse(profile_storage().open(name, "rb"), as_attachment=True,
+                            filename=name, content_type=content_type)
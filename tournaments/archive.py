@@ -0,0 +1,93 @@
+import datetime
+from itertools import chain
+from operator import attrgetter
+
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .changes import record_changes
+from .db import retry_on_locked
+from .models import Match, ArchivedMatch
+
+# Горячая таблица Match хранит текущие матчи, ArchivedMatch - сыгранные матчи завершённых турниров.
+# Чтения по умолчанию идут только в Match; архив подключается по ?include_archived=1
+# или при явном диапазоне дат (?date_from=, ?date_to=). Статистика и выгрузка учитывают обе таблицы.
+
+MATCH_FIELDS = [
+    "id", "tournament_id", "team1_id", "team2_id",
+    "match_date", "team1_score", "team2_score", "winner_id", "external_id",
+]
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def start_of_day(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+def parse_date_range(params):
+    """(date_from, date_to) из параметров запроса; ValueError при неверной дате"""
+    dates = []
+    for name in ("date_from", "date_to"):
+        value = params.get(name)
+        if not value:
+            dates.append(None)
+            continue
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"{name}: ожидается дата в формате ГГГГ-ММ-ДД")
+        dates.append(date)
+    return tuple(dates)
+
+
+def include_archived(params):
+    if str(params.get("include_archived", "")).lower() in TRUE_VALUES:
+        return True
+    return bool(params.get("date_from") or params.get("date_to"))
+
+
+def filter_match_dates(queryset, date_from, date_to):
+    # Сравнение с границами суток, а не match_date__date: так используется индекс по match_date
+    if date_from:
+        queryset = queryset.filter(match_date__gte=start_of_day(date_from))
+    if date_to:
+        queryset = queryset.filter(match_date__lt=start_of_day(date_to + datetime.timedelta(days=1)))
+    return queryset
+
+
+def merge_matches(*querysets):
+    return sorted(chain(*querysets), key=attrgetter("id"))
+
+
+def archivable_matches(before):
+    """Матчи до даты before из турниров, закончившихся до before (и уже закончившихся сегодня)"""
+    finished_before = min(before, timezone.localdate())
+    return Match.objects.filter(
+        Q(match_date__lt=start_of_day(before)) & Q(tournament__end_date__lt=finished_before)
+    )
+
+
+@retry_on_locked
+def archive_batch(ids):
+    """Переносит матчи в архив в одной транзакции"""
+    rows = list(Match.objects.filter(id__in=ids).values(*MATCH_FIELDS))
+    ArchivedMatch.objects.bulk_create([ArchivedMatch(**row) for row in rows])
+    moved = [row["id"] for row in rows]
+    if not moved:
+        return 0
+    # Для /api/changes/ матч из горячей таблицы исчезает - это удаление
+    record_changes(Match, moved, deleted=True)
+    # Удаление прямым DELETE, без QuerySet.delete(): матч не удалён, а перенесён, поэтому
+    # сигналы post_delete (событие match.deleted в ленту и вебхуки) срабатывать не должны.
+    # Каскады не нужны: на Match не ссылается ни одна модель (журнал изменений и очередь
+    # вебхуков хранят id матча без внешнего ключа). Появится такая ссылка - её строки
+    # нужно переносить или удалять здесь же, иначе DELETE нарушит ограничение FK.
+    connection = connections[Match.objects.db]
+    placeholders = ", ".join(["%s"] * len(moved))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(Match._meta.db_table)} WHERE id IN ({placeholders})",
+            moved,
+        )
+        return cursor.rowcount
@@ -0,0 +1,181 @@
+import asyncio
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import path
+from django.views import View
+from rest_framework.renderers import JSONRenderer
+
+from .api import (
+    TeamsViewSet, PlayersViewSet, TournamentsViewSet, MatchesViewSet, TournamentCategoriesViewSet, StatsViewSet
+)
+from .archive import filter_match_dates, include_archived, merge_matches, parse_date_range
+from .events import Subscription, astream_events, parse_last_event_id
+from .models import Player, ArchivedMatch
+from .stats import (
+    aget_team_stats, aget_player_stats, aget_category_stats,
+    aget_tournament_stats, aget_match_stats, aget_summary_stats
+)
+
+# Асинхронные варианты действий только на чтение (list, retrieve, stats) для запуска под ASGI.
+# Запросы и сериализаторы берутся у синхронных вьюсетов, поэтому ответы совпадают.
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+
+def forbidden_response():
+    return json_response({"detail": "Authentication credentials were not provided."}, status=403)
+
+
+class AsyncReadView(View):
+    http_method_names = ["get", "head", "options"]
+    viewset = None
+
+    async def get_queryset(self, user):
+        return self.viewset.queryset.all()
+
+    async def get(self, request, pk=None):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return forbidden_response()
+
+        queryset = await self.get_queryset(user)
+        serializer_class = self.viewset.serializer_class
+        context = {"request": request}
+
+        if pk is None:
+            objects = [obj async for obj in queryset]
+            return json_response(serializer_class(objects, many=True, context=context).data)
+
+        try:
+            instance = await queryset.aget(pk=pk)
+        except queryset.model.DoesNotExist:
+            return json_response(
+                {"detail": f"No {queryset.model._meta.object_name} matches the given query."}, status=404
+            )
+        return json_response(serializer_class(instance, context=context).data)
+
+
+class AsyncMatchesView(AsyncReadView):
+    viewset = MatchesViewSet
+
+    async def get_queryset(self, user):
+        # Та же фильтрация, что и в MatchesViewSet.get_queryset
+        return await self.filter_for_user(await super().get_queryset(user), user)
+
+    async def filter_for_user(self, queryset, user):
+        if user.is_staff:
+            return queryset
+
+        player = await Player.objects.filter(user=user).only("team_id").afirst()
+        if player is None or not player.team_id:
+            return queryset.none()
+        return queryset.filter(Q(team1_id=player.team_id) | Q(team2_id=player.team_id))
+
+    async def get(self, request, pk=None):
+        if not include_archived(request.GET):
+            return await super().get(request, pk)
+
+        # Матчи вместе с архивом, как MatchesViewSet.list/retrieve с ?include_archived=1
+        user = await request.auser()
+        if not user.is_authenticated:
+            return forbidden_response()
+        try:
+            date_from, date_to = parse_date_range(request.GET)
+        except ValueError as e:
+            return json_response([str(e)], status=400)
+
+        querysets = [
+            filter_match_dates(await self.filter_for_user(queryset, user), date_from, date_to)
+            for queryset in (
+                ArchivedMatch.objects.select_related("tournament__category", "team1", "team2", "winner"),
+                self.viewset.queryset.all(),
+            )
+        ]
+        if pk is not None:
+            querysets = [queryset.filter(pk=pk) for queryset in querysets]
+        matches = merge_matches(*[[obj async for obj in queryset] for queryset in querysets])
+
+        serializer_class = self.viewset.serializer_class
+        context = {"request": request}
+        if pk is None:
+            return json_response(serializer_class(matches, many=True, context=context).data)
+        if not matches:
+            return json_response({"detail": "No Match matches the given query."}, status=404)
+        return json_response(serializer_class(matches[0], context=context).data)
+
+
+class AsyncStatsView(View):
+    http_method_names = ["get", "head", "options"]
+    get_stats = None
+    serializer_class = None
+
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return forbidden_response()
+
+        stats = await self.get_stats()
+        return json_response(self.serializer_class(instance=stats).data)
+
+
+class AsyncLiveMatchesView(View):
+    """Лента событий матчей (SSE) для ASGI: ожидание событий не занимает рабочий поток"""
+    http_method_names = ["get"]
+
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return forbidden_response()
+
+        tournament = request.GET.get("tournament")
+        team = request.GET.get("team")
+        if not user.is_staff:
+            player = await Player.objects.filter(user=user).only("team_id").afirst()
+            if player is None or not player.team_id:
+                return json_response({"detail": "Лента доступна только игрокам с командой"}, status=403)
+            team = player.team_id
+        try:
+            subscription = Subscription(
+                tournament=int(tournament) if tournament else None,
+                team=int(team) if team else None,
+                maxsize=settings.LIVE_FEED_QUEUE_SIZE,
+                loop=asyncio.get_running_loop(),
+            )
+        except ValueError:
+            return json_response(["tournament и team должны быть числами"], status=400)
+
+        response = StreamingHttpResponse(
+            astream_events(subscription, parse_last_event_id(request)),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+def read_urls(prefix, view, get_stats, serializer_class):
+    return [
+        path(f"{prefix}/", view),
+        path(f"{prefix}/stats/", AsyncStatsView.as_view(get_stats=get_stats, serializer_class=serializer_class)),
+        path(f"{prefix}/<int:pk>/", view),
+    ]
+
+
+urlpatterns = [
+    path("matches/live/", AsyncLiveMatchesView.as_view()),
+    path("stats/", AsyncStatsView.as_view(get_stats=aget_summary_stats, serializer_class=StatsViewSet.SummarySerializer)),
+    *read_urls("teams", AsyncReadView.as_view(viewset=TeamsViewSet),
+               aget_team_stats, TeamsViewSet.TeamStatsSerializer),
+    *read_urls("players", AsyncReadView.as_view(viewset=PlayersViewSet),
+               aget_player_stats, PlayersViewSet.PlayerStatsSerializer),
+    *read_urls("tournament-categories", AsyncReadView.as_view(viewset=TournamentCategoriesViewSet),
+               aget_category_stats, TournamentCategoriesViewSet.CategoryStatsSerializer),
+    *read_urls("tournaments", AsyncReadView.as_view(viewset=TournamentsViewSet),
+               aget_tournament_stats, TournamentsViewSet.TournamentStatsSerializer),
+    *read_urls("matches", AsyncMatchesView.as_view(),
+               aget_match_stats, MatchesViewSet.MatchStatsSerializer),
+]
@@ -0,0 +1,30 @@
+import os
+
+from django.core.cache.backends.filebased import FileBasedCache as DjangoFileBasedCache
+from django.core.cache.backends.locmem import LocMemCache as DjangoLocMemCache
+
+from .metrics import record_cache_read
+
+# Бэкенды кеша Django со счётчиком попаданий для /metrics (tournaments_cache_requests_total)
+
+MISSING = object()
+
+
+class CacheMetricsMixin:
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        # Метка кеша - LOCATION (для файлового кеша - имя каталога)
+        self.metrics_name = os.path.basename(str(location).rstrip("/\\")) or "default"
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        record_cache_read(self.metrics_name, value is not MISSING)
+        return default if value is MISSING else value
+
+
+class LocMemCache(CacheMetricsMixin, DjangoLocMemCache):
+    pass
+
+
+class FileBasedCache(CacheMetricsMixin, DjangoFileBasedCache):
+    pass
@@ -0,0 +1,99 @@
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import ChangeLog
+
+# Журнал изменений (ChangeLog) и лента /api/changes/. Сигналы пишут журнал при save()/delete();
+# массовые операции (импорт, upsert, архивация) вызывают record_changes() сами.
+
+
+def record_changes(model, ids, deleted=False):
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=model._meta.model_name, object_id=pk, deleted=deleted) for pk in ids
+    ])
+
+
+def horizon():
+    """Курсор, до которого записи об удалениях уже вычищены compact_changes"""
+    return ChangeLog.objects.filter(model=ChangeLog.HORIZON).aggregate(cursor=Max("object_id"))["cursor"] or 0
+
+
+def current_cursor():
+    return ChangeLog.objects.aggregate(cursor=Max("id"))["cursor"] or 0
+
+
+def read_changes(since, limit, sources):
+    """
+    Страница ленты после курсора since; since=None - начальная синхронизация: клиент
+    получает reset и текущий курсор, затем загружает списки целиком. sources: тип -> (queryset, serializer_class, context).
+    Несколько изменений одного объекта на странице схлопываются в последнее;
+    данные объектов читаются одним запросом на тип, поэтому стоимость зависит
+    от числа изменений, а не от размера таблиц.
+    """
+    if since is None or since < horizon():
+        return {"cursor": current_cursor(), "reset": True, "has_more": False, "changes": []}
+
+    rows = list(
+        ChangeLog.objects.filter(id__gt=since).exclude(model=ChangeLog.HORIZON)
+        .order_by("id").values_list("id", "model", "object_id", "deleted")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for cursor, model, object_id, deleted in rows:
+        latest.pop((model, object_id), None)
+        latest[(model, object_id)] = (cursor, deleted)
+
+    wanted = {}
+    for (model, object_id), (cursor, deleted) in latest.items():
+        if not deleted and model in sources:
+            wanted.setdefault(model, set()).add(object_id)
+    objects = {
+        model: {obj.pk: obj for obj in sources[model][0].filter(pk__in=ids)}
+        for model, ids in wanted.items()
+    }
+
+    changes = []
+    for (model, object_id), (cursor, deleted) in latest.items():
+        if model not in sources:
+            continue
+        obj = objects.get(model, {}).get(object_id)
+        if deleted or obj is None:
+            # Объект удалён позже или не виден пользователю - для клиента это удаление
+            changes.append({"cursor": cursor, "type": model, "id": object_id, "op": "delete"})
+            continue
+        _, serializer_class, context = sources[model]
+        changes.append({
+            "cursor": cursor, "type": model, "id": object_id, "op": "upsert",
+            "data": serializer_class(obj, context=context).data,
+        })
+    return {
+        "cursor": rows[-1][0] if rows else since,
+        "reset": False,
+        "has_more": has_more,
+        "changes": changes,
+    }
+
+
+@transaction.atomic
+def compact_changes(tombstones_older_than=None):
+    """
+    Сжимает журнал: оставляет по одной (последней) записи на объект, а с
+    tombstones_older_than (timedelta) удаляет и старые записи об удалениях.
+    Клиенты с курсором до удалённых записей получают reset. Возвращает (сжато, удалено).
+    """
+    newer = ChangeLog.objects.filter(model=OuterRef("model"), object_id=OuterRef("object_id"), id__gt=OuterRef("id"))
+    superseded = ChangeLog.objects.exclude(model=ChangeLog.HORIZON).filter(Exists(newer)).delete()[0]
+
+    pruned = 0
+    if tombstones_older_than is not None:
+        tombstones = ChangeLog.objects.filter(deleted=True, created_at__lt=timezone.now() - tombstones_older_than)
+        last = tombstones.aggregate(cursor=Max("id"))["cursor"]
+        if last:
+            previous = horizon()
+            pruned = tombstones.filter(id__lte=last).delete()[0]
+            ChangeLog.objects.filter(model=ChangeLog.HORIZON).delete()
+            ChangeLog.objects.create(model=ChangeLog.HORIZON, object_id=max(last, previous))
+    return superseded, pruned
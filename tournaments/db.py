@@ -0,0 +1,51 @@
+import functools
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return "database is locked" in message or "database table is locked" in message
+
+
+def retry_on_locked(func):
+    """
+    Повторяет запись при блокировке SQLite с экспоненциальной задержкой.
+    Каждая попытка выполняется в своей транзакции; внутри уже открытой транзакции
+    повтор невозможен, поэтому там функция вызывается как есть.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+
+        retries = settings.SQLITE_LOCK_RETRIES
+        delay = settings.SQLITE_LOCK_BACKOFF
+        for attempt in range(retries + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == retries or not is_lock_error(e):
+                    raise
+                time.sleep(delay * 2 ** attempt)
+
+    return wrapper
+
+
+class LockRetryMixin:
+    """Миксин вьюсета: создание, изменение и удаление повторяются при блокировке БД"""
+
+    @retry_on_locked
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @retry_on_locked
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+
+    @retry_on_locked
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+
+
+class Subscription:
+    """
+    Подписка на события матчей с ограниченной очередью.
+    Если клиент не успевает читать и очередь переполняется, подписка помечается
+    overflowed и поток закрывается - клиент переподключится с Last-Event-ID.
+    """
+
+    def __init__(self, tournament=None, team=None, maxsize=100, loop=None):
+        self.tournament = tournament
+        self.team = team
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+        self.overflowed = False
+
+    def matches(self, event):
+        data = event["data"]
+        if self.tournament is not None and data.get("tournament") != self.tournament:
+            return False
+        if self.team is not None and self.team not in (data.get("team1"), data.get("team2")):
+            return False
+        return True
+
+    def offer(self, event):
+        if not self.matches(event):
+            return
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.put, event)
+        else:
+            self.put(event)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            self.overflowed = True
+
+
+class BroadcastHub:
+    """
+    Внутрипроцессная рассылка событий подписчикам с буфером последних событий для возобновления.
+    Номера событий свои в каждом процессе, поэтому клиенту id отдаётся как "<epoch>-<номер>":
+    переподключение к другому воркеру (или после перезапуска) распознаётся по чужому epoch.
+    """
+
+    def __init__(self, backlog=1000):
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex
+        self.ids = itertools.count(1)
+        self.last_id = 0
+        self.backlog = deque(maxlen=backlog)
+        self.subscriptions = set()
+
+    def publish(self, event_type, data):
+        with self.lock:
+            event = {"id": next(self.ids), "event": event_type, "data": data}
+            self.last_id = event["id"]
+            self.backlog.append(event)
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.offer(event)
+        return event
+
+    def subscribe(self, subscription, last_event_id=None):
+        """
+        Регистрирует подписку и возвращает пропущенные события после last_event_id
+        ((epoch, номер), см. parse_last_event_id). None вместо списка означает, что нужные
+        события недоступны: id выдан другим процессом или события уже вытеснены из буфера.
+        """
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if last_event_id is None:
+                return []
+            epoch, last_event_id = last_event_id
+            if epoch != self.epoch or last_event_id > self.last_id:
+                return None
+            if self.backlog and self.backlog[0]["id"] > last_event_id + 1:
+                return None
+            return [
+                event for event in self.backlog
+                if event["id"] > last_event_id and subscription.matches(event)
+            ]
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+
+def match_payload(match):
+    """Компактное представление матча для события: только идентификаторы и счёт"""
+    return {
+        "id": match.id,
+        "tournament": match.tournament_id,
+        "team1": match.team1_id,
+        "team2": match.team2_id,
+        "team1_score": match.team1_score,
+        "team2_score": match.team2_score,
+        "winner": match.winner_id,
+        "match_date": match.match_date.isoformat() if match.match_date else None,
+    }
+
+
+hub = BroadcastHub(backlog=getattr(settings, "LIVE_FEED_BACKLOG", 1000))
+
+
+def format_sse(event):
+    return (
+        f"id: {hub.epoch}-{event['id']}\n"
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+    )
+
+
+# Клиент должен заново загрузить список: пропущенные события уже недоступны
+RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+KEEPALIVE_MESSAGE = ": keepalive\n\n"
+
+
+def parse_last_event_id(request):
+    """
+    (epoch, номер) из Last-Event-ID "<epoch>-<номер>"; None - заголовка нет.
+    Id другого формата даёт пустой epoch - такой клиент получит reset.
+    """
+    value = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    if not value:
+        return None
+    epoch, _, number = value.rpartition("-")
+    try:
+        return epoch, int(number)
+    except ValueError:
+        return "", 0
+
+
+def stream_events(subscription, last_event_id):
+    """Генератор SSE для синхронного (WSGI) ответа"""
+    backlog = hub.subscribe(subscription, last_event_id)
+    try:
+        yield f"retry: {settings.LIVE_FEED_RETRY_MS}\n\n"
+        if backlog is None:
+            yield RESET_MESSAGE
+            backlog = []
+        for event in backlog:
+            yield format_sse(event)
+        while not subscription.overflowed:
+            try:
+                event = subscription.queue.get(timeout=settings.LIVE_FEED_KEEPALIVE)
+            except queue.Empty:
+                yield KEEPALIVE_MESSAGE
+                continue
+            yield format_sse(event)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def astream_events(subscription, last_event_id):
+    """Асинхронный генератор SSE для ASGI: ожидание событий не занимает поток"""
+    backlog = hub.subscribe(subscription, last_event_id)
+    try:
+        yield f"retry: {settings.LIVE_FEED_RETRY_MS}\n\n"
+        if backlog is None:
+            yield RESET_MESSAGE
+            backlog = []
+        for event in backlog:
+            yield format_sse(event)
+        while not subscription.overflowed:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.LIVE_FEED_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE_MESSAGE
+                continue
+            yield format_sse(event)
+    finally:
+        hub.unsubscribe(subscription)
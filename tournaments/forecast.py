@@ -0,0 +1,256 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.utils import timezone
+
+# Прогноз турнира методом Монте-Карло (/api/tournaments/{id}/forecast/).
+# Сила команд - модель Брэдли-Терри по сыгранным матчам (ничья - половина победы),
+# оставшиеся матчи разыгрываются FORECAST_SIMULATIONS раз целиком массивами NumPy:
+# одна строка матрицы - одно завершение турнира. Победитель - команда с наибольшим
+# числом очков (3 за победу, 1 за ничью), равенство очков - жребий.
+# Результат кешируется по последней записи журнала изменений матчей, поэтому
+# любое изменение счёта (в том числе bulk-импортом) даёт новый ключ кеша.
+
+WIN_POINTS = 3
+DRAW_POINTS = 1
+# Виртуальные победа и поражение против команды средней силы: без них команда
+# без поражений получила бы бесконечную силу
+PRIOR_GAMES = 1.0
+STRENGTH_ITERATIONS = 100
+
+
+def forecast_version():
+    """Последнее изменение матчей в ChangeLog - версия ключа кеша"""
+    ChangeLog = apps.get_model("tournaments", "ChangeLog")
+    Match = apps.get_model("tournaments", "Match")
+    return ChangeLog.objects.filter(model=Match._meta.model_name).aggregate(cursor=Max("id"))["cursor"] or 0
+
+
+def outcome_scores(team1_score, team2_score):
+    """Очки в модели силы: 1 - победа первой команды, 0.5 - ничья, 0 - поражение"""
+    import numpy as np
+
+    return np.where(team1_score > team2_score, 1.0, np.where(team1_score == team2_score, 0.5, 0.0))
+
+
+def estimate_strengths(team1, team2, scores, n_teams, iterations=STRENGTH_ITERATIONS):
+    """
+    Силы команд по модели Брэдли-Терри (MM-алгоритм Хантера): P(i побеждает j) = s_i / (s_i + s_j).
+    team1, team2 - индексы команд, scores - результат для первой команды (см. outcome_scores).
+    Силы нормированы так, что их среднее геометрическое равно 1.
+    """
+    import numpy as np
+
+    wins = (
+        np.bincount(team1, weights=scores, minlength=n_teams)
+        + np.bincount(team2, weights=1.0 - scores, minlength=n_teams)
+        + PRIOR_GAMES
+    )
+    strengths = np.ones(n_teams)
+    for _ in range(iterations):
+        pair = 1.0 / (strengths[team1] + strengths[team2])
+        games = (
+            np.bincount(team1, weights=pair, minlength=n_teams)
+            + np.bincount(team2, weights=pair, minlength=n_teams)
+            + 2 * PRIOR_GAMES / (strengths + 1.0)
+        )
+        updated = wins / games
+        updated /= np.exp(np.log(updated).mean())
+        if np.allclose(updated, strengths, rtol=1e-6):
+            strengths = updated
+            break
+        strengths = updated
+    return strengths
+
+
+def draw_rate(scores):
+    """Доля ничьих в истории, сглаженная к 10% на малых выборках"""
+    return (float((scores == 0.5).sum()) + 1.0) / (len(scores) + 10.0)
+
+
+def match_probabilities(strengths, home, away, draw):
+    """(победа первой, ничья, победа второй) для каждого матча"""
+    expected = strengths[home] / (strengths[home] + strengths[away])
+    return (1 - draw) * expected, draw, (1 - draw) * (1 - expected)
+
+
+def simulate(base_points, home, away, home_win, draw, runs, seed, chunk_cells):
+    """
+    runs завершений турнира: base_points - очки за сыгранные матчи, home/away - индексы команд
+    оставшихся матчей, home_win - вероятности победы первой команды. Возвращает
+    (число титулов по командам, сумма итоговых очков по командам). Функция уровня модуля -
+    выполняется и в дочерних процессах (FORECAST_PROCESSES), поэтому настройки получает аргументами.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n_teams = len(base_points)
+    fixtures = len(home)
+    away_threshold = home_win + draw
+    # Блок прогонов ограничен числом ячеек (прогоны x матчи), а не прогонов:
+    # память блока не зависит от размера турнира
+    chunk = max(1, chunk_cells // max(1, fixtures))
+
+    titles = np.zeros(n_teams, dtype=np.int64)
+    points_total = np.zeros(n_teams)
+    for start in range(0, runs, chunk):
+        size = min(chunk, runs - start)
+        roll = rng.random((size, fixtures), dtype=np.float32)
+        home_won = roll < home_win
+        away_won = roll >= away_threshold
+        del roll
+        drawn = ~(home_won | away_won)
+        # Очки каждой команды в каждом прогоне: bincount по индексам "прогон * команд + команда"
+        offsets = np.arange(size)[:, None] * n_teams
+        points = np.bincount(
+            (offsets + home).ravel(), weights=(WIN_POINTS * home_won + DRAW_POINTS * drawn).ravel(),
+            minlength=size * n_teams,
+        )
+        points += np.bincount(
+            (offsets + away).ravel(), weights=(WIN_POINTS * away_won + DRAW_POINTS * drawn).ravel(),
+            minlength=size * n_teams,
+        )
+        del home_won, away_won, drawn
+        points = points.reshape(size, n_teams) + base_points
+        # Жребий при равенстве очков: добавка меньше очка не меняет порядок остальных команд
+        winners = np.argmax(points + rng.random((size, n_teams)) * 0.5, axis=1)
+        titles += np.bincount(winners, minlength=n_teams)
+        points_total += points.sum(axis=0)
+    return titles, points_total
+
+
+def run_simulations(base_points, home, away, home_win, draw, runs, processes=1, seed=None):
+    """Делит прогоны между процессами с независимыми потоками случайных чисел и суммирует итоги"""
+    import numpy as np
+
+    processes = max(1, min(processes, runs))
+    chunk_cells = settings.FORECAST_CHUNK_CELLS
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    shares = [runs // processes + (index < runs % processes) for index in range(processes)]
+    if processes == 1:
+        return simulate(base_points, home, away, home_win, draw, runs, seeds[0], chunk_cells)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [
+            pool.submit(simulate, base_points, home, away, home_win, draw, share, child, chunk_cells)
+            for share, child in zip(shares, seeds)
+        ]
+        results = [future.result() for future in futures]
+    return sum(titles for titles, _ in results), sum(points for _, points in results)
+
+
+def result_rows(model, *conditions, **filters):
+    """(команда 1, команда 2, счёт 1, счёт 2) сыгранных матчей с обеими командами"""
+    return list(
+        model.objects.filter(*conditions, team1__isnull=False, team2__isnull=False, **filters)
+        .values_list("team1_id", "team2_id", "team1_score", "team2_score")
+    )
+
+
+def build_forecast(tournament, simulations=None, processes=None, seed=None):
+    """Прогноз без кеша: вероятности оставшихся матчей и итоговой победы каждой команды"""
+    import numpy as np
+
+    Match = apps.get_model("tournaments", "Match")
+    ArchivedMatch = apps.get_model("tournaments", "ArchivedMatch")
+    Team = apps.get_model("tournaments", "Team")
+    simulations = settings.FORECAST_SIMULATIONS if simulations is None else simulations
+    processes = settings.FORECAST_PROCESSES if processes is None else processes
+    now = timezone.now()
+
+    fixtures = list(
+        Match.objects.filter(tournament=tournament, team1__isnull=False, team2__isnull=False, match_date__gt=now)
+        .order_by("match_date", "id").values_list("id", "team1_id", "team2_id", "match_date")
+    )
+    played = result_rows(Match, tournament=tournament, match_date__lte=now)
+    played += result_rows(ArchivedMatch, tournament=tournament)
+
+    team_ids = sorted({team for row in fixtures for team in row[1:3]} | {team for row in played for team in row[:2]})
+    if not team_ids:
+        return {
+            "tournament": tournament.id, "simulations": 0, "generated_at": now.isoformat(),
+            "played": 0, "remaining": 0, "teams": [], "matches": [],
+        }
+
+    # История всех турниров с участием этих команд; соперники из других турниров тоже получают силу
+    involved = Q(team1__in=team_ids) | Q(team2__in=team_ids)
+    history = result_rows(Match, involved, match_date__lte=now) + result_rows(ArchivedMatch, involved)
+    all_ids = sorted(set(team_ids) | {team for row in history for team in row[:2]})
+    index = {team: position for position, team in enumerate(all_ids)}
+
+    history = np.array(history, dtype=np.int64).reshape(-1, 4)
+    history_home = np.array([index[team] for team in history[:, 0]], dtype=np.int64)
+    history_away = np.array([index[team] for team in history[:, 1]], dtype=np.int64)
+    history_scores = outcome_scores(history[:, 2], history[:, 3])
+    strengths = estimate_strengths(history_home, history_away, history_scores, len(all_ids))
+    draw = draw_rate(history_scores)
+
+    # Дальше работаем только с командами турнира
+    local = {team: position for position, team in enumerate(team_ids)}
+    team_strengths = strengths[[index[team] for team in team_ids]]
+
+    played = np.array(played, dtype=np.int64).reshape(-1, 4)
+    played_home = np.array([local[team] for team in played[:, 0]], dtype=np.int64)
+    played_away = np.array([local[team] for team in played[:, 1]], dtype=np.int64)
+    played_scores = outcome_scores(played[:, 2], played[:, 3])
+    points_for = np.where(played_scores == 1.0, WIN_POINTS, np.where(played_scores == 0.5, DRAW_POINTS, 0))
+    points_against = np.where(played_scores == 0.0, WIN_POINTS, np.where(played_scores == 0.5, DRAW_POINTS, 0))
+    base_points = (
+        np.bincount(played_home, weights=points_for, minlength=len(team_ids))
+        + np.bincount(played_away, weights=points_against, minlength=len(team_ids))
+    )
+
+    home = np.array([local[row[1]] for row in fixtures], dtype=np.int64)
+    away = np.array([local[row[2]] for row in fixtures], dtype=np.int64)
+    home_win, draw, away_win = match_probabilities(team_strengths, home, away, draw)
+    titles, points_total = run_simulations(
+        base_points, home, away, home_win, draw, simulations, processes=processes, seed=seed,
+    )
+
+    names = dict(Team.objects.filter(id__in=team_ids).values_list("id", "name"))
+    teams = [
+        {
+            "team": team,
+            "name": names.get(team),
+            "strength": round(float(team_strengths[position]), 4),
+            "points": int(base_points[position]),
+            "expected_points": round(float(points_total[position]) / simulations, 2),
+            "win_probability": round(float(titles[position]) / simulations, 4),
+        }
+        for position, team in enumerate(team_ids)
+    ]
+    teams.sort(key=lambda item: (-item["win_probability"], -item["expected_points"]))
+    matches = [
+        {
+            "id": match_id,
+            "team1": team1,
+            "team2": team2,
+            "match_date": match_date.isoformat(),
+            "team1_win": round(float(home_win[position]), 4),
+            "draw": round(float(draw), 4),
+            "team2_win": round(float(away_win[position]), 4),
+        }
+        for position, (match_id, team1, team2, match_date) in enumerate(fixtures)
+    ]
+    return {
+        "tournament": tournament.id,
+        "simulations": simulations,
+        "generated_at": now.isoformat(),
+        "played": len(played),
+        "remaining": len(fixtures),
+        "teams": teams,
+        "matches": matches,
+    }
+
+
+def get_forecast(tournament):
+    """Прогноз из кеша; пересчитывается после изменения любого матча или по FORECAST_CACHE_TIMEOUT"""
+    key = f"forecast:{tournament.id}:{forecast_version()}"
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = build_forecast(tournament)
+        cache.set(key, forecast, settings.FORECAST_CACHE_TIMEOUT)
+    return forecast
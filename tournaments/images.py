@@ -0,0 +1,147 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Размеры производных изображений: (ширина, высота, обрезать до квадрата)
+DERIVATIVE_SIZES = {
+    "thumb": (96, 96, True),
+    "medium": (480, 480, False),
+}
+DERIVATIVE_FORMATS = {
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+}
+
+# Поля с изображениями и поля, где хранятся имена их производных
+IMAGE_FIELDS = {
+    "tournaments.Team": ("logo", "logo_derivatives"),
+    "tournaments.Player": ("photo", "photo_derivatives"),
+}
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-derivatives")
+
+
+def derivative_name(name, size, extension):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "derivatives", f"{stem}_{size}.{extension}")
+
+
+def render_variant(image, width, height, crop):
+    from PIL import Image, ImageOps
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    variant = image.copy()
+    variant.thumbnail((width, height), Image.LANCZOS)
+    return variant
+
+
+def encode(image, image_format):
+    from PIL import Image
+    if image_format == "JPEG" and image.mode != "RGB":
+        # У JPEG нет прозрачности: кладём изображение на белый фон
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=80)
+    return buffer.getvalue()
+
+
+def generate_derivatives(field_file):
+    """Создаёт производные изображения и возвращает {размер: {формат: имя файла}}"""
+    # Pillow нужен только здесь, не загружаем его при старте процесса
+    from PIL import Image, ImageOps
+    storage = field_file.storage
+    with field_file.open("rb"):
+        image = Image.open(field_file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    derivatives = {}
+    for size, (width, height, crop) in DERIVATIVE_SIZES.items():
+        variant = render_variant(image, width, height, crop)
+        derivatives[size] = {}
+        for extension, image_format in DERIVATIVE_FORMATS.items():
+            name = derivative_name(field_file.name, size, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            derivatives[size][extension] = storage.save(name, ContentFile(encode(variant, image_format)))
+    return derivatives
+
+
+def delete_derivatives(storage, derivatives, keep=None):
+    keep_names = {name for formats in (keep or {}).values() for name in formats.values()}
+    for formats in (derivatives or {}).values():
+        for name in formats.values():
+            if name not in keep_names and storage.exists(name):
+                storage.delete(name)
+
+
+def build_derivatives(model_label, pk):
+    """Пересчитывает производные изображения одного объекта и сохраняет их имена"""
+    model = apps.get_model(model_label)
+    image_field, derivatives_field = IMAGE_FIELDS[model_label]
+    instance = model.objects.filter(pk=pk).only(image_field, derivatives_field).first()
+    if instance is None:
+        return None
+
+    field_file = getattr(instance, image_field)
+    previous = getattr(instance, derivatives_field) or {}
+    derivatives = generate_derivatives(field_file) if field_file else {}
+    delete_derivatives(field_file.storage, previous, keep=derivatives)
+    # update() вместо save(): без сигналов и без повторной обработки,
+    # поэтому запись в журнал изменений для /api/changes/ делаем сами
+    model.objects.filter(pk=pk).update(**{derivatives_field: derivatives})
+    apps.get_model("tournaments", "ChangeLog").objects.create(model=model._meta.model_name, object_id=pk)
+    return derivatives
+
+
+def run_in_background(model_label, pk):
+    try:
+        build_derivatives(model_label, pk)
+    except Exception:
+        logger.exception("Не удалось построить производные изображения для %s #%s", model_label, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(model_label, pk):
+    """Ставит построение производных в фоновый поток, чтобы не задерживать запрос"""
+    if getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+        executor.submit(run_in_background, model_label, pk)
+    else:
+        build_derivatives(model_label, pk)
+
+
+def derivative_urls(storage, derivatives, request=None):
+    """URL производных и готовые srcset для сериализаторов; None, если их ещё нет"""
+    if not derivatives:
+        return None
+
+    def absolute(name):
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    urls = {
+        size: {extension: absolute(name) for extension, name in formats.items()}
+        for size, formats in derivatives.items()
+    }
+    urls["srcset"] = {
+        extension: ", ".join(
+            f"{urls[size][extension]} {DERIVATIVE_SIZES[size][0]}w"
+            for size in DERIVATIVE_SIZES if size in derivatives
+        )
+        for extension in DERIVATIVE_FORMATS
+    }
+    return urls
@@ -0,0 +1,296 @@
+import csv
+import datetime
+import io
+import os
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .changes import record_changes
+from .db import retry_on_locked
+from .models import Team, Tournament, Match
+
+# Потоковый импорт матчей и команд из CSV/XLSX: строки читаются по одной, проверяются
+# и пишутся пачками через bulk_create; ошибки строк сразу уходят в CSV-отчёт.
+# bulk_create не вызывает save() и сигналы, поэтому победитель и журнал изменений
+# пишутся здесь, а события в ленту матчей для исторических данных не отправляются.
+
+# Заголовки колонок: английские имена и заголовки выгрузки export-excel
+HEADER_ALIASES = {
+    "tournament": "tournament", "турнир": "tournament",
+    "team1": "team1", "команда 1": "team1",
+    "team2": "team2", "команда 2": "team2",
+    "team1_score": "team1_score", "счёт команды 1": "team1_score",
+    "team2_score": "team2_score", "счёт команды 2": "team2_score",
+    "match_date": "match_date", "дата матча": "match_date",
+    "name": "name", "название команды": "name",
+}
+REQUIRED_COLUMNS = {
+    "matches": ["tournament", "team1", "team2", "match_date"],
+    "teams": ["name"],
+}
+DATE_FORMATS = ["%d.%m.%Y %H:%M", "%d.%m.%Y"]
+
+
+class ImportFileError(Exception):
+    """Файл нельзя импортировать целиком: неизвестный формат или нет нужных колонок"""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    failed: int = 0
+    teams_created: int = 0
+
+
+def read_rows(file, filename):
+    """Генератор (номер строки, {колонка: значение}) по CSV или XLSX без загрузки файла в память"""
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            yield from map_rows(rows)
+        finally:
+            workbook.close()
+    elif filename.lower().endswith(".csv"):
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        try:
+            yield from map_rows(csv.reader(text))
+        finally:
+            text.detach()
+    else:
+        raise ImportFileError("Поддерживаются файлы .csv и .xlsx")
+
+
+def map_rows(rows):
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError("Файл пуст")
+    columns = [HEADER_ALIASES.get(str(cell or "").strip().lower()) for cell in header]
+    for number, values in enumerate(rows, start=2):
+        if not any(value not in (None, "") for value in values):
+            continue
+        yield number, {column: value for column, value in zip(columns, values) if column}
+
+
+def parse_match_date(value):
+    if isinstance(value, datetime.datetime):
+        result = value
+    elif isinstance(value, datetime.date):
+        result = datetime.datetime.combine(value, datetime.time.min)
+    else:
+        value = str(value or "").strip()
+        result = parse_datetime(value)
+        if result is None and parse_date(value):
+            result = datetime.datetime.combine(parse_date(value), datetime.time.min)
+        for date_format in DATE_FORMATS:
+            if result is not None:
+                break
+            try:
+                result = datetime.datetime.strptime(value, date_format)
+            except ValueError:
+                pass
+        if result is None:
+            raise ValueError(f"неверная дата матча: {value!r}")
+    if timezone.is_naive(result):
+        result = timezone.make_aware(result)
+    return result
+
+
+def parse_score(value, column):
+    if value in (None, ""):
+        return 0
+    try:
+        score = int(float(value))
+    except (TypeError, ValueError):
+        raise ValueError(f"{column}: ожидается число, получено {value!r}")
+    if score < 0:
+        raise ValueError(f"{column}: счёт не может быть отрицательным")
+    return score
+
+
+def name_key(value):
+    return " ".join(str(value or "").split()).lower()
+
+
+class Importer:
+    """
+    Импорт одного файла. Справочники команд и турниров загружаются один раз
+    (имя -> id); в памяти держится только текущая пачка строк.
+    """
+
+    def __init__(self, kind="matches", report=None, create_teams=True, chunk_size=None):
+        if kind not in REQUIRED_COLUMNS:
+            raise ImportFileError(f"Неизвестный тип импорта: {kind}")
+        self.kind = kind
+        self.create_teams = create_teams
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.report = csv.writer(report) if report is not None else None
+        if self.report:
+            self.report.writerow(["row", "error"])
+        self.teams = {name_key(name): pk for pk, name in Team.objects.values_list("id", "name").iterator()}
+        self.tournaments = {}
+        if kind == "matches":
+            self.tournaments = {
+                name_key(name): pk for pk, name in Tournament.objects.values_list("id", "name").iterator()
+            }
+        self.result = ImportResult()
+
+    def run(self, rows):
+        chunk = []
+        checked_header = False
+        for number, row in rows:
+            if not checked_header:
+                missing = [column for column in REQUIRED_COLUMNS[self.kind] if column not in row]
+                if missing:
+                    raise ImportFileError(f"Нет колонок: {', '.join(missing)}")
+                checked_header = True
+            try:
+                chunk.append(self.build(row))
+            except ValueError as e:
+                self.add_error(number, str(e))
+                continue
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = []
+        if chunk:
+            self.flush(chunk)
+        return self.result
+
+    def add_error(self, number, message):
+        self.result.failed += 1
+        if self.report:
+            self.report.writerow([number, message])
+
+    def resolve_team(self, value, column):
+        key = name_key(value)
+        if key not in self.teams:
+            if not self.create_teams:
+                raise ValueError(f"{column}: команда {value!r} не найдена")
+            # Новая команда создаётся вместе с пачкой, до этого в справочнике её имя
+            self.teams[key] = str(value).strip()
+        return self.teams[key]
+
+    def build(self, row):
+        """Проверяет строку и возвращает данные для записи; ValueError - ошибка строки"""
+        if self.kind == "teams":
+            key = name_key(row.get("name"))
+            if not key:
+                raise ValueError("name: не указано название команды")
+            if key in self.teams:
+                raise ValueError(f"команда {row['name']!r} уже есть")
+            self.teams[key] = str(row["name"]).strip()
+            return self.teams[key]
+
+        tournament = self.tournaments.get(name_key(row.get("tournament")))
+        if tournament is None:
+            raise ValueError(f"турнир {row.get('tournament')!r} не найден")
+        if name_key(row.get("team1")) and name_key(row.get("team1")) == name_key(row.get("team2")):
+            raise ValueError("команда не может играть сама с собой")
+        team1_score = parse_score(row.get("team1_score"), "team1_score")
+        team2_score = parse_score(row.get("team2_score"), "team2_score")
+        match_date = parse_match_date(row.get("match_date"))
+        for column in ("team1", "team2"):
+            if not name_key(row.get(column)):
+                raise ValueError(f"{column}: не указана команда")
+        # Команды - в последнюю очередь, чтобы не создавать команды для ошибочных строк
+        team1 = self.resolve_team(row.get("team1"), "team1")
+        team2 = self.resolve_team(row.get("team2"), "team2")
+        # Победитель как в Match.save()
+        winner = team1 if team1_score > team2_score else team2 if team2_score > team1_score else None
+        return dict(
+            tournament_id=tournament,
+            team1_id=team1, team2_id=team2, winner_id=winner,
+            team1_score=team1_score, team2_score=team2_score,
+            match_date=match_date,
+        )
+
+    def flush(self, chunk):
+        new_teams, created = self.write(chunk)
+        self.teams.update(new_teams)
+        if self.kind == "teams":
+            self.result.created += created
+        else:
+            self.result.teams_created += len(new_teams)
+            self.result.created += created
+
+    @retry_on_locked
+    def write(self, chunk):
+        """Пишет пачку в одной транзакции; состояние импорта меняет только flush() после успеха"""
+        if self.kind == "teams":
+            teams = Team.objects.bulk_create([Team(name=name) for name in chunk])
+            record_changes(Team, [team.id for team in teams])
+            return {name_key(team.name): team.id for team in teams}, len(teams)
+
+        # В справочнике у ещё не созданных команд вместо id стоит имя
+        new_names = {
+            value for row in chunk for value in (row["team1_id"], row["team2_id"]) if isinstance(value, str)
+        }
+        new_teams = {
+            name_key(team.name): team.id
+            for team in Team.objects.bulk_create([Team(name=name) for name in sorted(new_names)])
+        }
+
+        def team_id(value):
+            return new_teams[name_key(value)] if isinstance(value, str) else value
+
+        matches = [
+            Match(**{**row, **{field: team_id(row[field]) for field in ("team1_id", "team2_id", "winner_id")}})
+            for row in chunk
+        ]
+        matches = Match.objects.bulk_create(matches)
+        record_changes(Team, new_teams.values())
+        record_changes(Match, [match.id for match in matches])
+        return new_teams, len(matches)
+
+
+def report_storage():
+    return FileSystemStorage(location=settings.IMPORT_REPORTS_DIR)
+
+
+def prune_reports(storage, max_age=None):
+    """Удаляет отчёты старше IMPORT_REPORTS_MAX_AGE секунд; возвращает число удалённых"""
+    max_age = settings.IMPORT_REPORTS_MAX_AGE if max_age is None else max_age
+    if not os.path.isdir(storage.location):
+        return 0
+    threshold = timezone.now() - datetime.timedelta(seconds=max_age)
+    deleted = 0
+    for name in storage.listdir("")[1]:
+        if not name.endswith(".csv"):
+            continue
+        try:
+            if storage.get_modified_time(name) >= threshold:
+                continue
+        except OSError:
+            continue
+        storage.delete(name)
+        deleted += 1
+    return deleted
+
+
+def import_file(file, filename, kind="matches", create_teams=True):
+    """
+    Импортирует файл и возвращает (ImportResult, имя отчёта об ошибках или None).
+    Отчёт пишется по мере чтения, в хранилище report_storage().
+    """
+    storage = report_storage()
+    os.makedirs(storage.location, exist_ok=True)
+    report_name = f"{uuid.uuid4().hex}.csv"
+    with open(storage.path(report_name), "w", newline="", encoding="utf-8-sig") as report:
+        try:
+            result = Importer(kind, report=report, create_teams=create_teams).run(read_rows(file, filename))
+        except BaseException:
+            report.close()
+            storage.delete(report_name)
+            raise
+    if not result.failed:
+        storage.delete(report_name)
+        report_name = None
+    # Отчёты нужны только сразу после импорта: старые вычищаются при каждом следующем импорте
+    prune_reports(storage)
+    return result, report_name
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: ограничение только внутри процесса
+    fcntl = None
+
+# Ограничение числа одновременных дорогих запросов по классам стоимости (выгрузка,
+# статистика, полные списки). Слоты - файлы CONCURRENCY_LOCK_DIR/<класс>.<n>.lock под flock:
+# общие для потоков и процессов, а слот упавшего процесса освобождает ОС.
+# Лимит адаптивный: пока запросы класса медленнее целевого времени, число слотов уменьшается,
+# когда снова быстрые - растёт до максимума (AIMD).
+
+
+class FileSlots:
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        os.makedirs(directory, exist_ok=True)
+
+    def try_acquire(self, limit):
+        for number in range(limit):
+            fd = os.open(os.path.join(self.directory, f"{self.name}.{number}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class LocalSlots:
+    """Слоты в памяти процесса: без fcntl или без CONCURRENCY_LOCK_DIR"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.busy = set()
+
+    def try_acquire(self, limit):
+        with self.lock:
+            for number in range(limit):
+                if number not in self.busy:
+                    self.busy.add(number)
+                    return number
+        return None
+
+    def release(self, number):
+        with self.lock:
+            self.busy.discard(number)
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name, limit, timeout=0, target=None, min_limit=1, lock_dir=None):
+        self.name = name
+        self.max_limit = limit
+        self.min_limit = min(min_limit, limit)
+        self.limit = limit
+        self.timeout = timeout
+        self.target = target
+        self.latency = None
+        self.lock = threading.Lock()
+        self.slots = FileSlots(lock_dir, name) if lock_dir and fcntl else LocalSlots()
+
+    def acquire(self, timeout=None):
+        """Слот или None, если за timeout секунд (по умолчанию - из настроек класса) он не освободился"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            slot = self.slots.try_acquire(self.limit)
+            if slot is not None:
+                return slot
+            if time.monotonic() + delay > deadline:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, slot, duration):
+        self.slots.release(slot)
+        self.observe(duration)
+
+    def observe(self, duration):
+        with self.lock:
+            self.latency = duration if self.latency is None else self.latency * 0.8 + duration * 0.2
+            if self.target is None:
+                return
+            if duration > self.target:
+                self.limit = max(self.min_limit, int(self.limit * 0.75))
+            elif self.latency <= self.target:
+                self.limit = min(self.max_limit, self.limit + 1)
+
+    def retry_after(self):
+        """Секунды для заголовка Retry-After: примерно время одного запроса класса"""
+        return max(1, round(self.latency or 1))
+
+
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """Ограничитель класса из CONCURRENCY_LIMITS; None - класс не ограничен"""
+    config = settings.CONCURRENCY_LIMITS.get(name)
+    if not config:
+        return None
+    lock_dir = settings.CONCURRENCY_LOCK_DIR
+    key = (name, tuple(sorted(config.items())), str(lock_dir))
+    with limiters_lock:
+        if key not in limiters:
+            limiters[key] = ConcurrencyLimiter(name, lock_dir=lock_dir, **config)
+        return limiters[key]
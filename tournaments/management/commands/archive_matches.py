@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from tournaments.archive import archivable_matches, archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Move completed matches of finished tournaments into the ArchivedMatch table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='Архивировать матчи раньше этой даты (ГГГГ-ММ-ДД)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Матчей за одну транзакцию')
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между пачками, с')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать матчи')
+
+    def handle(self, *args, **options):
+        before = parse_date(options['before'])
+        if before is None:
+            raise CommandError('--before: ожидается дата в формате ГГГГ-ММ-ДД')
+
+        matches = archivable_matches(before)
+        if options['dry_run']:
+            self.stdout.write(f'Будет перенесено матчей: {matches.count()}')
+            return
+
+        moved = 0
+        while True:
+            ids = list(matches.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            moved += archive_batch(ids)
+            self.stdout.write(f'  перенесено {moved}')
+            if len(ids) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив матчей: {moved}'))
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .replay_traffic import percentile
+
+
+DEFAULT_PATHS = 'teams/,players/,tournaments/,matches/,teams/stats/,tournaments/stats/,matches/stats/'
+
+
+class Command(BaseCommand):
+    help = 'Compare sustained concurrent read throughput of the WSGI (/api/) and ASGI (/api/async/) setups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000',
+                            help='Сервер на app.wsgi, пустая строка - пропустить')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001',
+                            help='Сервер на app.asgi, пустая строка - пропустить')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=10, help='Секунд на каждый сервер')
+        parser.add_argument('--paths', default=DEFAULT_PATHS, help='Пути относительно /api/ через запятую')
+
+    def handle(self, *args, **options):
+        paths = [p.strip().lstrip('/') for p in options['paths'].split(',') if p.strip()]
+        targets = [
+            ('WSGI', options['wsgi_url'], '/api/'),
+            ('ASGI', options['asgi_url'], '/api/async/'),
+        ]
+        for name, base_url, prefix in targets:
+            if not base_url:
+                continue
+            base_url = base_url.rstrip('/')
+            cookie = self.login(base_url, options['username'], options['password'])
+            urls = [f'{base_url}{prefix}{p}' for p in paths]
+            latencies, errors, elapsed = self.run(urls, cookie, options['concurrency'], options['duration'])
+            latencies.sort()
+            self.stdout.write(
+                f'{name:<5} {base_url:<28} запросов: {len(latencies):>7}  ошибок: {errors:>5}  '
+                f'rps: {len(latencies) / elapsed:>8.1f}  p50: {percentile(latencies, 50):>7.1f}  '
+                f'p95: {percentile(latencies, 95):>7.1f}  p99: {percentile(latencies, 99):>7.1f} мс'
+            )
+
+    def login(self, base_url, username, password):
+        request = urllib.request.Request(
+            f'{base_url}/api/user/login/',
+            data=json.dumps({'username': username, 'password': password}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                success = json.loads(response.read()).get('success')
+                cookies = SimpleCookie()
+                for header in response.headers.get_all('Set-Cookie') or []:
+                    cookies.load(header)
+        except urllib.error.URLError as e:
+            raise CommandError(f'{base_url} недоступен: {e}')
+        if not success or 'sessionid' not in cookies:
+            raise CommandError(f'Не удалось войти на {base_url} как {username}')
+        return f'sessionid={cookies["sessionid"].value}'
+
+    def run(self, urls, cookie, concurrency, duration):
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(offset):
+            local_latencies = []
+            local_errors = 0
+            i = offset
+            while time.perf_counter() < deadline:
+                request = urllib.request.Request(urls[i % len(urls)], headers={'Cookie': cookie})
+                i += 1
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        response.read()
+                except urllib.error.URLError:
+                    local_errors += 1
+                    continue
+                local_latencies.append((time.perf_counter() - started) * 1000)
+            with lock:
+                latencies.extend(local_latencies)
+                errors[0] += local_errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker, n) for n in range(concurrency)]:
+                future.result()
+        return latencies, errors[0], time.perf_counter() - started
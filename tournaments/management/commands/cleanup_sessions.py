@@ -0,0 +1,35 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions from django_session in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сессий за одну транзакцию: короткие транзакции не держат блокировку SQLite')
+        parser.add_argument('--max-batches', type=int, default=100, help='Не больше N пачек за запуск')
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между пачками, с')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        for batch in range(options['max_batches']):
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:options['batch_size']]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if len(keys) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+
+        remaining = Session.objects.filter(expire_date__lt=now).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено истёкших сессий: {deleted}, осталось: {remaining}'
+        ))
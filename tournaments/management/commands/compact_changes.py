@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from tournaments.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Compact the /api/changes/ log: keep the latest entry per object, optionally drop old deletions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tombstones-days', type=int, default=None,
+                            help='Удалять записи об удалениях старше N дней (клиенты с более старым курсором получат reset)')
+
+    def handle(self, *args, **options):
+        days = options['tombstones_days']
+        superseded, pruned = compact_changes(timedelta(days=days) if days is not None else None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено устаревших записей журнала: {superseded}, записей об удалениях: {pruned}'
+        ))
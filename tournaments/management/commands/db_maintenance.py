@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# PRAGMA auto_vacuum: 0 - NONE, 1 - FULL, 2 - INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Command(BaseCommand):
+    help = 'SQLite maintenance: ANALYZE, PRAGMA optimize, incremental vacuum and WAL checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=0,
+                            help='Сколько свободных страниц вернуть за проход, 0 - все')
+        parser.add_argument('--enable-incremental', action='store_true',
+                            help='Один раз перевести БД в auto_vacuum=INCREMENTAL (выполняет полный VACUUM)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда предназначена только для SQLite')
+
+        with connection.cursor() as cursor:
+            freelist_before = self.pragma(cursor, 'freelist_count')
+
+            self.stdout.write('ANALYZE...')
+            cursor.execute('ANALYZE')
+            self.stdout.write('PRAGMA optimize...')
+            cursor.execute('PRAGMA optimize')
+
+            auto_vacuum = self.pragma(cursor, 'auto_vacuum')
+            if auto_vacuum != AUTO_VACUUM_INCREMENTAL and options['enable_incremental']:
+                self.stdout.write('Переводим БД в режим auto_vacuum=INCREMENTAL (VACUUM)...')
+                cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                cursor.execute('VACUUM')
+                auto_vacuum = self.pragma(cursor, 'auto_vacuum')
+
+            if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+                self.stdout.write('Инкрементальная очистка...')
+                cursor.execute(f'PRAGMA incremental_vacuum({options["pages"]})')
+                cursor.fetchall()
+            else:
+                self.stdout.write(self.style.WARNING(
+                    'auto_vacuum не INCREMENTAL, очистка пропущена (см. --enable-incremental)'
+                ))
+
+            if self.pragma(cursor, 'journal_mode') == 'wal':
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                cursor.fetchall()
+
+            freelist_after = self.pragma(cursor, 'freelist_count')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Свободных страниц: {freelist_before} -> {freelist_after}'
+        ))
+
+    def pragma(self, cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
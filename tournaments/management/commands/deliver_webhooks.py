@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tournaments.webhooks import deliver_pending, prune_events
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued match and tournament events to webhook subscribers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Разослать накопленные события и выйти')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--batch', type=int, default=100, help='Подписок за один проход')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            delivered, failed = deliver_pending(limit=options['batch'])
+            if delivered or failed:
+                self.stdout.write(f'Доставлено пачек: {delivered}, с ошибкой: {failed}')
+            # События, полученные всеми подписками, из очереди удаляются
+            prune_events()
+            if options['once']:
+                # За проход берётся не больше WEBHOOK_WORKERS пачек: выходим, когда отправлять нечего
+                if not delivered and not failed:
+                    break
+                continue
+            if not delivered and not failed:
+                time.sleep(options['sleep'])
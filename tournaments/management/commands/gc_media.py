@@ -0,0 +1,117 @@
+import os
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q, TextField
+from django.db.models.functions import Cast
+
+from tournaments.images import IMAGE_FIELDS
+from tournaments.storage import ContentAddressedStorage, select_media_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete media files that are no longer referenced by any Team/Player image or derivative'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Не трогать файлы моложе N секунд (загрузки, ещё не сохранённые в БД)')
+
+    def handle(self, *args, **options):
+        storage = select_media_storage()
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('Сборка мусора работает только с ContentAddressedStorage')
+
+        references = self.count_references()
+        roots = {name.split('/', 1)[0] for name in references if '/' in name}
+        roots.update(self.upload_roots())
+
+        now = time.time()
+        orphans = []
+        kept = 0
+        for root in sorted(roots):
+            for name in self.walk(storage, root):
+                if references[name]:
+                    kept += 1
+                    continue
+                if now - os.path.getmtime(storage.path(name)) < options['min_age']:
+                    continue
+                orphans.append(name)
+
+        # Обрывки прерванных загрузок
+        incoming = os.path.join(storage.location, storage.incoming_dir)
+        if os.path.isdir(incoming) and not options['dry_run']:
+            for filename in os.listdir(incoming):
+                path = os.path.join(incoming, filename)
+                if now - os.path.getmtime(path) >= options['min_age']:
+                    os.remove(path)
+
+        freed = 0
+        deleted = 0
+        for name in orphans:
+            if options['dry_run']:
+                freed += storage.size(name)
+                deleted += 1
+                self.stdout.write(f'  {name}')
+                continue
+            # Пока шёл обход, тот же файл могли загрузить снова (это освежает mtime)
+            # и сохранить ссылку на него: перед удалением проверяем оба условия заново
+            if time.time() - os.path.getmtime(storage.path(name)) < options['min_age'] or self.is_referenced(name):
+                kept += 1
+                continue
+            freed += storage.size(name)
+            storage.purge(name)
+            deleted += 1
+
+        shared = sum(1 for count in references.values() if count > 1)
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {deleted} ({freed / 1024 / 1024:.1f} МБ), '
+            f'используется: {kept}, общих для нескольких объектов: {shared}'
+        ))
+
+    def count_references(self):
+        """Счётчик ссылок: имя файла -> сколько раз оно встречается в полях моделей"""
+        references = Counter()
+        for model_label, (image_field, derivatives_field) in IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            rows = model.objects.values_list(image_field, derivatives_field).iterator()
+            for image_name, derivatives in rows:
+                if image_name:
+                    references[image_name] += 1
+                for formats in (derivatives or {}).values():
+                    for name in formats.values():
+                        references[name] += 1
+        return references
+
+    def is_referenced(self, name):
+        """Есть ли ссылка на файл сейчас: поле изображения или производные (JSON как текст)"""
+        for model_label, (image_field, derivatives_field) in IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            # Имена файлов - хеши содержимого, поэтому поиск подстроки в JSON не даёт ложных совпадений
+            exists = model.objects.annotate(
+                derivatives_text=Cast(derivatives_field, TextField()),
+            ).filter(Q(**{image_field: name}) | Q(derivatives_text__contains=name)).exists()
+            if exists:
+                return True
+        return False
+
+    def upload_roots(self):
+        roots = set()
+        for model_label, (image_field, _) in IMAGE_FIELDS.items():
+            upload_to = apps.get_model(model_label)._meta.get_field(image_field).upload_to
+            if isinstance(upload_to, str) and upload_to:
+                roots.add(upload_to.strip('/').split('/', 1)[0])
+        return roots
+
+    def walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        subdirectories, files = storage.listdir(directory)
+        for filename in files:
+            yield f'{directory}/{filename}'
+        for subdirectory in subdirectories:
+            if subdirectory != storage.incoming_dir:
+                yield from self.walk(storage, f'{directory}/{subdirectory}')
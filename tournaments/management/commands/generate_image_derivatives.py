@@ -0,0 +1,31 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from tournaments.images import IMAGE_FIELDS, build_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Backfill thumbnail and medium WebP/JPEG derivatives for existing team logos and player photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже построенные производные')
+
+    def handle(self, *args, **options):
+        for model_label, (image_field, derivatives_field) in IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            queryset = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+            if not options['force']:
+                queryset = queryset.filter(**{derivatives_field: {}})
+
+            done = failed = 0
+            for pk in queryset.values_list('pk', flat=True).iterator():
+                try:
+                    build_derivatives(model_label, pk)
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{model._meta.verbose_name} #{pk}: {e}')
+
+            self.stdout.write(f'{model._meta.verbose_name_plural}: обработано {done}, ошибок {failed}')
+
+        self.stdout.write(self.style.SUCCESS('✅ Производные изображения построены'))
@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tournaments.importer import ImportFileError, import_file, report_storage
+
+
+class Command(BaseCommand):
+    help = 'Import matches or teams from a CSV/XLSX file in chunks, writing row errors to a report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv или .xlsx')
+        parser.add_argument('--kind', choices=['matches', 'teams'], default='matches')
+        parser.add_argument('--no-create-teams', action='store_true',
+                            help='Не создавать неизвестные команды, а считать такие строки ошибкой')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+        try:
+            with open(path, 'rb') as file:
+                result, report = import_file(file, path, options['kind'], not options['no_create_teams'])
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано записей: {result.created}, новых команд: {result.teams_created}, ошибок: {result.failed}'
+        ))
+        if report:
+            self.stdout.write(f'Отчёт об ошибках: {report_storage().path(report)}')
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tournaments.startup import HEAVY_MODULES, best_import_time
+
+
+class Command(BaseCommand):
+    help = 'Report process startup import time (python -X importtime) for a module, app.urls by default'
+
+    def add_arguments(self, parser):
+        parser.add_argument('module', nargs='?', default='app.urls', help='Импортируемый модуль')
+        parser.add_argument('--runs', type=int, default=3, help='Запусков, берётся лучший')
+        parser.add_argument('--top', type=int, default=20, help='Сколько самых медленных модулей показать')
+        parser.add_argument('--check', action='store_true',
+                            help='Ошибка, если время больше IMPORT_TIME_BUDGET_MS или загружены тяжёлые модули')
+
+    def handle(self, *args, **options):
+        report = best_import_time(options['module'], options['runs'])
+        self.stdout.write(f'{options["module"]}: {report.total_ms:.1f} мс (бюджет {settings.IMPORT_TIME_BUDGET_MS} мс)')
+        self.stdout.write(f'{"своё, мс":>10} {"всего, мс":>10}  модуль')
+        for name, (own, cumulative) in report.top(options['top']):
+            self.stdout.write(f'{own / 1000:>10.1f} {cumulative / 1000:>10.1f}  {name}')
+
+        heavy = [name for name in HEAVY_MODULES if name in report.modules]
+        if heavy:
+            self.stdout.write(self.style.WARNING(f'Загружены при старте: {", ".join(heavy)}'))
+        if options['check'] and (heavy or report.total_ms > settings.IMPORT_TIME_BUDGET_MS):
+            raise CommandError('Время импорта при старте больше бюджета')
@@ -0,0 +1,203 @@
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def normalize_path(path):
+    """/api/matches/15/ -> /api/matches/{id}/"""
+    return ID_SEGMENT.sub("/{id}", path)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def synthesize_body(shape):
+    """Собирает тело запроса по сохранённой форме: строки, числа и т.д. заменяются заглушками"""
+    if isinstance(shape, dict):
+        return {key: synthesize_body(value) for key, value in shape.items()}
+    if isinstance(shape, list):
+        return [synthesize_body(item) for item in shape]
+    return {"int": 1, "float": 1.0, "bool": False, "null": None}.get(shape, "replay")
+
+
+class Command(BaseCommand):
+    help = 'Replay a recorded JSONL traffic log and report per-endpoint throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', nargs='?', default=str(settings.TRAFFIC_LOG_PATH))
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--rate', type=float, default=0, help='Запросов в секунду, 0 - без ограничения')
+        parser.add_argument('--url', default='', help='Адрес запущенного сервера, например http://127.0.0.1:8000')
+        parser.add_argument('--host', default='localhost', help='Заголовок Host для тестового клиента')
+        parser.add_argument('--methods', default='GET,HEAD', help='Какие методы воспроизводить')
+        parser.add_argument('--limit', type=int, default=0)
+        parser.add_argument('--loops', type=int, default=1)
+
+    def handle(self, *args, **options):
+        records = self.load_records(options)
+        if not records:
+            raise CommandError('В журнале нет подходящих запросов')
+
+        self.options = options
+        self.users = self.resolve_users()
+        self.results = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.results_lock = threading.Lock()
+
+        jobs = iter(records * options['loops'])
+        jobs_lock = threading.Lock()
+        interval = 1 / options['rate'] if options['rate'] > 0 else 0
+        self.stdout.write(
+            f'Воспроизводим {len(records) * options["loops"]} запросов, '
+            f'потоков: {options["concurrency"]}, цель: {options["url"] or "тестовый клиент"}'
+        )
+
+        started = time.perf_counter()
+        sent = [0]
+
+        def worker():
+            clients = {}
+            while True:
+                with jobs_lock:
+                    record = next(jobs, None)
+                    slot = sent[0]
+                    sent[0] += 1
+                if record is None:
+                    return
+                if interval:
+                    delay = started + slot * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.replay(record, clients)
+
+        def thread_worker():
+            # У каждого потока своё соединение с БД, закрываем его по завершении
+            try:
+                worker()
+            finally:
+                connection.close()
+
+        if options['concurrency'] <= 1:
+            worker()
+        else:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                workers = [pool.submit(thread_worker) for _ in range(options['concurrency'])]
+            for future in workers:
+                future.result()
+
+        self.report(time.perf_counter() - started)
+
+    def load_records(self, options):
+        methods = {method.strip().upper() for method in options['methods'].split(',') if method.strip()}
+        records = []
+        try:
+            with open(options['log'], encoding='utf-8') as log_file:
+                for line in log_file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    if record.get('method') in methods:
+                        records.append(record)
+                    if options['limit'] and len(records) >= options['limit']:
+                        break
+        except FileNotFoundError:
+            raise CommandError(f'Журнал {options["log"]} не найден')
+        return records
+
+    def resolve_users(self):
+        if self.options['url']:
+            return {}
+        return {
+            'staff': User.objects.filter(is_staff=True).first(),
+            'player': User.objects.filter(is_staff=False, player__isnull=False).first(),
+            'user': User.objects.filter(is_staff=False).first(),
+        }
+
+    def replay(self, record, clients):
+        path = record['path']
+        if record.get('query'):
+            path = f'{path}?{urlencode(record["query"])}'
+        body = synthesize_body(record['body_shape']) if isinstance(record.get('body_shape'), dict) else None
+
+        begin = time.perf_counter()
+        if self.options['url']:
+            status_code = self.send_http(record['method'], path, body)
+        else:
+            client = self.get_client(record.get('user_class', 'anonymous'), clients)
+            send = getattr(client, record['method'].lower())
+            if body is not None:
+                response = send(path, data=json.dumps(body), content_type='application/json')
+            else:
+                response = send(path)
+            status_code = response.status_code
+        elapsed_ms = (time.perf_counter() - begin) * 1000
+
+        key = f'{record["method"]} {normalize_path(record["path"])}'
+        with self.results_lock:
+            self.results[key].append(elapsed_ms)
+            if status_code >= 400:
+                self.errors[key] += 1
+
+    def get_client(self, user_class, clients):
+        if user_class not in clients:
+            client = Client(HTTP_HOST=self.options['host'], raise_request_exception=False)
+            user = self.users.get(user_class)
+            if user is not None:
+                client.force_login(user)
+            clients[user_class] = client
+        return clients[user_class]
+
+    def send_http(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.options['url'].rstrip('/') + path,
+            data=data,
+            method=method,
+            headers={'Content-Type': 'application/json'} if data else {},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except urllib.error.URLError:
+            return 599
+
+    def report(self, total_seconds):
+        header = f'{"Эндпоинт":<45} {"запр.":>6} {"ош.":>5} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        total = 0
+        for key in sorted(self.results, key=lambda k: -len(self.results[k])):
+            latencies = sorted(self.results[key])
+            total += len(latencies)
+            self.stdout.write(
+                f'{key:<45} {len(latencies):>6} {self.errors[key]:>5} '
+                f'{len(latencies) / total_seconds:>8.1f} '
+                f'{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} '
+                f'{percentile(latencies, 99):>8.1f} {latencies[-1]:>8.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итого: {total} запросов за {total_seconds:.2f} с ({total / total_seconds:.1f} rps), задержки в мс'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tournaments.tasks import run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run the background task worker (Player-to-User sync and other queued jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и выйти')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--batch', type=int, default=100, help='Задач за один проход')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Через сколько секунд вернуть в очередь задачу, зависшую у упавшего воркера')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            done, failed = run_pending(limit=options['batch'], stale_after=options['stale_after'])
+            if done or failed:
+                self.stdout.write(f'Выполнено задач: {done}, с ошибкой: {failed}')
+            if options['once']:
+                if done + failed < options['batch']:
+                    break
+                continue
+            if not done and not failed:
+                time.sleep(options['sleep'])
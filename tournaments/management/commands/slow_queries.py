@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tournaments.slowlog import read_records, summarize
+
+
+class Command(BaseCommand):
+    help = 'Rank slow SQL fingerprints from the slow-query log by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(settings.SLOW_QUERY_LOG_PATH),
+                            help='Журнал медленных запросов (ротированные файлы .1, .2, ... читаются тоже)')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько отпечатков показать')
+        parser.add_argument('--sort', choices=['total', 'max', 'count'], default='total', help='Порядок сводки')
+        parser.add_argument('--plans', action='store_true', help='Показать план самого медленного выполнения')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        paths = [path] + [f'{path}.{n}' for n in range(1, settings.SLOW_QUERY_LOG_BACKUP_COUNT + 1)]
+        summary = summarize(read_records(paths))
+        if not summary:
+            self.stdout.write('Медленных запросов нет')
+            return
+
+        key = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count'}[options['sort']]
+        items = sorted(summary.values(), key=lambda item: item[key], reverse=True)[:options['limit']]
+        self.stdout.write(f'{"#":>3} {"всего, мс":>11} {"раз":>6} {"сред., мс":>10} {"макс., мс":>10}  действия')
+        for rank, item in enumerate(items, start=1):
+            self.stdout.write(
+                f'{rank:>3} {item["total_ms"]:>11.1f} {item["count"]:>6} '
+                f'{item["total_ms"] / item["count"]:>10.1f} {item["max_ms"]:>10.1f}  '
+                f'{", ".join(sorted(item["views"])) or "-"}'
+            )
+            self.stdout.write(f'    {item["fingerprint"]}')
+            if options['plans'] and item['plan']:
+                for line in item['plan']:
+                    self.stdout.write(f'      {line}')
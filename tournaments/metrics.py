@@ -0,0 +1,181 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+# Метрики процесса в памяти и их выгрузка в формате Prometheus (/metrics).
+# Каждый процесс (воркер gunicorn/uvicorn) периодически сбрасывает свои значения
+# в отдельный файл METRICS_DIR/<pid>-<id>.json; /metrics суммирует файлы всех процессов.
+# Файлы завершившихся процессов не удаляются, чтобы счётчики не уменьшались;
+# каталог очищается при развёртывании вместе с перезапуском Prometheus-целей.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Имя -> (тип, описание, границы корзин гистограммы)
+METRICS = {
+    "tournaments_requests_total": ("counter", "Запросов по действию вьюсета", None),
+    "tournaments_request_duration_seconds": ("histogram", "Время обработки запроса", DURATION_BUCKETS),
+    "tournaments_request_queries": ("histogram", "SQL-запросов на запрос", QUERY_BUCKETS),
+    "tournaments_response_size_bytes": ("histogram", "Размер тела ответа", SIZE_BUCKETS),
+    "tournaments_cache_requests_total": ("counter", "Чтений кеша, result=hit|miss", None),
+}
+
+
+class MetricsRegistry:
+    """Счётчики и гистограммы с метками; все изменения под одной блокировкой"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        # (имя, метки) -> [счётчики корзин, сумма, количество]
+        self.histograms = {}
+        self.process_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(buckets), 0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [
+                    [name, list(labels), list(buckets), total, count]
+                    for (name, labels), (buckets, total, count) in self.histograms.items()
+                ],
+            }
+
+    def path(self):
+        return Path(settings.METRICS_DIR) / f"{self.process_id}.json"
+
+    def maybe_flush(self):
+        if not settings.METRICS_DIR or time.monotonic() - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flush()
+
+    def flush(self):
+        """Атомарно перезаписывает файл процесса (запись во временный файл и os.replace)"""
+        if not settings.METRICS_DIR:
+            return
+        self.flushed_at = time.monotonic()
+        path = self.path()
+        os.makedirs(path.parent, exist_ok=True)
+        temp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        temp_path.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        os.replace(temp_path, path)
+
+    def collect(self):
+        """Снимки всех процессов: свой - из памяти, остальные - из файлов"""
+        snapshots = [self.snapshot()]
+        if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+            own = self.path().name
+            for path in Path(settings.METRICS_DIR).glob("*.json"):
+                if path.name == own:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text(encoding="utf-8")))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs) + "}"
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshots):
+    """Текстовый формат Prometheus 0.0.4 для суммы снимков"""
+    counters, histograms = merge(snapshots)
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {format_number(value)}")
+            continue
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels, le=format_number(float(bound)))} {cumulative}")
+            lines.append(f'{name}_bucket{format_labels(labels, le="+Inf")} {count}')
+            lines.append(f"{name}_sum{format_labels(labels)} {format_number(float(total))}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def status_class(status_code):
+    return f"{status_code // 100}xx"
+
+
+def record_request(view, method, status_code, duration, queries=None, size=None):
+    labels = {"view": view or "other"}
+    registry.inc("tournaments_requests_total", {**labels, "method": method, "status": status_class(status_code)})
+    registry.observe("tournaments_request_duration_seconds", labels, duration)
+    if queries is not None:
+        registry.observe("tournaments_request_queries", labels, queries)
+    if size is not None:
+        registry.observe("tournaments_response_size_bytes", labels, size)
+
+
+def record_cache_read(cache, hit):
+    registry.inc("tournaments_cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
@@ -0,0 +1,406 @@
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .limiter import get_limiter
+from .metrics import record_request
+from .profiling import Capture, capture_lock, parse_modes
+from .slowlog import SlowQueryLog, threshold as slow_query_threshold
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ключи, значения которых никогда не попадают в журнал трафика
+SENSITIVE_KEYS = {"password", "key", "token", "csrfmiddlewaretoken", "totp", "secret"}
+
+
+def get_user_class(user):
+    """Грубый класс пользователя для журнала: anonymous, staff, player или user"""
+    if user is None or not user.is_authenticated:
+        return "anonymous"
+    if user.is_staff:
+        return "staff"
+    if hasattr(user, "player"):
+        return "player"
+    return "user"
+
+
+def describe_shape(value):
+    """Заменяет значения на названия их типов, сохраняя структуру"""
+    if isinstance(value, dict):
+        return {
+            key: "***" if key.lower() in SENSITIVE_KEYS else describe_shape(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [describe_shape(value[0])] if value else []
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def sanitize_query(query_dict):
+    query = {}
+    for key in query_dict:
+        if key.lower() in SENSITIVE_KEYS:
+            query[key] = "***"
+        else:
+            query[key] = query_dict.get(key)
+    return query
+
+
+def get_body_shape(request):
+    content_type = request.content_type or ""
+    if request.method in ("GET", "HEAD", "OPTIONS", "DELETE"):
+        return None
+    if content_type.startswith("application/json"):
+        try:
+            return describe_shape(json.loads(request.body or b"null"))
+        except ValueError:
+            return "invalid-json"
+    if content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        shape = {key: "str" for key in request.POST}
+        shape.update({key: "file" for key in request.FILES})
+        return describe_shape(shape) if shape else None
+    return content_type or None
+
+
+class TrafficRecordMiddleware:
+    """
+    Записывает обезличенные сведения о запросах в JSONL-журнал.
+    Включается настройкой TRAFFIC_LOG_ENABLED, журнал читает команда replay_traffic.
+    """
+    sync_capable = True
+    async_capable = True
+    lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not getattr(settings, "TRAFFIC_LOG_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.log_path = settings.TRAFFIC_LOG_PATH
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Тело читаем заранее: после обработки DRF поток уже будет прочитан
+        body_shape = get_body_shape(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        latency_ms = (time.perf_counter() - started) * 1000
+        user_class = get_user_class(getattr(request, "user", None))
+        self.write(request, response, body_shape, user_class, latency_ms)
+        return response
+
+    async def __acall__(self, request):
+        body_shape = get_body_shape(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        latency_ms = (time.perf_counter() - started) * 1000
+        user_class = await sync_to_async(get_user_class)(await request.auser())
+        self.write(request, response, body_shape, user_class, latency_ms)
+        return response
+
+    def write(self, request, response, body_shape, user_class, latency_ms):
+        record = {
+            "ts": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "query": sanitize_query(request.GET),
+            "body_shape": body_shape,
+            "user_class": user_class,
+            "latency_ms": round(latency_ms, 2),
+            "status": response.status_code,
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            with open(self.log_path, "a", encoding="utf-8") as log_file:
+                log_file.write(line + "\n")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """
+    execute_wrapper, считающий количество SQL-запросов и суммарное время в БД.
+    С enable_slow_log() запросы дольше SLOW_QUERY_THRESHOLD_MS уходят в журнал медленных запросов.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.paused = False
+        self.slow_log = None
+        self.slow_threshold = None
+
+    def enable_slow_log(self, request):
+        self.slow_threshold = slow_query_threshold()
+        if self.slow_threshold is not None:
+            self.slow_log = SlowQueryLog(request, self)
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.paused:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+        if self.slow_log is not None and elapsed >= self.slow_threshold:
+            self.slow_log.record(context["connection"], sql, params, many, elapsed)
+        return result
+
+
+def get_view_action(view_func, method):
+    """Возвращает (класс вьюсета, действие) для view, созданного роутером DRF"""
+    viewset = getattr(view_func, "cls", None)
+    actions = getattr(view_func, "actions", None) or {}
+    return viewset, actions.get(method.lower())
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает SQL-запросы и время в БД на каждый запрос и отдаёт их в заголовке Server-Timing
+    с разбивкой на db, serialize и render; те же данные попадают в метрики (/metrics). Лимиты запросов задаются на вьюсетах
+    атрибутом query_budget = {"действие": лимит}, реакция на превышение - настройкой
+    QUERY_BUDGET_MODE ("log", "raise" или "off").
+
+    Под ASGI запросы выполняются в других потоках со своими соединениями,
+    поэтому там в заголовок попадает только total.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        request.query_stats = stats
+        request.view_timing = {}
+        stats.enable_slow_log(request)
+        started = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        timing = request.view_timing
+        view_started = timing.get("started", finished)
+        view_finished = timing.get("finished", finished)
+        view_queries = timing.get("end_count", stats.count) - timing.get("count", stats.count)
+        view_db = timing.get("end_duration", stats.duration) - timing.get("duration", stats.duration)
+
+        self.add_server_timing(response, [
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+            f"serialize;dur={max(view_finished - view_started - view_db, 0) * 1000:.1f}",
+            f"render;dur={(finished - view_finished) * 1000:.1f}",
+            f"total;dur={(finished - started) * 1000:.1f}",
+        ])
+
+        record_request(
+            timing.get("view"), request.method, response.status_code, finished - started,
+            queries=stats.count, size=None if response.streaming else len(response.content),
+        )
+
+        budget = timing.get("budget")
+        response.query_count = view_queries
+        response.query_budget = budget
+        if budget is not None and view_queries > budget:
+            self.budget_exceeded(request, timing, view_queries, budget)
+        return response
+
+    async def __acall__(self, request):
+        request.query_stats = QueryStats()
+        request.view_timing = {}
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        duration = time.perf_counter() - started
+        self.add_server_timing(response, [f"total;dur={duration * 1000:.1f}"])
+        record_request(
+            request.view_timing.get("view"), request.method, response.status_code, duration,
+            size=None if response.streaming else len(response.content),
+        )
+        return response
+
+    def add_server_timing(self, response, metrics):
+        if response.has_header("Server-Timing"):
+            metrics.insert(0, response["Server-Timing"])
+        response["Server-Timing"] = ", ".join(metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        viewset, action = get_view_action(view_func, request.method)
+        budgets = getattr(viewset, "query_budget", None) or {}
+        request.view_timing.update({
+            "view": f"{viewset.__name__}.{action}" if viewset else getattr(view_func, "__name__", ""),
+            "budget": budgets.get(action),
+            "started": time.perf_counter(),
+            "count": request.query_stats.count,
+            "duration": request.query_stats.duration,
+        })
+
+    def process_template_response(self, request, response):
+        # Ответ DRF ещё не отрендерен: всё, что было до этого момента, - работа view
+        request.view_timing.update({
+            "finished": time.perf_counter(),
+            "end_count": request.query_stats.count,
+            "end_duration": request.query_stats.duration,
+        })
+        return response
+
+    def budget_exceeded(self, request, timing, query_count, budget):
+        mode = getattr(settings, "QUERY_BUDGET_MODE", "log")
+        message = (
+            f"{timing['view']}: {query_count} SQL-запросов при лимите {budget} "
+            f"({request.method} {request.path})"
+        )
+        if mode == "raise":
+            raise QueryBudgetExceeded(message)
+        if mode == "log":
+            logger.warning(message)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование отдельного запроса по заголовку X-Profile или параметру ?_profile=
+    ("cpu", "mem", "cpu,mem"): только для администраторов, вошедших через сессию.
+    Снимки смотрят через /api/profiles/. Без переключателя - одна проверка словаря.
+    Под ASGI запросы не профилируются: cProfile не видит работу между await.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        switch = request.headers.get("X-Profile") or request.GET.get("_profile")
+        if not switch:
+            return self.get_response(request)
+        modes = parse_modes(switch)
+        if not modes or not request.user.is_staff:
+            return self.get_response(request)
+        if not capture_lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response["X-Profile"] = "busy"
+            return response
+
+        capture = Capture(modes)
+        try:
+            capture.start()
+            try:
+                # Ответ возвращается уже отрендеренным: сериализация и рендер тоже в профиле
+                response = self.get_response(request)
+            finally:
+                capture.stop()
+        finally:
+            capture_lock.release()
+        meta = capture.save(request, response)
+        response["X-Profile-Id"] = meta["id"]
+        return response
+
+
+def has_access(view_func, request, action, args, kwargs):
+    """
+    Аутентификация и проверка прав вьюсета DRF до захвата слота: иначе анонимные запросы
+    занимали бы дорогие слоты до того, как вьюсет их отклонит. Пользователь сессии уже
+    загружен AuthenticationMiddleware, поэтому повторная проверка во вьюсете не идёт в БД.
+    """
+    view = view_func.cls(**view_func.initkwargs)
+    view.action_map = view_func.actions
+    view.action = action
+    view.args, view.kwargs = args, kwargs
+    view.format_kwarg = None
+    # DRF записывает найденного пользователя и в request.user: возвращаем прежнего,
+    # чтобы вьюсет аутентифицировал запрос заново, как без middleware
+    user = getattr(request, "user", None)
+    try:
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.perform_authentication(view.request)
+        view.check_permissions(view.request)
+    except APIException:
+        return False
+    finally:
+        if user is not None:
+            request.user = user
+    return True
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Ограничивает одновременные дорогие действия. Класс стоимости задаётся на вьюсете
+    атрибутом concurrency_class = {"действие": "export" | "stats" | "list"}, лимиты -
+    настройкой CONCURRENCY_LIMITS. Запрос ждёт слот до timeout класса, затем получает 503
+    с Retry-After; остальные запросы не ограничиваются. Запросы, которые вьюсет отклонит
+    по аутентификации или правам, слот не занимают (has_access). Под ASGI запрос не ждёт слот,
+    чтобы не занимать общий поток sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        viewset, action = get_view_action(view_func, request.method)
+        cost_class = (getattr(viewset, "concurrency_class", None) or {}).get(action)
+        limiter = get_limiter(cost_class) if cost_class else None
+        if limiter is None:
+            return None
+        if not has_access(view_func, request, action, view_args, view_kwargs):
+            # Вьюсет сам ответит 401/403, слот такому запросу не нужен
+            return None
+        slot = limiter.acquire(timeout=0 if self.async_mode else None)
+        if slot is None:
+            response = JsonResponse({"detail": "Сервер перегружен, повторите запрос позже"}, status=503)
+            response["Retry-After"] = str(limiter.retry_after())
+            return response
+        request.concurrency_slot = (limiter, slot, time.perf_counter())
+        return None
+
+    def release(self, request):
+        held = getattr(request, "concurrency_slot", None)
+        if held is not None:
+            limiter, slot, started = held
+            del request.concurrency_slot
+            limiter.release(slot, time.perf_counter() - started)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0002_player_totp_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Производные фото'),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='logo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Производные логотипа'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:14
+
+import tournaments.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0003_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='player',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=tournaments.storage.select_media_storage, upload_to='tournaments_img', verbose_name='Фото игрока'),
+        ),
+        migrations.AlterField(
+            model_name='team',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=tournaments.storage.select_media_storage, upload_to='tournaments_img', verbose_name='Логотип команды'),
+        ),
+    ]
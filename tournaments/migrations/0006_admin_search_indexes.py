@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:21
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0005_task_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='match',
+            name='match_date',
+            field=models.DateTimeField(db_index=True, verbose_name='Дата матча'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='player_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(django.db.models.functions.comparison.Collate('nickname', 'nocase'), name='player_nickname_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='team_name_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tournament',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'nocase'), name='tournament_name_nocase_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0006_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMatch',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='ID матча')),
+                ('match_date', models.DateTimeField(db_index=True, verbose_name='Дата матча')),
+                ('team1_score', models.IntegerField(default=0, verbose_name='Счёт команды 1')),
+                ('team2_score', models.IntegerField(default=0, verbose_name='Счёт команды 2')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+                ('team1', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_team1_matches', to='tournaments.team', verbose_name='Команда 1')),
+                ('team2', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_team2_matches', to='tournaments.team', verbose_name='Команда 2')),
+                ('tournament', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_matches', to='tournaments.tournament', verbose_name='Турнир')),
+                ('winner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_won_matches', to='tournaments.team', verbose_name='Победитель')),
+            ],
+            options={
+                'verbose_name': 'Архивный матч',
+                'verbose_name_plural': 'Архив матчей',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0007_match_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedmatch',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Внешний ID'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Внешний ID'),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Внешний ID'),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Внешний ID'),
+        ),
+    ]
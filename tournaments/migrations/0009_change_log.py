@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0008_external_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=30, verbose_name='Тип объекта')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалён')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'indexes': [models.Index(fields=['model', 'object_id'], name='tournaments_model_44b169_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0009_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(max_length=50, verbose_name='Тип события')),
+                ('tournament_id', models.IntegerField(blank=True, null=True, verbose_name='ID турнира')),
+                ('payload', models.JSONField(verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Событие вебхука',
+                'verbose_name_plural': 'Очередь событий вебхуков',
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, verbose_name='Адрес')),
+                ('secret', models.CharField(max_length=128, verbose_name='Секрет')),
+                ('event_types', models.JSONField(blank=True, default=list, help_text='Пустой список - все события', verbose_name='Типы событий')),
+                ('active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('cursor', models.BigIntegerField(default=0, verbose_name='Курсор')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Неудачных попыток подряд')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tournaments.tournament', verbose_name='Турнир')),
+            ],
+            options={
+                'verbose_name': 'Подписка на вебхуки',
+                'verbose_name_plural': 'Подписки на вебхуки',
+            },
+        ),
+    ]
@@ -1,17 +1,29 @@
 from django.db import models
-from django.contrib.auth.models import User
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.functions import Collate
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-import pyotp
+from django.utils import timezone
+
+from .events import hub, match_payload
+from .images import IMAGE_FIELDS, delete_derivatives, schedule_derivatives
+from .storage import select_media_storage
+from .tasks import enqueue
+from .webhooks import record_event, tournament_payload
 
 class Team(models.Model):
     name = models.TextField("Название команды")
-    logo = models.ImageField("Логотип команды", null=True, blank=True, upload_to="tournaments_img")
+    logo = models.ImageField("Логотип команды", null=True, blank=True, upload_to="tournaments_img", storage=select_media_storage)
+    logo_derivatives = models.JSONField("Производные логотипа", default=dict, blank=True, editable=False)
     created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+    # Ключ записи у внешнего поставщика результатов (upsert через /api/.../upsert/)
+    external_id = models.CharField("Внешний ID", max_length=100, unique=True, null=True, blank=True)
     
     class Meta:
         verbose_name = "Команда"
         verbose_name_plural = "Команды"
+        # Индексы без учёта регистра: по ним работает поиск по началу строки в админке (LIKE 'x%')
+        indexes = [models.Index(Collate("name", "nocase"), name="team_name_nocase_idx")]
     
     def __str__(self) -> str:
         return self.name
@@ -19,7 +31,8 @@ class Team(models.Model):
 class Player(models.Model):
     name = models.TextField("Имя игрока")
     nickname = models.TextField("Никнейм")
-    photo = models.ImageField("Фото игрока", null=True, blank=True, upload_to="tournaments_img")
+    photo = models.ImageField("Фото игрока", null=True, blank=True, upload_to="tournaments_img", storage=select_media_storage)
+    photo_derivatives = models.JSONField("Производные фото", default=dict, blank=True, editable=False)
     team = models.ForeignKey("Team", verbose_name="Команда", on_delete=models.CASCADE, null=True, blank=True)
     user = models.OneToOneField("auth.User", verbose_name="Пользователь", on_delete=models.CASCADE, null=True, blank=True)
     totp_key = models.CharField(max_length=128, null=True)
@@ -27,12 +40,25 @@ class Player(models.Model):
     class Meta:
         verbose_name = "Игрок"
         verbose_name_plural = "Игроки"
+        indexes = [
+            models.Index(Collate("name", "nocase"), name="player_name_nocase_idx"),
+            models.Index(Collate("nickname", "nocase"), name="player_nickname_nocase_idx"),
+        ]
     
     def __str__(self) -> str:
         return f"{self.name} ({self.nickname})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем имя и никнейм: пользователь синхронизируется только при их изменении
+        instance._loaded_identity = (instance.__dict__.get("name"), instance.__dict__.get("nickname"))
+        return instance
+    
     def save(self, *args, **kwargs):
         if self.id is None: 
+            import pyotp
+
             self.totp_key = pyotp.random_base32()
 
         super().save(*args, **kwargs)
@@ -53,22 +79,30 @@ class Tournament(models.Model):
     category = models.ForeignKey("TournamentCategory", verbose_name="Категория", on_delete=models.CASCADE, null=True)
     start_date = models.DateField("Дата начала")
     end_date = models.DateField("Дата окончания")
+    external_id = models.CharField("Внешний ID", max_length=100, unique=True, null=True, blank=True)
     
     class Meta:
         verbose_name = "Турнир"
         verbose_name_plural = "Турниры"
+        indexes = [models.Index(Collate("name", "nocase"), name="tournament_name_nocase_idx")]
     
     def __str__(self) -> str:
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # Событие для вебхуков пишется сигналом post_save в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 class Match(models.Model):
     tournament = models.ForeignKey("Tournament", verbose_name="Турнир", on_delete=models.CASCADE, null=True)
     team1 = models.ForeignKey("Team", verbose_name="Команда 1", on_delete=models.CASCADE, related_name="team1_matches", null=True)
     team2 = models.ForeignKey("Team", verbose_name="Команда 2", on_delete=models.CASCADE, related_name="team2_matches", null=True)
-    match_date = models.DateTimeField("Дата матча")
+    match_date = models.DateTimeField("Дата матча", db_index=True)
     team1_score = models.IntegerField("Счёт команды 1", default=0)
     team2_score = models.IntegerField("Счёт команды 2", default=0)
     winner = models.ForeignKey("Team", verbose_name="Победитель", on_delete=models.CASCADE, null=True, blank=True)
+    external_id = models.CharField("Внешний ID", max_length=100, unique=True, null=True, blank=True)
     
     class Meta:
         verbose_name = "Матч"
@@ -77,6 +111,13 @@ class Match(models.Model):
     def __str__(self) -> str:
         return f"{self.team1} vs {self.team2}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженный счёт, чтобы отличать изменение счёта от прочих правок
+        instance._loaded_scores = (instance.__dict__.get("team1_score"), instance.__dict__.get("team2_score"))
+        return instance
+    
     def save(self, *args, **kwargs):
         # Автоматически определяем победителя на основе счета
         if self.team1_score > self.team2_score:
@@ -85,64 +126,149 @@ class Match(models.Model):
             self.winner = self.team2
         else:
             self.winner = None  # ничья
+        # Сигналы post_save пишут событие в очередь вебхуков в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ArchivedMatch(models.Model):
+    """
+    Архив сыгранных матчей завершённых турниров (команда archive_matches).
+    Поля совпадают с Match, id сохраняется, поэтому сериализаторы матчей подходят и для архива.
+    """
+    id = models.IntegerField("ID матча", primary_key=True)
+    tournament = models.ForeignKey("Tournament", verbose_name="Турнир", on_delete=models.CASCADE, related_name="archived_matches", null=True)
+    team1 = models.ForeignKey("Team", verbose_name="Команда 1", on_delete=models.CASCADE, related_name="archived_team1_matches", null=True)
+    team2 = models.ForeignKey("Team", verbose_name="Команда 2", on_delete=models.CASCADE, related_name="archived_team2_matches", null=True)
+    match_date = models.DateTimeField("Дата матча", db_index=True)
+    team1_score = models.IntegerField("Счёт команды 1", default=0)
+    team2_score = models.IntegerField("Счёт команды 2", default=0)
+    winner = models.ForeignKey("Team", verbose_name="Победитель", on_delete=models.CASCADE, related_name="archived_won_matches", null=True, blank=True)
+    external_id = models.CharField("Внешний ID", max_length=100, unique=True, null=True, blank=True)
+    archived_at = models.DateTimeField("Дата архивации", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Архивный матч"
+        verbose_name_plural = "Архив матчей"
+
+    def __str__(self) -> str:
+        return f"{self.team1} vs {self.team2}"
+
+
+class ChangeLog(models.Model):
+    """
+    Журнал изменений для /api/changes/: id - курсор синхронизации.
+    Запись хранит только тип и id объекта, данные берутся при чтении ленты.
+    """
+    # Отметка сжатия журнала: object_id - курсор, до которого удалены записи об удалениях
+    HORIZON = "*"
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField("Тип объекта", max_length=30)
+    object_id = models.BigIntegerField("ID объекта")
+    deleted = models.BooleanField("Удалён", default=False)
+    created_at = models.DateTimeField("Дата изменения", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Изменение"
+        verbose_name_plural = "Журнал изменений"
+        indexes = [models.Index(fields=["model", "object_id"])]
+
+    def __str__(self) -> str:
+        return f"{self.model} #{self.object_id}"
+
+
+class WebhookSubscription(models.Model):
+    """Подписка внешней системы на события матчей и турниров (доставляет команда deliver_webhooks)"""
+    url = models.URLField("Адрес", max_length=500)
+    # Ключ подписи HMAC-SHA256 (заголовок X-Webhook-Signature)
+    secret = models.CharField("Секрет", max_length=128)
+    event_types = models.JSONField("Типы событий", default=list, blank=True, help_text="Пустой список - все события")
+    tournament = models.ForeignKey("Tournament", verbose_name="Турнир", on_delete=models.CASCADE, null=True, blank=True)
+    active = models.BooleanField("Активна", default=True)
+    # Последнее доставленное событие очереди (WebhookEvent.id)
+    cursor = models.BigIntegerField("Курсор", default=0)
+    attempts = models.PositiveIntegerField("Неудачных попыток подряд", default=0)
+    next_attempt_at = models.DateTimeField("Следующая попытка", default=timezone.now)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Подписка на вебхуки"
+        verbose_name_plural = "Подписки на вебхуки"
+
+    def __str__(self) -> str:
+        return self.url
+
+    def save(self, *args, **kwargs):
+        # Новая подписка получает события начиная с момента создания, без истории
+        if self._state.adding and not self.cursor:
+            self.cursor = WebhookEvent.objects.aggregate(cursor=models.Max("id"))["cursor"] or 0
         super().save(*args, **kwargs)
 
 
-# Сигнал для автоматического создания пользователя при создании игрока
-@receiver(post_save, sender=Player)
-def create_user_for_player(sender, instance, created, **kwargs):
-    if created and not instance.user:
-        # Формируем username из имени и никнейма
-        username = f"{instance.name}_{instance.nickname}".replace(' ', '_')
-        
-        # Пароль = имя игрока
-        password = instance.name
-        
-        try:
-            # Создаем пользователя с паролем = имя игрока
-            user = User.objects.create_user(
-                username=username,
-                email=f"{username}@example.com",
-                password=password,  # Пароль = имя игрока
-                first_name=instance.name
-            )
-            instance.user = user
-            instance.totp_key = pyotp.random_base32()
-            instance.save()
-            
-            print(f"Создан пользователь для игрока {instance.name}:")
-            print(f"Username: {username}")
-            print(f"Password: {password}")
-            print(f"Email: {username}@example.com")
-            
-        except Exception as e:
-            print(f"Ошибка при создании пользователя для игрока: {e}")
-
-# Сигнал для обновления пользователя при изменении игрока
+class WebhookEvent(models.Model):
+    """
+    Очередь исходящих событий (transactional outbox): строка пишется в той же
+    транзакции, что и изменение матча или турнира, и доставляется воркером после коммита.
+    """
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField("Тип события", max_length=50)
+    tournament_id = models.IntegerField("ID турнира", null=True, blank=True)
+    payload = models.JSONField("Данные")
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Событие вебхука"
+        verbose_name_plural = "Очередь событий вебхуков"
+
+    def __str__(self) -> str:
+        return f"{self.event_type} #{self.id}"
+
+
+class Task(models.Model):
+    """Фоновая задача для воркера run_tasks (см. tournaments.tasks)"""
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (FAILED, "Ошибка"),
+    ]
+
+    name = models.CharField("Задача", max_length=100)
+    # Ключ склейки: пока задача ждёт в очереди, повторная постановка с тем же ключом ничего не добавляет
+    key = models.CharField("Ключ", max_length=255, unique=True, null=True, blank=True)
+    payload = models.JSONField("Параметры", default=dict)
+    status = models.CharField("Статус", max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField("Попыток", default=0)
+    run_after = models.DateTimeField("Не раньше", default=timezone.now)
+    locked_at = models.DateTimeField("Взята воркером", null=True, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self) -> str:
+        return f"{self.name} #{self.id}"
+
+
+# Создание и обновление пользователя игрока (с хешированием пароля) выполняет воркер:
+# задачи склеиваются по игроку, правки фото или команды пользователя не трогают
 @receiver(post_save, sender=Player)
-def update_user_for_player(sender, instance, created, **kwargs):
-    if not created and instance.user:
-        try:
-            # Обновляем данные пользователя
-            instance.user.first_name = instance.name
-            
-            # Обновляем username
-            new_username = f"{instance.name}_{instance.nickname}".replace(' ', '_')
-            
-            if instance.user.username != new_username:
-                instance.user.username = new_username
-            
-            # Обновляем пароль на имя игрока
-            instance.user.set_password(instance.name)
-            
-            instance.user.email = f"{new_username}@example.com"
-            instance.user.save()
-            
-            print(f"Обновлен пользователь для игрока {instance.name}:")
-            print(f"New password: {instance.name}")
-            
-        except Exception as e:
-            print(f"Ошибка при обновлении пользователя для игрока: {e}")
+def sync_user_for_player(sender, instance, created, **kwargs):
+    identity = (instance.name, instance.nickname)
+    if created:
+        changed = not instance.user_id
+    else:
+        changed = instance.user_id and getattr(instance, "_loaded_identity", None) != identity
+    instance._loaded_identity = identity
+    if changed:
+        enqueue("sync_player_user", key=f"sync_player_user:{instance.pk}", player_id=instance.pk)
 
 # Сигнал для удаления пользователя при удалении игрока
 @receiver(post_delete, sender=Player)
@@ -152,4 +278,78 @@ def delete_user_for_player(sender, instance, **kwargs):
             instance.user.delete()
             print(f"Пользователь {instance.user.username} удален")
     except Exception as e:
-        print(f"Ошибка при удалении пользователя для игрока: {e}")
\ No newline at end of file
+        print(f"Ошибка при удалении пользователя для игрока: {e}")
+
+
+# Сигналы для ленты событий матчей (SSE): событие уходит подписчикам после коммита
+@receiver(post_save, sender=Match)
+def publish_match_saved(sender, instance, created, **kwargs):
+    scores = (instance.team1_score, instance.team2_score)
+    if created:
+        event_type = "match.created"
+    elif getattr(instance, "_loaded_scores", scores) != scores:
+        event_type = "match.score"
+    else:
+        event_type = "match.updated"
+    instance._loaded_scores = scores
+
+    data = match_payload(instance)
+    record_event(event_type, data)
+    transaction.on_commit(lambda: hub.publish(event_type, data))
+
+@receiver(post_delete, sender=Match)
+def publish_match_deleted(sender, instance, **kwargs):
+    data = match_payload(instance)
+    record_event("match.deleted", data)
+    transaction.on_commit(lambda: hub.publish("match.deleted", data))
+
+# События турниров уходят только в вебхуки
+@receiver(post_save, sender=Tournament)
+def record_tournament_saved(sender, instance, created, **kwargs):
+    record_event("tournament.created" if created else "tournament.updated", tournament_payload(instance))
+
+@receiver(post_delete, sender=Tournament)
+def record_tournament_deleted(sender, instance, **kwargs):
+    record_event("tournament.deleted", tournament_payload(instance))
+
+
+# Сигналы для производных изображений (миниатюры, WebP): строятся в фоне после загрузки файла
+@receiver(pre_save, sender=Team)
+@receiver(pre_save, sender=Player)
+def detect_image_upload(sender, instance, **kwargs):
+    image_field, _ = IMAGE_FIELDS[sender._meta.label]
+    field_file = getattr(instance, image_field)
+    # Незафиксированный файл - это новая загрузка, он сохранится в хранилище при save()
+    instance._image_uploaded = bool(field_file) and not field_file._committed
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Player)
+def build_image_derivatives(sender, instance, **kwargs):
+    if getattr(instance, "_image_uploaded", False):
+        instance._image_uploaded = False
+        label, pk = sender._meta.label, instance.pk
+        transaction.on_commit(lambda: schedule_derivatives(label, pk))
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Player)
+def delete_image_derivatives(sender, instance, **kwargs):
+    image_field, derivatives_field = IMAGE_FIELDS[sender._meta.label]
+    delete_derivatives(getattr(instance, image_field).storage, getattr(instance, derivatives_field))
+
+
+# Журнал изменений для дельта-синхронизации (/api/changes/): пишется в той же транзакции, что и изменение
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Player)
+@receiver(post_save, sender=Tournament)
+@receiver(post_save, sender=TournamentCategory)
+@receiver(post_save, sender=Match)
+def log_saved_change(sender, instance, **kwargs):
+    ChangeLog.objects.create(model=sender._meta.model_name, object_id=instance.pk)
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Player)
+@receiver(post_delete, sender=Tournament)
+@receiver(post_delete, sender=TournamentCategory)
+@receiver(post_delete, sender=Match)
+def log_deleted_change(sender, instance, **kwargs):
+    ChangeLog.objects.create(model=sender._meta.model_name, object_id=instance.pk, deleted=True)
@@ -0,0 +1,141 @@
+import io
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+# Снимки профиля отдельных запросов для администраторов (см. ProfilingMiddleware):
+# cProfile - дамп pstats, tracemalloc - топ строк по выделенной памяти.
+# Хранятся в PROFILES_DIR кольцевым буфером из PROFILES_MAX_CAPTURES снимков.
+
+MODES = {"cpu", "mem"}
+CAPTURE_ID = r"[0-9a-f]{32}"
+# cProfile и tracemalloc глобальны для процесса: одновременно профилируется один запрос
+capture_lock = threading.Lock()
+
+
+def parse_modes(value):
+    """Режимы из заголовка X-Profile или параметра ?_profile=: "cpu", "mem", "cpu,mem", "1" - оба"""
+    value = (value or "").strip().lower()
+    if value in ("1", "all", "true"):
+        return set(MODES)
+    return {mode.strip() for mode in value.split(",")} & MODES
+
+
+def profile_storage():
+    return FileSystemStorage(location=settings.PROFILES_DIR)
+
+
+class Capture:
+    """Профилирование одного запроса; start()/stop() вызываются под capture_lock"""
+
+    def __init__(self, modes):
+        self.modes = modes
+        self.id = uuid.uuid4().hex
+        self.profiler = None
+        if "cpu" in modes:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self.started_tracing = False
+        self.snapshot = None
+
+    def start(self):
+        if "mem" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILE_TRACEBACK_FRAMES)
+            self.started_tracing = True
+        if "mem" in self.modes:
+            tracemalloc.clear_traces()
+        self.started = time.perf_counter()
+        if self.profiler:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+        if "mem" in self.modes:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            if self.started_tracing:
+                tracemalloc.stop()
+
+    def save(self, request, response):
+        """Пишет файлы снимка и вытесняет самые старые снимки сверх лимита"""
+        storage = profile_storage()
+        os.makedirs(storage.location, exist_ok=True)
+        files = {}
+        if self.profiler:
+            files["cpu"] = f"{self.id}.prof"
+            self.profiler.dump_stats(storage.path(files["cpu"]))
+        if self.snapshot:
+            files["mem"] = f"{self.id}.mem.txt"
+            with open(storage.path(files["mem"]), "w", encoding="utf-8") as mem_file:
+                mem_file.write(allocation_summary(self.snapshot, self.peak))
+        meta = {
+            "id": self.id,
+            "created_at": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "duration_ms": round(self.duration * 1000, 2),
+            "user": request.user.get_username(),
+            "files": files,
+        }
+        with open(storage.path(f"{self.id}.json"), "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False)
+        prune_captures(storage)
+        return meta
+
+
+def allocation_summary(snapshot, peak):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    stats = snapshot.statistics("lineno")
+    lines = [f"Пик: {peak / 1024:.1f} KiB, всего: {sum(s.size for s in stats) / 1024:.1f} KiB"]
+    for stat in stats[:settings.PROFILE_TOP_ALLOCATIONS]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+def cpu_summary(path, limit=30):
+    """Текстовый топ функций по суммарному времени из дампа pstats"""
+    import pstats
+
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+def list_captures(storage=None):
+    """Метаданные снимков, новые первыми"""
+    storage = storage or profile_storage()
+    if not os.path.isdir(storage.location):
+        return []
+    captures = []
+    for name in storage.listdir("")[1]:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with storage.open(name) as meta_file:
+                captures.append(json.load(meta_file))
+        except (OSError, ValueError):
+            continue
+    return sorted(captures, key=lambda meta: meta["created_at"], reverse=True)
+
+
+def delete_capture(storage, meta):
+    for name in [*meta.get("files", {}).values(), f"{meta['id']}.json"]:
+        storage.delete(name)
+
+
+def prune_captures(storage):
+    for meta in list_captures(storage)[settings.PROFILES_MAX_CAPTURES:]:
+        delete_capture(storage, meta)
@@ -0,0 +1,246 @@
+import math
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .changes import record_changes
+from .db import retry_on_locked
+from .events import hub, match_payload
+from .models import Team, Match
+from .webhooks import record_events
+
+# Генерация расписания турнира (действие schedule вьюсета турниров):
+# круговая система - все туры сразу; швейцарская система и олимпийская сетка -
+# следующий тур по уже сыгранным матчам турнира, потому что пары зависят от результатов.
+# Матчи пишутся одним bulk_create, туры равномерно распределяются между start_date и end_date.
+
+FORMATS = ("round_robin", "swiss", "bracket")
+MATCH_TIME = time(18, 0)
+# Предел шагов перебора при составлении пар швейцарской системы
+SWISS_MAX_STEPS = 200000
+
+
+def round_robin(team_ids, legs=1):
+    """
+    Туры круговой системы методом круга: первая команда на месте, остальные вращаются.
+    При нечётном числе команд одна в каждом туре отдыхает. Во втором круге хозяева меняются.
+    """
+    teams = list(team_ids) + ([None] if len(team_ids) % 2 else [])
+    half = len(teams) // 2
+    rounds = []
+    for number in range(len(teams) - 1):
+        pairs = []
+        for index in range(half):
+            home, away = teams[index], teams[-1 - index]
+            # Чередуем хозяев: домашних матчей у команд поровну, с разницей не больше двух
+            if (index == 0 and number % 2) or (index and index % 2):
+                home, away = away, home
+            if home is not None and away is not None:
+                pairs.append((home, away))
+        rounds.append(pairs)
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds + [[(away, home) for home, away in pairs] for pairs in rounds] * (legs - 1)
+
+
+def bracket_order(size):
+    """Номера посевов по позициям сетки: 1 и 2 встречаются только в финале ([1, 4, 2, 3] для 4)"""
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def match_results(tournament, team_ids, now):
+    """Матчи турнира между командами расписания: (команда 1, команда 2, победитель, сыгран)"""
+    return [
+        (team1, team2, winner, match_date <= now)
+        for team1, team2, winner, match_date in Match.objects.filter(
+            tournament=tournament, team1__in=team_ids, team2__in=team_ids,
+        ).values_list("team1_id", "team2_id", "winner_id", "match_date")
+    ]
+
+
+def bracket_round(team_ids, results):
+    """
+    Следующий тур олимпийской сетки: (номер тура, всего туров, пары). team_ids - посев, первая команда
+    сильнейшая; сильнейшие проходят первый тур без игры, если команд не степень двойки.
+    """
+    size = 2 ** math.ceil(math.log2(len(team_ids)))
+    slots = [team_ids[seed - 1] if seed <= len(team_ids) else None for seed in bracket_order(size)]
+    played = {frozenset((team1, team2)): (winner, finished) for team1, team2, winner, finished in results}
+    total = int(math.log2(size))
+    for number in range(1, total + 1):
+        pairs, winners = [], []
+        for home, away in zip(slots[::2], slots[1::2]):
+            if home is None or away is None:
+                winners.append(away if home is None else home)
+                continue
+            result = played.get(frozenset((home, away)))
+            if result is None:
+                pairs.append((home, away))
+                winners.append(None)
+                continue
+            winner, finished = result
+            if not finished:
+                raise ValidationError(f"Тур {number} ещё не сыгран")
+            if winner is None:
+                raise ValidationError(f"Ничья в матче на выбывание в туре {number}: укажите победителя")
+            winners.append(winner)
+        if pairs:
+            return number, total, pairs
+        slots = winners
+    raise ValidationError("Сетка уже сыграна")
+
+
+def pair_swiss(order, played):
+    """
+    Пары тура без повторных встреч: order - команды от лидера к аутсайдеру. Каждая команда
+    по очереди получает ближайшего по таблице свободного соперника, с которым ещё не играла;
+    в тупике - возврат к предыдущей паре. None - разбиение не найдено за SWISS_MAX_STEPS шагов.
+    """
+    paired = [False] * len(order)
+    pairs = []
+    steps = 0
+
+    def search(start):
+        nonlocal steps
+        while start < len(order) and paired[start]:
+            start += 1
+        if start == len(order):
+            return True
+        paired[start] = True
+        for candidate in range(start + 1, len(order)):
+            if paired[candidate] or frozenset((order[start], order[candidate])) in played:
+                continue
+            steps += 1
+            if steps > SWISS_MAX_STEPS:
+                break
+            paired[candidate] = True
+            pairs.append((order[start], order[candidate]))
+            if search(start + 1):
+                return True
+            pairs.pop()
+            paired[candidate] = False
+        paired[start] = False
+        return False
+
+    return pairs if search(0) else None
+
+
+def swiss_round(team_ids, results, rounds):
+    """
+    Следующий тур швейцарской системы: (номер тура, пары). Очки - 1 за победу и 0.5 за ничью,
+    при равенстве выше команда с лучшим посевом. При нечётном числе команд отдыхает
+    последняя в таблице из тех, кто ещё не отдыхал.
+    """
+    if any(not finished for *_, finished in results):
+        raise ValidationError("Предыдущий тур ещё не сыгран")
+    scores = dict.fromkeys(team_ids, 0.0)
+    games = dict.fromkeys(team_ids, 0)
+    home_games = dict.fromkeys(team_ids, 0)
+    played = set()
+    for team1, team2, winner, _ in results:
+        played.add(frozenset((team1, team2)))
+        games[team1] += 1
+        games[team2] += 1
+        home_games[team1] += 1
+        if winner is None:
+            scores[team1] += 0.5
+            scores[team2] += 0.5
+        else:
+            scores[winner] += 1
+
+    number = max(games.values()) + 1
+    if number > rounds:
+        raise ValidationError(f"Все {rounds} туров уже сыграны")
+    seed = {team: index for index, team in enumerate(team_ids)}
+    order = sorted(team_ids, key=lambda team: (-scores[team], seed[team]))
+
+    byes = [None]
+    if len(order) % 2:
+        byes = [team for team in reversed(order) if games[team] == number - 1] or list(reversed(order))
+    for bye in byes:
+        pairs = pair_swiss([team for team in order if team != bye], played)
+        if pairs is not None:
+            break
+    else:
+        raise ValidationError("Не удалось составить тур без повторных встреч")
+    # Хозяин - команда, реже игравшая первой
+    return number, [
+        (home, away) if home_games[home] <= home_games[away] else (away, home) for home, away in pairs
+    ]
+
+
+def round_dates(tournament, total):
+    """Время начала каждого тура: равные промежутки от start_date до end_date"""
+    first = timezone.make_aware(datetime.combine(tournament.start_date, MATCH_TIME))
+    last = timezone.make_aware(datetime.combine(tournament.end_date, MATCH_TIME))
+    if total == 1:
+        return [first]
+    step = (last - first) / (total - 1)
+    return [first + step * number for number in range(total)]
+
+
+def validate_teams(team_ids):
+    if len(team_ids) < 2:
+        raise ValidationError("Нужно не меньше двух команд")
+    if len(set(team_ids)) != len(team_ids):
+        raise ValidationError("Команды в списке повторяются")
+    if len(team_ids) > settings.SCHEDULE_MAX_TEAMS:
+        raise ValidationError(f"Не больше {settings.SCHEDULE_MAX_TEAMS} команд в расписании")
+    missing = set(team_ids) - set(Team.objects.filter(id__in=team_ids).values_list("id", flat=True))
+    if missing:
+        raise ValidationError(f"Команды не найдены: {sorted(missing)}")
+
+
+@retry_on_locked
+def schedule_tournament(tournament, kind, team_ids, legs=1, rounds=None):
+    """
+    Создаёт матчи расписания в одной транзакции вместе с чтением сыгранных туров,
+    чтобы два одновременных запроса не сгенерировали один тур дважды.
+    team_ids - в порядке посева. Возвращает описание созданного тура (туров).
+    """
+    validate_teams(team_ids)
+    now = timezone.now()
+
+    if kind == "round_robin":
+        if Match.objects.filter(tournament=tournament).exists():
+            raise ValidationError("В турнире уже есть матчи: круговое расписание создаётся для пустого турнира")
+        schedule = round_robin(team_ids, legs)
+        first, total = 1, len(schedule)
+    elif kind == "swiss":
+        total = rounds or math.ceil(math.log2(len(team_ids)))
+        first, pairs = swiss_round(team_ids, match_results(tournament, team_ids, now), total)
+        schedule = [pairs]
+    else:
+        first, total, pairs = bracket_round(team_ids, match_results(tournament, team_ids, now))
+        schedule = [pairs]
+
+    dates = round_dates(tournament, total)
+    matches = Match.objects.bulk_create([
+        Match(tournament=tournament, team1_id=home, team2_id=away, match_date=dates[first - 1 + number])
+        for number, pairs in enumerate(schedule)
+        for home, away in pairs
+    ])
+
+    # bulk_create не вызывает сигналы: журнал изменений, вебхуки и лента событий - вручную
+    record_changes(Match, [match.id for match in matches])
+    events = [("match.created", match_payload(match)) for match in matches]
+    record_events(events)
+
+    def publish():
+        for event_type, data in events:
+            hub.publish(event_type, data)
+
+    transaction.on_commit(publish)
+    return {
+        "format": kind,
+        "rounds": list(range(first, first + len(schedule))),
+        "total_rounds": total,
+        "created": len(matches),
+        "matches": [data for _, data in events],
+    }
@@ -1,18 +1,29 @@
 from rest_framework import serializers
+from .images import derivative_urls
 from .models import Team, Player, Tournament, Match, TournamentCategory
 
 # Для чтения
 class TeamsCRSerializer(serializers.ModelSerializer):
+    # URL миниатюр и srcset вместо имён файлов; None, пока производные не построены
+    logo_derivatives = serializers.SerializerMethodField()
+
     class Meta:
         model = Team
         fields = "__all__"
 
+    def get_logo_derivatives(self, obj):
+        return derivative_urls(obj.logo.storage, obj.logo_derivatives, self.context.get('request'))
+
 class PlayersCRSerializer(serializers.ModelSerializer):
     team = TeamsCRSerializer(read_only=True)
+    photo_derivatives = serializers.SerializerMethodField()
     
     class Meta:
         model = Player
-        fields = ['id', 'name', 'nickname', 'team', 'photo']
+        fields = ['id', 'name', 'nickname', 'team', 'photo', 'photo_derivatives']
+
+    def get_photo_derivatives(self, obj):
+        return derivative_urls(obj.photo.storage, obj.photo_derivatives, self.context.get('request'))
 
 class TournamentCategoriesCRSerializer(serializers.ModelSerializer):
     class Meta:
@@ -60,4 +71,34 @@ class TournamentsUDSerializer(serializers.ModelSerializer):
 class MatchesUDSerializer(serializers.ModelSerializer):
     class Meta:
         model = Match
-        fields = ['id', 'tournament', 'team1', 'team2', 'match_date', 'team1_score', 'team2_score', 'winner']
\ No newline at end of file
+        fields = ['id', 'tournament', 'team1', 'team2', 'match_date', 'team1_score', 'team2_score', 'winner']
+# Строки внешних лент результатов (upsert по external_id). Ссылки - тоже внешние ID,
+# поэтому проверка строки не обращается к БД
+class TeamsFeedSerializer(serializers.Serializer):
+    external_id = serializers.CharField(max_length=100)
+    name = serializers.CharField()
+
+class TournamentsFeedSerializer(serializers.Serializer):
+    external_id = serializers.CharField(max_length=100)
+    name = serializers.CharField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("Дата окончания раньше даты начала")
+        return data
+
+class MatchesFeedSerializer(serializers.Serializer):
+    external_id = serializers.CharField(max_length=100)
+    tournament = serializers.CharField(max_length=100, allow_null=True, required=False)
+    team1 = serializers.CharField(max_length=100)
+    team2 = serializers.CharField(max_length=100)
+    match_date = serializers.DateTimeField()
+    team1_score = serializers.IntegerField(min_value=0, default=0)
+    team2_score = serializers.IntegerField(min_value=0, default=0)
+
+    def validate(self, data):
+        if data['team1'] == data['team2']:
+            raise serializers.ValidationError("Команда не может играть сама с собой")
+        return data
@@ -0,0 +1,132 @@
+import json
+import logging
+import re
+
+from django.conf import settings
+from django.utils import timezone
+
+# Журнал медленных SQL-запросов: QueryStats (QueryBudgetMiddleware) передаёт сюда запросы
+# дольше SLOW_QUERY_THRESHOLD_MS. Запись - JSON-строка в логгер tournaments.slow_queries
+# (RotatingFileHandler, см. LOGGING) с отпечатком запроса, действием вьюсета, типами
+# параметров (без значений) и планом EXPLAIN QUERY PLAN. Сводку строит команда slow_queries.
+
+logger = logging.getLogger("tournaments.slow_queries")
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%s|\?")
+IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+VALUES_LIST = re.compile(r"\bVALUES\s*\([^)]*\)(?:\s*,\s*\([^)]*\))*", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Запрос без значений: одинаковые по форме запросы (IN с любым числом id) совпадают"""
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = PLACEHOLDER.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql)
+    sql = IN_LIST.sub("IN (...)", sql)
+    sql = VALUES_LIST.sub("VALUES (...)", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+def params_shape(params, many=False):
+    if params is None:
+        return None
+    if many:
+        params = list(params)
+        return {"rows": len(params), "row": params_shape(params[0]) if params else None}
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def explain_sql(connection, sql):
+    if connection.vendor == "sqlite":
+        return f"EXPLAIN QUERY PLAN {sql}"
+    return f"EXPLAIN {sql}"
+
+
+def format_plan(connection, rows):
+    if connection.vendor == "sqlite":
+        # (id, parent, notused, detail): отступ по глубине вложенности
+        depth = {0: -1}
+        lines = []
+        for row_id, parent, _, detail in rows:
+            depth[row_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[row_id] + detail)
+        return lines
+    return [" ".join(str(value) for value in row) for row in rows]
+
+
+class SlowQueryLog:
+    """Пишет медленные запросы одного HTTP-запроса; view берётся из request.view_timing"""
+
+    def __init__(self, request, stats):
+        self.request = request
+        self.stats = stats
+
+    def explain(self, connection, sql, params, many):
+        if many or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        # EXPLAIN идёт через тот же execute_wrapper: в счётчики запросов он не попадает
+        self.stats.paused = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(explain_sql(connection, sql), params)
+                return format_plan(connection, cursor.fetchall())
+        except Exception as e:
+            return [f"EXPLAIN не выполнен: {e}"]
+        finally:
+            self.stats.paused = False
+
+    def record(self, connection, sql, params, many, duration):
+        view = self.request.view_timing.get("view")
+        record = {
+            "ts": timezone.now().isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "fingerprint": fingerprint(sql),
+            "view": view or None,
+            "path": self.request.path,
+            "params_shape": params_shape(params, many),
+            "plan": self.explain(connection, sql, params, many),
+        }
+        logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def threshold():
+    """Порог в секундах или None, если журнал выключен"""
+    value = settings.SLOW_QUERY_THRESHOLD_MS
+    return None if value is None else value / 1000
+
+
+def read_records(paths):
+    for path in paths:
+        try:
+            log_file = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with log_file:
+            for line in log_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(records):
+    """Сводка по отпечаткам: отпечаток -> количество, суммарное и максимальное время, действия, план"""
+    summary = {}
+    for record in records:
+        item = summary.setdefault(record["fingerprint"], {
+            "fingerprint": record["fingerprint"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "views": set(), "plan": None,
+        })
+        item["count"] += 1
+        item["total_ms"] += record["duration_ms"]
+        if record.get("view"):
+            item["views"].add(record["view"])
+        if record["duration_ms"] >= item["max_ms"]:
+            item["max_ms"] = record["duration_ms"]
+            item["plan"] = record.get("plan")
+    return summary
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+# Время импорта при старте процесса: отдельный интерпретатор с -X importtime выполняет
+# django.setup() и импортирует модуль (по умолчанию app.urls - его грузит каждый воркер).
+# Тяжёлые необязательные зависимости (openpyxl, pyotp, PIL) должны загружаться при первом использовании.
+
+HEAVY_MODULES = ["openpyxl", "pyotp", "PIL", "numpy"]
+
+
+@dataclass
+class ImportTimeReport:
+    total_us: int = 0
+    # имя модуля -> (собственное время, время с зависимостями), мкс
+    modules: dict = field(default_factory=dict)
+
+    @property
+    def total_ms(self):
+        return self.total_us / 1000
+
+    def top(self, limit):
+        """Модули с наибольшим собственным временем"""
+        return sorted(self.modules.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+
+
+def parse_importtime(output):
+    """Разбирает строки "import time: self [us] | cumulative | imported package" из stderr"""
+    report = ImportTimeReport()
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        own, cumulative, name = int(parts[0]), int(parts[1]), parts[2]
+        report.modules[name.strip()] = (own, cumulative)
+        # Модуль верхнего уровня (отступ в один пробел) - его время с зависимостями входит в сумму
+        if len(name) - len(name.lstrip(" ")) == 1:
+            report.total_us += cumulative
+    return report
+
+
+def measure_import_time(module="app.urls"):
+    code = f"import django; django.setup(); import {module}"
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "app.settings")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def best_import_time(module="app.urls", runs=3):
+    """Лучший из нескольких запусков: первый прогон часто медленнее из-за холодного кеша ФС"""
+    return min((measure_import_time(module) for _ in range(runs)), key=lambda report: report.total_us)
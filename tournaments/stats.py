@@ -0,0 +1,231 @@
+from django.db.models import Avg, Count, DurationField, Exists, ExpressionWrapper, F, Max, Min, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import Team, Player, Tournament, Match, ArchivedMatch, TournamentCategory
+
+# Статистика по таблицам для действий /stats/. У каждой функции есть асинхронный
+# вариант (префикс a) для ASGI-представлений; запросы и формат ответа у них общие.
+
+
+def team_stats_query():
+    queryset = Team.objects.annotate(player_count=Count('player'))
+    aggregates = dict(
+        total_teams=Count("*"),
+        teams_with_players=Count("id", filter=Q(player_count__gt=0)),
+        teams_without_players=Count("id", filter=Q(player_count=0)),
+        avg_players_per_team=Avg("player_count"),
+        max_players_in_team=Max("player_count"),
+        min_players_in_team=Min("player_count"),
+    )
+    return queryset, aggregates
+
+
+def format_team_stats(team_stats):
+    return {
+        'total_teams': team_stats['total_teams'],
+        'teams_with_players': team_stats['teams_with_players'],
+        'teams_without_players': team_stats['teams_without_players'],
+        'avg_players_per_team': round(team_stats['avg_players_per_team'] or 0, 1),
+        'max_players_in_team': team_stats['max_players_in_team'] or 0,
+        'min_players_in_team': team_stats['min_players_in_team'] or 0,
+    }
+
+
+def get_team_stats():
+    queryset, aggregates = team_stats_query()
+    return format_team_stats(queryset.aggregate(**aggregates))
+
+
+async def aget_team_stats():
+    queryset, aggregates = team_stats_query()
+    return format_team_stats(await queryset.aaggregate(**aggregates))
+
+
+def player_stats_query():
+    aggregates = dict(
+        total_players=Count("*"),
+        players_with_team=Count("id", filter=Q(team__isnull=False)),
+        players_without_team=Count("id", filter=Q(team__isnull=True)),
+        players_with_user=Count("id", filter=Q(user__isnull=False)),
+        players_without_user=Count("id", filter=Q(user__isnull=True)),
+    )
+    return Player.objects.all(), aggregates
+
+
+def format_player_stats(player_stats):
+    return {
+        'total_players': player_stats['total_players'],
+        'players_with_team': player_stats['players_with_team'],
+        'players_without_team': player_stats['players_without_team'],
+        'players_with_user': player_stats['players_with_user'],
+        'players_without_user': player_stats['players_without_user'],
+    }
+
+
+def get_player_stats():
+    queryset, aggregates = player_stats_query()
+    return format_player_stats(queryset.aggregate(**aggregates))
+
+
+async def aget_player_stats():
+    queryset, aggregates = player_stats_query()
+    return format_player_stats(await queryset.aaggregate(**aggregates))
+
+
+def duration(prefix=""):
+    """Продолжительность турнира (end_date - start_date); prefix - путь к турниру из другой модели"""
+    return ExpressionWrapper(F(f'{prefix}end_date') - F(f'{prefix}start_date'), output_field=DurationField())
+
+
+def duration_days(value):
+    return round(value.total_seconds() / 86400, 1) if value else 0
+
+
+def category_stats_queryset():
+    # Категорий немного: одним запросом получаем их все вместе с разбивкой, итоги считаем в Python
+    return TournamentCategory.objects.annotate(
+        tournament_count=Count('tournament'),
+        avg_duration=Avg(duration('tournament__')),
+    ).order_by('-tournament_count', 'id')
+
+
+def format_category_stats(categories):
+    total_categories = len(categories)
+    categories_with_tournaments = sum(1 for category in categories if category.tournament_count)
+    most_popular = categories[0] if categories else None
+    return {
+        'total_categories': total_categories,
+        'categories_with_tournaments': categories_with_tournaments,
+        'categories_without_tournaments': total_categories - categories_with_tournaments,
+        'most_popular_category': most_popular.name if most_popular else "Нет данных",
+        'tournaments_in_popular_category': most_popular.tournament_count if most_popular else 0,
+        'breakdown': [
+            {
+                'id': category.id,
+                'name': category.name,
+                'tournament_count': category.tournament_count,
+                'avg_tournament_duration': duration_days(category.avg_duration),
+            }
+            for category in categories
+        ],
+    }
+
+
+def get_category_stats():
+    return format_category_stats(list(category_stats_queryset()))
+
+
+async def aget_category_stats():
+    return format_category_stats([category async for category in category_stats_queryset()])
+
+
+def tournament_stats_query():
+    now = timezone.now().date()
+    queryset = Tournament.objects.annotate(
+        # Матчи турнира могут быть и в архиве
+        has_matches=Exists(Match.objects.filter(tournament=OuterRef('pk')))
+        | Exists(ArchivedMatch.objects.filter(tournament=OuterRef('pk'))),
+        duration=duration(),
+    )
+    aggregates = dict(
+        total_tournaments=Count("*"),
+        active_tournaments=Count("id", filter=Q(start_date__lte=now, end_date__gte=now)),
+        completed_tournaments=Count("id", filter=Q(end_date__lt=now)),
+        upcoming_tournaments=Count("id", filter=Q(start_date__gt=now)),
+        tournaments_with_matches=Count("id", filter=Q(has_matches=True)),
+        tournaments_without_matches=Count("id", filter=Q(has_matches=False)),
+        # Средняя продолжительность считается по каждому турниру отдельно
+        avg_duration=Avg("duration"),
+    )
+    return queryset, aggregates
+
+
+def format_tournament_stats(tournament_stats):
+    return {
+        'total_tournaments': tournament_stats['total_tournaments'],
+        'active_tournaments': tournament_stats['active_tournaments'],
+        'completed_tournaments': tournament_stats['completed_tournaments'],
+        'upcoming_tournaments': tournament_stats['upcoming_tournaments'],
+        # Средняя продолжительность турниров в днях
+        'avg_tournament_duration': duration_days(tournament_stats['avg_duration']),
+        'tournaments_with_matches': tournament_stats['tournaments_with_matches'],
+        'tournaments_without_matches': tournament_stats['tournaments_without_matches'],
+    }
+
+
+def get_tournament_stats():
+    queryset, aggregates = tournament_stats_query()
+    return format_tournament_stats(queryset.aggregate(**aggregates))
+
+
+async def aget_tournament_stats():
+    queryset, aggregates = tournament_stats_query()
+    return format_tournament_stats(await queryset.aaggregate(**aggregates))
+
+
+def match_stats_query():
+    # Считается по горячей таблице и по архиву, средние собираются из сумм
+    aggregates = dict(
+        total_matches=Count("*"),
+        tournament_matches=Count("id", filter=Q(tournament__isnull=False)),
+        non_tournament_matches=Count("id", filter=Q(tournament__isnull=True)),
+        matches_with_winner=Count("id", filter=Q(winner__isnull=False)),
+        draws=Count("id", filter=Q(winner__isnull=True)),
+        sum_team1_score=Sum("team1_score"),
+        sum_team2_score=Sum("team2_score"),
+        max_team1_score=Max("team1_score"),
+        max_team2_score=Max("team2_score"),
+    )
+    return (Match.objects.all(), ArchivedMatch.objects.all()), aggregates
+
+
+def format_match_stats(*parts):
+    def total(key):
+        return sum(part[key] or 0 for part in parts)
+
+    def highest(key):
+        return max((part[key] for part in parts if part[key] is not None), default=0)
+
+    total_matches = total('total_matches')
+    return {
+        'total_matches': total_matches,
+        'tournament_matches': total('tournament_matches'),
+        'non_tournament_matches': total('non_tournament_matches'),
+        'matches_with_winner': total('matches_with_winner'),
+        'draws': total('draws'),
+        'avg_team1_score': round(total('sum_team1_score') / total_matches, 1) if total_matches else 0,
+        'avg_team2_score': round(total('sum_team2_score') / total_matches, 1) if total_matches else 0,
+        'highest_scoring_match': highest('max_team1_score') + highest('max_team2_score'),
+    }
+
+
+def get_match_stats():
+    querysets, aggregates = match_stats_query()
+    return format_match_stats(*[queryset.aggregate(**aggregates) for queryset in querysets])
+
+
+async def aget_match_stats():
+    querysets, aggregates = match_stats_query()
+    return format_match_stats(*[await queryset.aaggregate(**aggregates) for queryset in querysets])
+
+
+# Сводка для /api/stats/: все пять групп, по одному запросу на таблицу (матчи - горячая таблица и архив)
+
+def get_summary_stats():
+    return {
+        'teams': get_team_stats(),
+        'players': get_player_stats(),
+        'categories': get_category_stats(),
+        'tournaments': get_tournament_stats(),
+        'matches': get_match_stats(),
+    }
+
+
+async def aget_summary_stats():
+    return {
+        'teams': await aget_team_stats(),
+        'players': await aget_player_stats(),
+        'categories': await aget_category_stats(),
+        'tournaments': await aget_tournament_stats(),
+        'matches': await aget_match_stats(),
+    }
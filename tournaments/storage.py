@@ -0,0 +1,71 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором файл лежит под хешем своего содержимого:
+    tournaments_img/3f/3fa9...c1.png. Хеш считается прямо во время записи загрузки,
+    одинаковые файлы хранятся один раз.
+
+    Один файл может быть общим для нескольких объектов, поэтому delete() ничего не удаляет:
+    неиспользуемые файлы убирает команда gc_media (см. purge()).
+    """
+    incoming_dir = ".incoming"
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save(), суффиксы не нужны
+        return name
+
+    def hashed_name(self, name, digest):
+        root = name.replace("\\", "/").split("/", 1)[0] if "/" in name else ""
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(root, digest[:2], f"{digest}{extension}")
+
+    def _save(self, name, content):
+        incoming = os.path.join(self.location, self.incoming_dir)
+        os.makedirs(incoming, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            final_name = self.hashed_name(name, digest.hexdigest())
+            full_path = self.path(final_name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+                # Файл снова используется: свежий mtime защищает его от gc_media (--min-age),
+                # пока новая ссылка на него не сохранена в БД
+                os.utime(full_path)
+            else:
+                directory = os.path.dirname(full_path)
+                if self.directory_permissions_mode is not None:
+                    os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+                else:
+                    os.makedirs(directory, exist_ok=True)
+                os.replace(temp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return final_name
+
+    def delete(self, name):
+        pass
+
+    def purge(self, name):
+        """Действительно удаляет файл - только для сборщика мусора"""
+        super().delete(name)
+
+
+def select_media_storage():
+    return storages["media"]
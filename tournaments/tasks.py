@@ -0,0 +1,134 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные задачи: имя -> функция
+registry = {}
+
+
+def task(name):
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, key=None, **payload):
+    """
+    Ставит задачу в очередь в текущей транзакции: при откате задача тоже исчезнет.
+    Если задача с тем же ключом ещё ждёт воркера, новая не создаётся.
+    """
+    Task = apps.get_model("tournaments", "Task")
+    if key is None:
+        return Task.objects.create(name=name, payload=payload)
+    try:
+        with transaction.atomic():
+            return Task.objects.create(name=name, key=key, payload=payload)
+    except IntegrityError:
+        return None
+
+
+def claim_next(stale_after):
+    """Берёт следующую готовую задачу; зависшие у упавшего воркера задачи возвращаются в очередь"""
+    Task = apps.get_model("tournaments", "Task")
+    now = timezone.now()
+    Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=stale_after)).update(
+        status=Task.PENDING, locked_at=None,
+    )
+    candidates = (
+        Task.objects.filter(status=Task.PENDING, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:10]
+    )
+    for task_id in candidates:
+        # Ключ снимается при захвате: правки во время выполнения поставят новую задачу
+        claimed = Task.objects.filter(id=task_id, status=Task.PENDING).update(
+            status=Task.RUNNING, locked_at=now, key=None, attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Task.objects.get(id=task_id)
+    return None
+
+
+def execute(job):
+    Task = apps.get_model("tournaments", "Task")
+    try:
+        func = registry[job.name]
+        with transaction.atomic():
+            func(**job.payload)
+    except Exception:
+        logger.exception("Задача %s #%s завершилась ошибкой", job.name, job.id)
+        error = traceback.format_exc()
+        if job.attempts >= settings.TASK_MAX_ATTEMPTS:
+            Task.objects.filter(id=job.id).update(status=Task.FAILED, locked_at=None, last_error=error)
+        else:
+            delay = settings.TASK_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Task.objects.filter(id=job.id).update(
+                status=Task.PENDING, locked_at=None, last_error=error,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+        return False
+    Task.objects.filter(id=job.id).delete()
+    return True
+
+
+def run_pending(limit=None, stale_after=600):
+    """Выполняет готовые задачи, возвращает (выполнено, с ошибкой)"""
+    done = failed = 0
+    while limit is None or done + failed < limit:
+        job = claim_next(stale_after)
+        if job is None:
+            break
+        if execute(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def player_username(player):
+    return f"{player.name}_{player.nickname}".replace(' ', '_')
+
+
+@task("sync_player_user")
+def sync_player_user(player_id):
+    """Создаёт пользователя игрока или приводит его к имени и никнейму игрока (пароль = имя)"""
+    Player = apps.get_model("tournaments", "Player")
+    player = Player.objects.select_related("user").filter(id=player_id).first()
+    if player is None:
+        return
+    username = player_username(player)
+
+    if player.user is None:
+        user = User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password=player.name,
+            first_name=player.name,
+        )
+        # update() вместо save(): без сигналов и без новой задачи
+        Player.objects.filter(id=player.id, user__isnull=True).update(user=user)
+        return
+
+    user = player.user
+    changed = []
+    # first_name хранит имя, по которому задан пароль: хешируем заново только при смене имени
+    if user.first_name != player.name:
+        user.first_name = player.name
+        user.set_password(player.name)
+        changed += ["first_name", "password"]
+    if user.username != username:
+        user.username = username
+        user.email = f"{username}@example.com"
+        changed += ["username", "email"]
+    if changed:
+        user.save(update_fields=changed)
@@ -1,7 +1,65 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 from model_bakery import baker
-from .models import Team, Player, Tournament, Match, TournamentCategory
+from openpyxl import load_workbook
+from .admin import EstimatedCountPaginator
+from .archive import archive_batch
+from .db import retry_on_locked
+from .events import Subscription, hub
+from .forecast import build_forecast, simulate
+from .limiter import ConcurrencyLimiter
+from .management.commands.gc_media import Command as GcMediaCommand
+from .metrics import MetricsRegistry
+from .middleware import QueryBudgetExceeded
+from .scheduler import round_robin, swiss_round
+from .slowlog import fingerprint
+from .startup import HEAVY_MODULES, best_import_time, parse_importtime
+from .tasks import run_pending
+from .throttling import LoginUsernameThrottle
+from .upsert import MatchUpsert
+from .webhooks import deliver_pending, prune_events, sign
+from .models import Team, Player, Tournament, Match, ArchivedMatch, TournamentCategory, Task, ChangeLog, WebhookSubscription, WebhookEvent
+
+
+class QueryBudgetAssertionsMixin:
+    """Проверки лимитов SQL-запросов, объявленных на вьюсетах (query_budget)"""
+
+    def assertWithinQueryBudget(self, response):
+        self.assertIsNotNone(response.query_budget, "Для действия не задан query_budget")
+        self.assertLessEqual(
+            response.query_count, response.query_budget,
+            f"{response.query_count} SQL-запросов при лимите {response.query_budget}"
+        )
+
+    def assertServerTiming(self, response):
+        timing = response["Server-Timing"]
+        for metric in ("db;", "serialize;", "render;"):
+            self.assertIn(metric, timing)
 
 
 class TeamsViewSetTestCase(TestCase):
@@ -446,4 +504,1722 @@ class MatchesViewSetTestCase(TestCase):
         response = self.client.delete(f'/api/matches/{match.id}/')
         
         self.assertEqual(response.status_code, 204)
-        self.assertEqual(Match.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Match.objects.count(), 0)
+
+class TrafficReplayTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = baker.make(User, is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_path = Path(self.log_dir.name) / "traffic.jsonl"
+
+    def tearDown(self):
+        self.log_dir.cleanup()
+
+    def test_requests_are_recorded(self):
+        """Тест записи обезличенных запросов в журнал"""
+        baker.make(Team, _quantity=2)
+        with override_settings(TRAFFIC_LOG_ENABLED=True, TRAFFIC_LOG_PATH=self.log_path):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            client.get('/api/teams/?search=x')
+            client.post('/api/user/login/', {"username": "u", "password": "secret"}, format="json")
+
+        records = [json.loads(line) for line in self.log_path.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["path"], "/api/teams/")
+        self.assertEqual(records[0]["query"], {"search": "x"})
+        self.assertEqual(records[0]["status"], 200)
+        self.assertEqual(records[1]["body_shape"], {"username": "str", "password": "***"})
+        self.assertNotIn("secret", self.log_path.read_text(encoding="utf-8"))
+
+    def test_replay_reports_endpoints(self):
+        """Тест воспроизведения журнала"""
+        team = baker.make(Team)
+        lines = [
+            {"method": "GET", "path": "/api/teams/", "query": {}, "body_shape": None, "user_class": "staff"},
+            {"method": "GET", "path": f"/api/teams/{team.id}/", "query": {}, "body_shape": None, "user_class": "staff"},
+            {"method": "POST", "path": "/api/teams/", "query": {}, "body_shape": {"name": "str"}, "user_class": "staff"},
+        ]
+        self.log_path.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+
+        out = io.StringIO()
+        call_command("replay_traffic", str(self.log_path), concurrency=1, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn("GET /api/teams/{id}/", output)
+        self.assertNotIn("POST", output)
+
+
+class QueryBudgetTestCase(QueryBudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        category = baker.make(TournamentCategory)
+        tournament = baker.make(Tournament, category=category)
+        self.team1, self.team2 = baker.make(Team, _quantity=2)
+        baker.make(Player, team=self.team1, _quantity=5)
+        self.matches = baker.make(
+            Match, tournament=tournament, team1=self.team1, team2=self.team2, _quantity=10
+        )
+
+    def test_read_actions_within_budget(self):
+        """Тест лимитов запросов на чтение: вложенные сериализаторы не дают N+1"""
+        urls = [
+            '/api/teams/', f'/api/teams/{self.team1.id}/', '/api/teams/stats/',
+            '/api/players/', '/api/players/stats/',
+            '/api/tournament-categories/', '/api/tournament-categories/stats/',
+            '/api/tournaments/',
+            '/api/matches/', f'/api/matches/{self.matches[0].id}/', '/api/matches/stats/',
+            '/api/stats/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+                self.assertServerTiming(response)
+
+    def test_player_matches_within_budget(self):
+        """Тест лимита запросов на список матчей для игрока"""
+        player = baker.make(Player, team=self.team1, user=baker.make(User))
+        client = APIClient()
+        client.force_authenticate(player.user)
+
+        response = client.get('/api/matches/')
+
+        self.assertEqual(len(response.json()), 10)
+        self.assertWithinQueryBudget(response)
+
+    @override_settings(QUERY_BUDGET_MODE="raise")
+    def test_budget_exceeded_raises(self):
+        """Тест реакции на превышение лимита запросов"""
+        from .api import TeamsViewSet
+
+        with patch.dict(TeamsViewSet.query_budget, {"list": 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/teams/')
+
+
+class DatabaseMaintenanceTestCase(TestCase):
+    def test_retry_on_locked(self):
+        """Тест повтора записи при блокировке БД"""
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError("database is locked")
+            return "ok"
+
+        with patch("tournaments.db.connection") as fake_connection, \
+                patch("tournaments.db.transaction.atomic"), \
+                override_settings(SQLITE_LOCK_BACKOFF=0):
+            fake_connection.in_atomic_block = False
+            self.assertEqual(retry_on_locked(write)(), "ok")
+
+        self.assertEqual(len(calls), 3)
+
+    def test_retry_skips_other_errors(self):
+        """Тест: прочие ошибки БД не повторяются"""
+        def write():
+            raise OperationalError("no such table")
+
+        with patch("tournaments.db.connection") as fake_connection, \
+                patch("tournaments.db.transaction.atomic"):
+            fake_connection.in_atomic_block = False
+            with self.assertRaises(OperationalError):
+                retry_on_locked(write)()
+
+    def test_writes_go_through_retry_mixin(self):
+        """Тест создания и изменения матча через вьюсет с повтором записи"""
+        client = APIClient()
+        client.force_authenticate(baker.make(User, is_staff=True))
+        team1, team2 = baker.make(Team, _quantity=2)
+
+        response = client.post("/api/matches/", {
+            "team1": team1.id, "team2": team2.id,
+            "match_date": "2024-09-10T15:00:00Z", "team1_score": 0, "team2_score": 1,
+        })
+        self.assertEqual(response.status_code, 201)
+
+        response = client.patch(f"/api/matches/{response.json()['id']}/", {"team1_score": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Match.objects.get().winner, team1)
+
+    def test_db_maintenance(self):
+        """Тест команды обслуживания БД"""
+        out = io.StringIO()
+        call_command("db_maintenance", stdout=out)
+        self.assertIn("Готово", out.getvalue())
+
+
+class AsyncReadPathTestCase(TestCase):
+    def setUp(self):
+        self.user = baker.make(User, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = baker.make(TournamentCategory)
+        self.tournament = baker.make(
+            Tournament, category=category, start_date="2024-09-01", end_date="2024-09-11"
+        )
+        self.team1, self.team2, self.team3 = baker.make(Team, _quantity=3)
+        baker.make(Player, team=self.team1, _quantity=2)
+        baker.make(Match, tournament=self.tournament, team1=self.team1, team2=self.team2, team1_score=2)
+        baker.make(Match, tournament=self.tournament, team1=self.team2, team2=self.team3, team2_score=1)
+        self.player_user = baker.make(User)
+        baker.make(Player, team=self.team3, user=self.player_user)
+
+    async def test_async_matches_sync_responses(self):
+        """Тест: асинхронные list, retrieve и stats отдают то же, что и синхронные"""
+        await self.async_client.aforce_login(self.user)
+        urls = [
+            '/api/teams/', f'/api/teams/{self.team1.id}/', '/api/teams/stats/',
+            '/api/players/', '/api/players/stats/',
+            '/api/tournament-categories/', '/api/tournament-categories/stats/',
+            '/api/tournaments/', f'/api/tournaments/{self.tournament.id}/', '/api/tournaments/stats/',
+            '/api/matches/', '/api/matches/stats/', '/api/stats/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                async_response = await self.async_client.get(url.replace('/api/', '/api/async/', 1))
+                sync_response = await sync_to_async(self.client.get)(url)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_async_requires_authentication(self):
+        """Тест: асинхронные представления закрыты для анонимов"""
+        response = await self.async_client.get('/api/async/teams/')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_async_matches_for_player(self):
+        """Тест: игрок видит только матчи своей команды"""
+        await self.async_client.aforce_login(self.player_user)
+
+        response = await self.async_client.get('/api/async/matches/')
+
+        self.assertEqual(len(response.json()), 1)
+        missing = await self.async_client.get('/api/async/teams/999999/')
+        self.assertEqual(missing.status_code, 404)
+
+    def test_tournament_average_duration(self):
+        """Тест средней продолжительности турниров"""
+        baker.make(Tournament, start_date="2024-01-01", end_date="2024-01-03")
+        response = self.client.get('/api/tournaments/stats/')
+        self.assertEqual(response.json()['avg_tournament_duration'], 6.0)
+
+
+class LiveMatchFeedTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        self.tournament = baker.make(Tournament)
+        self.team1, self.team2 = baker.make(Team, _quantity=2)
+
+    def make_match(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return baker.make(
+                Match, tournament=self.tournament, team1=self.team1, team2=self.team2, **kwargs
+            )
+
+    def test_signals_publish_events(self):
+        """Тест: создание, изменение счёта и удаление матча попадают в ленту"""
+        start_id = hub.last_id
+        match = self.make_match()
+
+        match = Match.objects.get(id=match.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            match.match_date = timezone.now()
+            match.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            match.team1_score = 3
+            match.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            match.delete()
+
+        events = [event for event in hub.backlog if event["id"] > start_id]
+        self.assertEqual(
+            [event["event"] for event in events],
+            ["match.created", "match.updated", "match.score", "match.deleted"]
+        )
+        self.assertEqual(events[2]["data"]["winner"], self.team1.id)
+
+    def test_subscription_filters_and_overflow(self):
+        """Тест фильтра подписки и ограниченной очереди"""
+        subscription = Subscription(team=self.team1.id, maxsize=1)
+        hub.subscribe(subscription)
+        try:
+            hub.publish("match.score", {"tournament": None, "team1": 0, "team2": -1})
+            self.assertTrue(subscription.queue.empty())
+            hub.publish("match.score", {"tournament": None, "team1": self.team1.id, "team2": 0})
+            hub.publish("match.score", {"tournament": None, "team1": 0, "team2": self.team1.id})
+            self.assertTrue(subscription.overflowed)
+        finally:
+            hub.unsubscribe(subscription)
+
+    def test_stream_resumes_from_last_event_id(self):
+        """Тест возобновления ленты по Last-Event-ID"""
+        start_id = hub.last_id
+        match = self.make_match(team1_score=1)
+
+        response = self.client.get(
+            f'/api/matches/live/?tournament={self.tournament.id}',
+            HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=f'{hub.epoch}-{start_id}',
+        )
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        event = next(chunks).decode()
+        response.close()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(f'id: {hub.epoch}-{start_id + 1}\n', event)
+        self.assertIn('event: match.created', event)
+        self.assertIn(f'"id": {match.id}', event)
+
+    def test_stream_reset_for_other_process_event_id(self):
+        """Тест: id другого процесса с тем же номером не воспроизводит чужие события, а даёт reset"""
+        start_id = hub.last_id
+        self.make_match()
+        response = self.client.get('/api/matches/live/', HTTP_LAST_EVENT_ID=f'{"0" * 32}-{start_id}')
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        self.assertIn('event: reset', next(chunks).decode())
+        response.close()
+
+    def test_stream_reset_for_unknown_event_id(self):
+        """Тест: неизвестный Last-Event-ID требует полной перезагрузки"""
+        response = self.client.get('/api/matches/live/', HTTP_LAST_EVENT_ID=str(hub.last_id + 100))
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        self.assertIn('event: reset', next(chunks).decode())
+        response.close()
+
+
+def make_image_file(name="logo.png", size=(800, 600), mode="RGBA"):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 255) if mode == "RGBA" else (200, 30, 30)).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ImageDerivativesTestCase(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.media = override_settings(MEDIA_ROOT=self.media_dir.name)
+        self.media.enable()
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+
+    def tearDown(self):
+        self.media.disable()
+        self.media_dir.cleanup()
+
+    def test_upload_builds_derivatives(self):
+        """Тест: загрузка логотипа создаёт миниатюры в WebP и JPEG"""
+        from PIL import Image
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/teams/", {"name": "Team Spirit", "logo": make_image_file()})
+        self.assertEqual(response.status_code, 201)
+
+        team = Team.objects.get()
+        self.assertEqual(set(team.logo_derivatives), {"thumb", "medium"})
+        with team.logo.storage.open(team.logo_derivatives["thumb"]["webp"]) as f:
+            self.assertEqual(Image.open(f).size, (96, 96))
+        with team.logo.storage.open(team.logo_derivatives["medium"]["jpeg"]) as f:
+            self.assertEqual(Image.open(f).size, (480, 360))
+
+        data = self.client.get(f"/api/teams/{team.id}/").json()
+        self.assertTrue(data["logo_derivatives"]["thumb"]["webp"].endswith(".webp"))
+        self.assertIn(" 96w, ", data["logo_derivatives"]["srcset"]["jpeg"])
+
+    def test_backfill_command(self):
+        """Тест команды построения производных для уже загруженных фото"""
+        player = baker.make(Player)
+        Player.objects.filter(id=player.id).update(
+            photo=Player.photo.field.storage.save("tournaments_img/photo.png", make_image_file("photo.png"))
+        )
+
+        call_command("generate_image_derivatives", stdout=io.StringIO())
+
+        player.refresh_from_db()
+        self.assertEqual(set(player.photo_derivatives["thumb"]), {"webp", "jpeg"})
+        data = self.client.get(f"/api/players/{player.id}/").json()
+        self.assertIsNotNone(data["photo_derivatives"])
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.media = override_settings(MEDIA_ROOT=self.media_dir.name)
+        self.media.enable()
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+
+    def tearDown(self):
+        self.media.disable()
+        self.media_dir.cleanup()
+
+    def test_identical_uploads_stored_once(self):
+        """Тест: одинаковые логотипы хранятся одним файлом под хешем содержимого"""
+        for name in ("NaVi", "Natus Vincere"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/teams/", {"name": name, "logo": make_image_file("navi.png")})
+            self.assertEqual(response.status_code, 201)
+
+        first, second = Team.objects.order_by("id")
+        self.assertEqual(first.logo.name, second.logo.name)
+        self.assertRegex(first.logo.name, r"^tournaments_img/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        self.assertEqual(first.logo_derivatives, second.logo_derivatives)
+
+        directory = Path(self.media_dir.name) / first.logo.name
+        self.assertEqual(len(list(directory.parent.iterdir())), 1)
+
+    def test_gc_removes_only_orphans(self):
+        """Тест сборки мусора: удаляются только файлы без ссылок"""
+        storage = Team.logo.field.storage
+        team = baker.make(Team)
+        Team.objects.filter(id=team.id).update(logo=storage.save("tournaments_img/a.png", make_image_file("a.png")))
+        orphan = storage.save("tournaments_img/b.png", make_image_file("b.png", size=(10, 10)))
+
+        storage.delete(orphan)
+        self.assertTrue(storage.exists(orphan))
+
+        call_command("gc_media", min_age=0, stdout=io.StringIO())
+
+        self.assertFalse(storage.exists(orphan))
+        team.refresh_from_db()
+        self.assertTrue(storage.exists(team.logo.name))
+
+
+    def test_reupload_refreshes_mtime(self):
+        """Тест: повторная загрузка того же файла освежает mtime, --min-age снова его защищает"""
+        storage = Team.logo.field.storage
+        name = storage.save("tournaments_img/a.png", make_image_file("a.png"))
+        expired = time.time() - 7200
+        os.utime(storage.path(name), (expired, expired))
+
+        self.assertEqual(storage.save("tournaments_img/copy.png", make_image_file("a.png")), name)
+        self.assertGreater(os.path.getmtime(storage.path(name)), expired + 3600)
+        call_command("gc_media", min_age=3600, stdout=io.StringIO())
+        self.assertTrue(storage.exists(name))
+
+    def test_gc_rechecks_references_before_purge(self):
+        """Тест: ссылка, сохранённая после подсчёта ссылок, спасает файл от удаления"""
+        storage = Team.logo.field.storage
+        logo = storage.save("tournaments_img/a.png", make_image_file("a.png"))
+        derivative = storage.save("tournaments_img/b.webp", make_image_file("b.png", size=(10, 10)))
+        baker.make(Team, logo=logo, logo_derivatives={"thumb": {"webp": derivative}})
+
+        # Подсчёт прошёл до сохранения команды: оба файла выглядят сиротами
+        with patch.object(GcMediaCommand, "count_references", return_value=Counter()):
+            call_command("gc_media", min_age=0, stdout=io.StringIO())
+        self.assertTrue(storage.exists(logo))
+        self.assertTrue(storage.exists(derivative))
+
+class MediaServingTestCase(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.media = override_settings(MEDIA_ROOT=self.media_dir.name)
+        self.media.enable()
+        storage = Team.logo.field.storage
+        self.hashed = storage.save("tournaments_img/logo.png", make_image_file("logo.png"))
+        self.content = storage.open(self.hashed).read()
+        plain = Path(self.media_dir.name) / "plain.txt"
+        plain.write_bytes(b"0123456789")
+
+    def tearDown(self):
+        self.media.disable()
+        self.media_dir.cleanup()
+
+    def test_hashed_file_cached_forever(self):
+        """Тест: файл с хешем в имени отдаётся с immutable-кешем и ETag из хеша"""
+        response = self.client.get(f"/media/{self.hashed}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn(Path(self.hashed).stem, response["ETag"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_conditional_get(self):
+        """Тест условных запросов: 304 по If-None-Match и If-Modified-Since"""
+        response = self.client.get("/media/plain.txt")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+        by_etag = self.client.get("/media/plain.txt", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(by_etag.status_code, 304)
+        by_date = self.client.get("/media/plain.txt", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_range_requests(self):
+        """Тест диапазонов: 206 с Content-Range, 416 для невыполнимого, If-Range"""
+        response = self.client.get("/media/plain.txt", HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+        suffix = self.client.get("/media/plain.txt", HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(suffix.streaming_content), b"789")
+
+        unsatisfiable = self.client.get("/media/plain.txt", HTTP_RANGE="bytes=20-")
+        self.assertEqual(unsatisfiable.status_code, 416)
+        self.assertEqual(unsatisfiable["Content-Range"], "bytes */10")
+
+        stale = self.client.get("/media/plain.txt", HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_hidden_and_missing_files(self):
+        """Тест: служебные каталоги, выход за MEDIA_ROOT и несуществующие файлы - 404"""
+        (Path(self.media_dir.name) / ".incoming").mkdir(exist_ok=True)
+        (Path(self.media_dir.name) / ".incoming" / "tmp").write_bytes(b"partial")
+        self.assertEqual(self.client.get("/media/.incoming/tmp").status_code, 404)
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/media/missing.png").status_code, 404)
+
+    @override_settings(MEDIA_ACCEL="x-accel-redirect")
+    def test_accel_redirect_offload(self):
+        """Тест: при X-Accel-Redirect файл отдаёт прокси, тело ответа пустое"""
+        response = self.client.get(f"/media/{self.hashed}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.hashed}")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Content-Type"], "image/png")
+
+
+@override_settings(LOGIN_THROTTLE_RATES={
+    "login_ip": "10/min", "login_username": "3/min", "totp_ip": "10/min", "totp_user": "3/min",
+})
+class LoginThrottleTestCase(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="u", password="secret")
+
+    def test_username_bucket_rejects_before_hashing(self):
+        """Тест: после исчерпания корзины пароль не проверяется, ответ 429 с Retry-After"""
+        with patch("tournaments.api.authenticate", return_value=None) as authenticate:
+            for _ in range(3):
+                response = self.client.post("/api/user/login/", {"username": "U", "password": "x"}, format="json")
+                self.assertEqual(response.status_code, 200)
+            response = self.client.post("/api/user/login/", {"username": "u", "password": "x"}, format="json")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(authenticate.call_count, 3)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+        other = self.client.post("/api/user/login/", {"username": "other", "password": "x"}, format="json")
+        self.assertEqual(other.status_code, 200)
+
+    def test_ip_bucket_limits_spraying(self):
+        """Тест: перебор разных имён с одного IP упирается в лимит по IP"""
+        with patch("tournaments.api.authenticate", return_value=None):
+            codes = [
+                self.client.post("/api/user/login/", {"username": f"user{i}", "password": "x"}, format="json").status_code
+                for i in range(12)
+            ]
+        self.assertEqual(codes.count(200), 10)
+        self.assertEqual(codes[-1], 429)
+
+    def test_bucket_refills(self):
+        """Тест: токены восстанавливаются со временем"""
+        with patch("tournaments.api.authenticate", return_value=None), \
+                patch("tournaments.throttling.time.time", return_value=1000.0) as now:
+            for _ in range(3):
+                self.client.post("/api/user/login/", {"username": "u", "password": "x"}, format="json")
+            self.assertEqual(self.client.post("/api/user/login/", {"username": "u", "password": "x"}, format="json").status_code, 429)
+            now.return_value = 1020.0
+            self.assertEqual(self.client.post("/api/user/login/", {"username": "u", "password": "x"}, format="json").status_code, 200)
+
+    def test_second_login_throttled(self):
+        """Тест: подбор TOTP-кода ограничен для пользователя"""
+        baker.make(Player, user=self.user, totp_key="JBSWY3DPEHPK3PXP")
+        self.client.force_authenticate(self.user)
+        for _ in range(3):
+            self.client.post("/api/user/second-login/", {"key": "000000"}, format="json")
+        response = self.client.post("/api/user/second-login/", {"key": "000000"}, format="json")
+        self.assertEqual(response.status_code, 429)
+
+    def test_instances_share_one_bucket(self):
+        """Тест: корзина общая для экземпляров (как в разных воркерах) и не тратится дважды параллельно"""
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            THROTTLE_LOCK_DIR=Path(directory) / "locks",
+            CACHES={**settings.CACHES, "throttle": {
+                "BACKEND": "tournaments.cache.FileBasedCache", "LOCATION": Path(directory) / "throttle",
+            }},
+        ):
+            request = SimpleNamespace(data={"username": "u"})
+            first, second = LoginUsernameThrottle(), LoginUsernameThrottle()
+            self.assertEqual([first.allow_request(request, None), second.allow_request(request, None)], [True, True])
+
+            allowed = []
+            barrier = threading.Barrier(8)
+
+            def attempt():
+                throttle = LoginUsernameThrottle()
+                barrier.wait()
+                allowed.append(throttle.allow_request(request, None))
+
+            threads = [threading.Thread(target=attempt) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Ёмкость 3: два токена потрачены выше, из восьми параллельных попыток проходит одна
+            self.assertEqual(allowed.count(True), 1)
+
+
+class PlayerUserSyncTestCase(TestCase):
+    def test_user_created_by_worker(self):
+        """Тест: пользователь игрока создаётся воркером, а не при сохранении"""
+        player = Player.objects.create(name="Oleg", nickname="s1mple")
+        self.assertIsNone(Player.objects.get(id=player.id).user)
+        self.assertEqual(Task.objects.count(), 1)
+
+        call_command("run_tasks", once=True, stdout=io.StringIO())
+
+        player.refresh_from_db()
+        self.assertEqual(player.user.username, "Oleg_s1mple")
+        self.assertTrue(player.user.check_password("Oleg"))
+        self.assertFalse(Task.objects.exists())
+
+    def test_jobs_coalesced_and_hashing_skipped(self):
+        """Тест: правки игрока склеиваются в одну задачу, пароль не пересчитывается без смены имени"""
+        user = User.objects.create_user(username="Oleg_s1mple", password="Oleg", first_name="Oleg")
+        player = baker.make(Player, name="Oleg", nickname="s1mple", user=user)
+        player = Player.objects.get(id=player.id)
+
+        player.team = baker.make(Team)
+        player.save()
+        self.assertFalse(Task.objects.exists())
+
+        for nickname in ("zeus", "electronic"):
+            player.nickname = nickname
+            player.save()
+        self.assertEqual(Task.objects.count(), 1)
+
+        with patch.object(User, "set_password") as set_password:
+            self.assertEqual(run_pending(), (1, 0))
+        set_password.assert_not_called()
+        user.refresh_from_db()
+        self.assertEqual(user.username, "Oleg_electronic")
+
+        player.name = "Ivan"
+        player.save()
+        run_pending()
+        user.refresh_from_db()
+        self.assertTrue(user.check_password("Ivan"))
+
+    @override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=0)
+    def test_failed_job_retried_then_marked_failed(self):
+        """Тест: упавшая задача повторяется и после лимита попыток помечается как failed"""
+        User.objects.create_user(username="Oleg_s1mple")
+        Player.objects.create(name="Oleg", nickname="s1mple")
+
+        # Без задержки повтор выполняется в том же проходе
+        self.assertEqual(run_pending(), (0, 2))
+        self.assertEqual(run_pending(), (0, 0))
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+        self.assertIn("IntegrityError", task.last_error)
+
+
+class CachedSessionTestCase(TestCase):
+    def setUp(self):
+        caches["sessions"].clear()
+        self.user = User.objects.create_user(username="u", password="secret")
+        baker.make(Player, user=self.user, totp_key="JBSWY3DPEHPK3PXP")
+
+    def test_info_reads_session_from_cache(self):
+        """Тест: /api/user/info/ не обращается к django_session, флаг second сохраняется"""
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["second"] = True
+        session.save()
+
+        self.client.get("/api/user/info/")
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/user/info/")
+        self.assertTrue(response.json()["second"])
+
+    def test_logout_flushes_cache_and_db(self):
+        """Тест: выход удаляет сессию и из кеша, и из БД"""
+        self.client.force_login(self.user)
+        session_key = self.client.session.session_key
+
+        self.client.post("/api/user/logout/")
+
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+        self.assertFalse(SessionStore(session_key).exists(session_key))
+        self.assertFalse(self.client.get("/api/user/info/").json()["is_authenticated"])
+
+    def test_cleanup_removes_expired_in_batches(self):
+        """Тест: очистка удаляет только истёкшие сессии и не больше заданного числа пачек"""
+        expired = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            Session.objects.create(session_key=f"expired{i}", session_data="", expire_date=expired)
+        Session.objects.create(session_key="alive", session_data="", expire_date=timezone.now() + timedelta(days=1))
+
+        call_command("cleanup_sessions", batch_size=2, max_batches=2, pause=0, stdout=io.StringIO())
+        self.assertEqual(Session.objects.filter(expire_date__lt=timezone.now()).count(), 1)
+
+        call_command("cleanup_sessions", batch_size=2, pause=0, stdout=io.StringIO())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["alive"])
+
+
+class AdminChangelistTestCase(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username="admin", password="admin"))
+        self.tournament = baker.make(Tournament)
+
+    def make_matches(self, count):
+        for _ in range(count):
+            baker.make(Match, tournament=self.tournament, team1=baker.make(Team), team2=baker.make(Team),
+                       team1_score=1, match_date=timezone.now())
+
+    def count_changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Тест: число запросов страницы списка не зависит от числа строк"""
+        self.make_matches(2)
+        baker.make(Player, team=baker.make(Team), _quantity=2)
+        matches_small = self.count_changelist_queries("/admin/tournaments/match/")
+        players_small = self.count_changelist_queries("/admin/tournaments/player/")
+
+        self.make_matches(8)
+        baker.make(Player, team=baker.make(Team), _quantity=8)
+        self.assertEqual(self.count_changelist_queries("/admin/tournaments/match/"), matches_small)
+        self.assertEqual(self.count_changelist_queries("/admin/tournaments/player/"), players_small)
+
+    def test_search_and_date_hierarchy(self):
+        """Тест: поиск по началу названия и фильтр по дате матча"""
+        self.tournament.name = "Major"
+        self.tournament.save()
+        self.make_matches(1)
+        response = self.client.get("/admin/tournaments/match/", {"q": "maj"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+        response = self.client.get("/admin/tournaments/match/", {"q": "ajor"})
+        self.assertEqual(response.context["cl"].result_count, 0)
+
+        year = timezone.now().year
+        response = self.client.get("/admin/tournaments/match/", {"match_date__year": year})
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=5)
+    def test_estimated_count_above_threshold(self):
+        """Тест: без фильтров большая таблица считается по оценке, с фильтром - точно"""
+        self.make_matches(6)
+        Match.objects.filter(id__in=Match.objects.values("id")[:3]).delete()
+
+        last_id = Match.objects.order_by("-id").first().id
+        paginator = EstimatedCountPaginator(Match.objects.order_by("id"), 100)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, last_id)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+        filtered = EstimatedCountPaginator(Match.objects.filter(team1_score=1), 100)
+        self.assertEqual(filtered.count, 3)
+
+        baker.make(TournamentCategory, _quantity=2)
+        self.assertEqual(EstimatedCountPaginator(TournamentCategory.objects.all(), 100).count, 2)
+
+
+class StatsSummaryTestCase(QueryBudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        self.online, self.lan, self.empty = baker.make(TournamentCategory, _quantity=3)
+        baker.make(Tournament, category=self.online, start_date="2024-01-01", end_date="2024-01-03")
+        baker.make(Tournament, category=self.online, start_date="2024-02-01", end_date="2024-02-11")
+        self.major = baker.make(Tournament, category=self.lan, start_date="2024-03-01", end_date="2024-03-07")
+        team1, team2 = baker.make(Team, _quantity=2)
+        baker.make(Match, tournament=self.major, team1=team1, team2=team2, team1_score=3)
+
+    def test_summary_in_one_query_per_table(self):
+        """Тест: сводка - пять групп статистики, по запросу на таблицу (матчи - с архивом)"""
+        response = self.client.get("/api/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.query_count, 6)
+        data = response.json()
+        self.assertEqual(set(data), {"teams", "players", "categories", "tournaments", "matches"})
+
+        for group, url in [("teams", "/api/teams/stats/"), ("players", "/api/players/stats/"),
+                           ("tournaments", "/api/tournaments/stats/"), ("matches", "/api/matches/stats/")]:
+            self.assertEqual(data[group], self.client.get(url).json())
+
+    def test_durations_and_category_breakdown(self):
+        """Тест: средняя продолжительность считается по каждому турниру, есть разбивка по категориям"""
+        data = self.client.get("/api/stats/").json()
+        self.assertEqual(data["tournaments"]["avg_tournament_duration"], 6.0)
+
+        categories = data["categories"]
+        self.assertEqual(categories["total_categories"], 3)
+        self.assertEqual(categories["categories_with_tournaments"], 2)
+        self.assertEqual(categories["most_popular_category"], self.online.name)
+        self.assertEqual(categories["tournaments_in_popular_category"], 2)
+        breakdown = {row["id"]: row for row in categories["breakdown"]}
+        self.assertEqual(breakdown[self.online.id]["avg_tournament_duration"], 6.0)
+        self.assertEqual(breakdown[self.lan.id]["tournament_count"], 1)
+        self.assertEqual(breakdown[self.empty.id]["avg_tournament_duration"], 0)
+
+
+class MatchArchiveTestCase(QueryBudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        self.team1, self.team2 = baker.make(Team, _quantity=2)
+        self.old = baker.make(Tournament, start_date="2023-03-01", end_date="2023-03-10")
+        self.current = baker.make(Tournament, start_date="2023-03-01", end_date=timezone.localdate() + timedelta(days=5))
+        self.old_matches = [
+            baker.make(Match, tournament=self.old, team1=self.team1, team2=self.team2, team1_score=2,
+                       match_date=timezone.make_aware(datetime(2023, 3, day, 18)))
+            for day in (2, 5, 9)
+        ]
+        # Старый матч ещё идущего турнира в архив не попадает
+        self.ongoing = baker.make(Match, tournament=self.current, team1=self.team1, team2=self.team2,
+                                  team2_score=1, match_date=timezone.make_aware(datetime(2023, 3, 2, 18)))
+        self.stats_before = self.client.get("/api/matches/stats/").json()
+
+    def archive(self):
+        with patch("tournaments.models.hub") as fake_hub:
+            call_command("archive_matches", before="2024-01-01", batch_size=2, pause=0, stdout=io.StringIO())
+        fake_hub.publish.assert_not_called()
+        # Перенос в архив - не удаление: сигналы post_delete не срабатывают
+        self.assertFalse(WebhookEvent.objects.filter(event_type="match.deleted").exists())
+
+    def test_archive_moves_finished_matches_in_batches(self):
+        """Тест: архивируются только матчи завершённых турниров, id сохраняются"""
+        self.archive()
+        self.assertEqual(list(Match.objects.values_list("id", flat=True)), [self.ongoing.id])
+        self.assertEqual(
+            sorted(ArchivedMatch.objects.values_list("id", flat=True)), [m.id for m in self.old_matches]
+        )
+        self.assertEqual(ArchivedMatch.objects.get(id=self.old_matches[0].id).winner, self.team1)
+
+    def test_reads_include_archive_only_when_asked(self):
+        """Тест: список и детали - только горячая таблица, архив по ?include_archived=1 или датам"""
+        self.archive()
+        self.assertEqual(len(self.client.get("/api/matches/").json()), 1)
+        self.assertEqual(self.client.get(f"/api/matches/{self.old_matches[0].id}/").status_code, 404)
+
+        response = self.client.get("/api/matches/", {"include_archived": 1})
+        self.assertWithinQueryBudget(response)
+        self.assertEqual([m["id"] for m in response.json()], sorted([m.id for m in self.old_matches] + [self.ongoing.id]))
+
+        detail = self.client.get(f"/api/matches/{self.old_matches[0].id}/", {"include_archived": 1})
+        self.assertEqual(detail.json()["winner"]["id"], self.team1.id)
+
+        in_range = self.client.get("/api/matches/", {"date_from": "2023-03-02", "date_to": "2023-03-05"}).json()
+        self.assertEqual(len(in_range), 3)
+        self.assertEqual(self.client.get("/api/matches/", {"date_from": "март"}).status_code, 400)
+
+    async def test_async_reads_include_archive(self):
+        """Тест: асинхронный список матчей так же подключает архив"""
+        await sync_to_async(self.archive)()
+        user = await User.objects.filter(is_staff=True).afirst()
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get("/api/async/matches/", {"include_archived": 1})
+        sync_response = await sync_to_async(self.client.get)("/api/matches/", {"include_archived": 1})
+        self.assertEqual(response.json(), sync_response.json())
+
+    def test_stats_and_export_unchanged_by_archiving(self):
+        """Тест: статистика и выгрузка учитывают архив"""
+        self.archive()
+        response = self.client.get("/api/matches/stats/")
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.json(), self.stats_before)
+        tournaments = self.client.get("/api/tournaments/stats/").json()
+        self.assertEqual(tournaments["tournaments_with_matches"], 2)
+
+        export = self.client.get("/api/matches/export-excel/")
+        self.assertWithinQueryBudget(export)
+        sheet = load_workbook(io.BytesIO(export.content)).active
+        self.assertEqual(sheet.max_row - 1, 4)
+
+
+@override_settings(IMPORT_CHUNK_SIZE=2)
+class MatchImportTestCase(TestCase):
+    def setUp(self):
+        self.reports_dir = tempfile.TemporaryDirectory()
+        self.reports = override_settings(IMPORT_REPORTS_DIR=self.reports_dir.name)
+        self.reports.enable()
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        self.major = baker.make(Tournament, name="Major")
+        self.navi = baker.make(Team, name="NaVi")
+
+    def tearDown(self):
+        self.reports.disable()
+        self.reports_dir.cleanup()
+
+    def upload(self, content, name="matches.csv", **data):
+        return self.client.post("/api/matches/import/", {"file": SimpleUploadedFile(name, content), **data})
+
+    def test_csv_import_with_error_report(self):
+        """Тест импорта CSV: пачки через bulk_create, новые команды, отчёт об ошибках строк"""
+        content = (
+            "tournament,team1,team2,match_date,team1_score,team2_score\n"
+            "major,NaVi,Vitality,2024-03-01 18:00,2,1\n"
+            "Major,navi,FaZe,01.03.2024 20:00,0,2\n"
+            "Unknown,NaVi,FaZe,2024-03-02,1,0\n"
+            "Major,Vitality,FaZe,not a date,1,1\n"
+            "Major,FaZe,Vitality,2024-03-03,-1,0\n"
+            "Major,Vitality,FaZe,2024-03-04,1,1\n"
+        ).encode()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(content)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data["created"], data["teams_created"], data["failed"]), (3, 2, 3))
+        self.assertLess(len(queries), 20)
+
+        self.assertEqual(Team.objects.filter(name__in=["Vitality", "FaZe"]).count(), 2)
+        first = Match.objects.get(team2__name="Vitality")
+        self.assertEqual(first.team1, self.navi)
+        self.assertEqual(first.winner, self.navi)
+        self.assertIsNone(Match.objects.get(match_date__date="2024-03-04").winner)
+
+        report = self.client.get(data["report"])
+        self.assertEqual(report.status_code, 200)
+        lines = b"".join(report.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual([line.split(",")[0] for line in lines], ["row", "4", "5", "6"])
+
+    def test_export_round_trip_xlsx(self):
+        """Тест: файл из export-excel импортируется обратно (read-only режим openpyxl)"""
+        baker.make(Match, tournament=self.major, team1=self.navi, team2=baker.make(Team, name="G2"),
+                   team1_score=3, match_date=timezone.now())
+        export = self.client.get("/api/matches/export-excel/")
+        Match.objects.all().delete()
+
+        response = self.upload(export.content, name="matches.xlsx")
+        self.assertEqual(response.json()["created"], 1)
+        self.assertIsNone(response.json()["report"])
+        self.assertEqual(Match.objects.get().winner, self.navi)
+
+    def test_teams_import_and_command(self):
+        """Тест импорта команд командой import_matches: дубликаты попадают в отчёт"""
+        path = Path(self.reports_dir.name) / "teams.csv"
+        path.write_text("name\nNaVi\nSpirit\nspirit\nMOUZ\n", encoding="utf-8")
+        out = io.StringIO()
+        call_command("import_matches", str(path), kind="teams", stdout=out)
+        self.assertIn("Создано записей: 2", out.getvalue())
+        self.assertEqual(Team.objects.count(), 3)
+
+    def test_old_reports_pruned(self):
+        """Тест: отчёты старше IMPORT_REPORTS_MAX_AGE удаляются при следующем импорте"""
+        old = Path(self.reports_dir.name) / f"{'0' * 32}.csv"
+        fresh = Path(self.reports_dir.name) / f"{'1' * 32}.csv"
+        for path in (old, fresh):
+            path.write_text("row,errors\n", encoding="utf-8")
+        expired = time.time() - settings.IMPORT_REPORTS_MAX_AGE - 60
+        os.utime(old, (expired, expired))
+
+        response = self.upload(b"name\nSpirit\nspirit\n", kind="teams")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(old.exists())
+        self.assertTrue(fresh.exists())
+        # Отчёт только что завершённого импорта остаётся доступен
+        report = response.json()["report"].rsplit("/", 2)[-2]
+        self.assertTrue((Path(self.reports_dir.name) / report).exists())
+
+    def test_bad_files_rejected(self):
+        """Тест: неизвестный формат, нет колонок, импорт только для администраторов"""
+        self.assertEqual(self.upload(b"x", name="matches.txt").status_code, 400)
+        self.assertEqual(self.upload(b"team1,team2\nA,B\n").status_code, 400)
+        client = APIClient()
+        client.force_authenticate(baker.make(User))
+        response = client.post("/api/matches/import/", {"file": SimpleUploadedFile("m.csv", b"")})
+        self.assertEqual(response.status_code, 403)
+
+
+class ExternalUpsertTestCase(QueryBudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        self.client.post("/api/teams/upsert/", [
+            {"external_id": "t-navi", "name": "NaVi"},
+            {"external_id": "t-g2", "name": "G2"},
+        ], format="json")
+        self.client.post("/api/tournaments/upsert/", [
+            {"external_id": "major", "name": "Major", "start_date": "2024-03-01", "end_date": "2024-03-10"},
+        ], format="json")
+        self.batch = [
+            {"external_id": "m1", "tournament": "major", "team1": "t-navi", "team2": "t-g2",
+             "match_date": "2024-03-02T18:00:00Z", "team1_score": 1, "team2_score": 0},
+            {"external_id": "m2", "tournament": "major", "team1": "t-g2", "team2": "t-navi",
+             "match_date": "2024-03-03T18:00:00Z"},
+        ]
+
+    def upsert(self, rows):
+        response = self.client.post("/api/matches/upsert/", rows, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        return response.json()
+
+    def test_retries_do_not_duplicate_or_write(self):
+        """Тест: повтор пачки не создаёт дубликатов и не пишет в БД"""
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.upsert(self.batch)
+        self.assertEqual((first["created"], first["updated"], first["unchanged"]), (2, 0, 0))
+        self.assertEqual(Match.objects.get(external_id="m1").winner.external_id, "t-navi")
+
+        with CaptureQueriesContext(connection) as queries:
+            again = self.upsert(self.batch)
+        self.assertEqual((again["created"], again["updated"], again["unchanged"]), (0, 0, 2))
+        self.assertFalse([q for q in queries if q["sql"].startswith(("INSERT", "UPDATE"))])
+        self.assertEqual(Match.objects.count(), 2)
+
+    def test_concurrent_insert_of_same_batch_becomes_update(self):
+        """Тест: строку вставил параллельный запрос после поиска существующих - не 500, а обновление"""
+        plan = MatchUpsert.plan
+
+        def plan_then_concurrent_insert(upsert, valid, lookups):
+            created, updated = plan(upsert, valid, lookups)
+            for match in created:
+                Match.objects.create(**{field.attname: getattr(match, field.attname)
+                                        for field in Match._meta.concrete_fields if not field.primary_key})
+            return created, updated
+
+        with patch.object(MatchUpsert, "plan", plan_then_concurrent_insert):
+            response = self.client.post("/api/matches/upsert/", self.batch, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["errors"], [])
+        self.assertEqual(Match.objects.filter(external_id__in=["m1", "m2"]).count(), 2)
+        self.assertEqual(
+            set(ChangeLog.objects.filter(model="match").values_list("object_id", flat=True)),
+            set(Match.objects.values_list("id", flat=True)),
+        )
+
+    def test_changed_rows_updated_in_bulk_with_events(self):
+        """Тест: изменившийся счёт обновляется и уходит в ленту как match.score"""
+        self.upsert(self.batch)
+        self.batch[1]["team1_score"] = 3
+        last_id = hub.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.upsert(self.batch + [dict(self.batch[0], external_id="m1")])
+        self.assertEqual((result["created"], result["updated"], result["unchanged"]), (0, 1, 1))
+        match = Match.objects.get(external_id="m2")
+        self.assertEqual(match.winner.external_id, "t-g2")
+        self.assertEqual([event["event"] for event in hub.backlog if event["id"] > last_id], ["match.score"])
+
+    def test_row_errors_and_archived_matches(self):
+        """Тест: ошибки строк возвращаются по индексу, архивные матчи не создаются заново"""
+        self.upsert(self.batch)
+        call_command("archive_matches", before="2030-01-01", stdout=io.StringIO())
+
+        result = self.upsert(self.batch + [
+            {"external_id": "m3", "tournament": "major", "team1": "t-navi", "team2": "unknown",
+             "match_date": "2024-03-04T18:00:00Z"},
+            {"external_id": "m4", "team1": "t-navi", "team2": "t-navi", "match_date": "2024-03-04T18:00:00Z"},
+        ])
+        self.assertEqual(result["skipped"], 2)
+        self.assertEqual([error["index"] for error in sorted(result["errors"], key=lambda e: e["index"])], [2, 3])
+        self.assertEqual(Match.objects.count(), 0)
+
+    def test_upsert_staff_only(self):
+        """Тест: запись ленты доступна только администраторам"""
+        client = APIClient()
+        client.force_authenticate(baker.make(User))
+        self.assertEqual(client.post("/api/matches/upsert/", self.batch, format="json").status_code, 403)
+        self.assertEqual(self.client.post("/api/teams/upsert/", {"external_id": "x"}, format="json").status_code, 400)
+
+
+class ChangeFeedTestCase(QueryBudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = baker.make(User, is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.team1, self.team2, self.other = baker.make(Team, _quantity=3)
+        self.tournament = baker.make(Tournament, start_date="2023-03-01", end_date="2023-03-10")
+        self.cursor = self.client.get("/api/changes/").json()["cursor"]
+
+    def changes(self, since=None, **params):
+        response = self.client.get("/api/changes/", {"since": self.cursor if since is None else since, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        return response.json()
+
+    def test_bootstrap_returns_reset_and_current_cursor(self):
+        """Тест: запрос без since - reset и текущий курсор, изменения после него попадают в ленту"""
+        data = self.client.get("/api/changes/").json()
+        self.assertTrue(data["reset"])
+        self.assertEqual(data["cursor"], ChangeLog.objects.latest("id").id)
+        self.assertEqual(self.changes()["changes"], [])
+
+    def test_changes_are_collapsed_per_object(self):
+        """Тест: несколько изменений объекта - одна запись с последним состоянием, удаление - tombstone"""
+        self.client.patch(f"/api/teams/{self.team1.id}/", {"name": "Первая"}, format="json")
+        self.client.patch(f"/api/teams/{self.team1.id}/", {"name": "Первая команда"}, format="json")
+        match = baker.make(Match, tournament=self.tournament, team1=self.team1, team2=self.team2, team1_score=1)
+        other_id = self.other.id
+        self.other.delete()
+
+        data = self.changes()
+        self.assertFalse(data["reset"])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(data["cursor"], ChangeLog.objects.latest("id").id)
+        records = {(c["type"], c["id"]): c for c in data["changes"]}
+        self.assertEqual(records[("team", self.team1.id)]["data"]["name"], "Первая команда")
+        self.assertEqual(records[("match", match.id)]["data"]["winner"]["id"], self.team1.id)
+        self.assertEqual(records[("team", other_id)], {
+            "cursor": records[("team", other_id)]["cursor"], "type": "team", "id": other_id, "op": "delete",
+        })
+        self.assertEqual(len(data["changes"]), 3)
+
+    def test_pages_follow_cursor(self):
+        """Тест: limit ограничивает страницу, has_more и cursor ведут к следующей"""
+        teams = baker.make(Team, _quantity=5)
+        first = self.changes(limit=3)
+        self.assertTrue(first["has_more"])
+        second = self.changes(since=first["cursor"], limit=3)
+        self.assertFalse(second["has_more"])
+        ids = [c["id"] for c in first["changes"] + second["changes"]]
+        self.assertEqual(ids, [team.id for team in teams])
+
+    def test_player_sees_only_own_matches(self):
+        """Тест: матчи чужих команд для игрока выглядят как удаления, без данных"""
+        user = baker.make(User)
+        baker.make(Player, user=user, team=self.team1)
+        own = baker.make(Match, tournament=self.tournament, team1=self.team1, team2=self.team2)
+        foreign = baker.make(Match, tournament=self.tournament, team1=self.team2, team2=self.other)
+        self.client.force_authenticate(user)
+        records = {(c["type"], c["id"]): c for c in self.changes()["changes"]}
+        self.assertEqual(records[("match", own.id)]["op"], "upsert")
+        self.assertEqual(records[("match", foreign.id)], {
+            "cursor": records[("match", foreign.id)]["cursor"], "type": "match", "id": foreign.id, "op": "delete",
+        })
+
+    def test_bulk_paths_are_logged(self):
+        """Тест: upsert и архивация, минующие сигналы, тоже пишут журнал"""
+        self.client.post("/api/teams/upsert/", [{"external_id": "ext-1", "name": "Внешняя"}], format="json")
+        match = baker.make(Match, tournament=self.tournament, team1=self.team1, team2=self.team2,
+                           match_date=timezone.make_aware(datetime(2023, 3, 2, 18)))
+        archive_batch([match.id])
+        records = {(c["type"], c["id"]): c["op"] for c in self.changes()["changes"]}
+        self.assertEqual(records[("team", Team.objects.get(external_id="ext-1").id)], "upsert")
+        self.assertEqual(records[("match", match.id)], "delete")
+
+    def test_compaction(self):
+        """Тест: compact_changes оставляет последнюю запись на объект, старые удаления - через reset"""
+        for name in ("a", "b", "c"):
+            self.client.patch(f"/api/teams/{self.team1.id}/", {"name": name}, format="json")
+        self.other.delete()
+        before = self.changes()
+        call_command("compact_changes", stdout=io.StringIO())
+        self.assertEqual(ChangeLog.objects.filter(model="team", object_id=self.team1.id).count(), 1)
+        self.assertEqual(self.changes()["changes"], before["changes"])
+
+        ChangeLog.objects.filter(deleted=True).update(created_at=timezone.now() - timedelta(days=40))
+        call_command("compact_changes", tombstones_days=30, stdout=io.StringIO())
+        self.assertFalse(ChangeLog.objects.filter(deleted=True).exists())
+        self.assertTrue(self.changes()["reset"])
+        self.assertFalse(self.changes(since=before["cursor"])["reset"])
+
+
+class WebhookReceiver(ThreadingHTTPServer):
+    """Локальный HTTP-получатель вебхуков для тестов"""
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        self.delay = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), self.Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/hook/"
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            server = self.server
+            with server.lock:
+                server.active += 1
+                server.max_active = max(server.max_active, server.active)
+            time.sleep(server.delay)
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            with server.lock:
+                server.active -= 1
+                server.requests.append((dict(self.headers), body))
+            self.send_response(server.status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+
+class WebhookDeliveryTestCase(TestCase):
+    def setUp(self):
+        self.receiver = WebhookReceiver()
+        threading.Thread(target=self.receiver.serve_forever, daemon=True).start()
+        self.addCleanup(self.receiver.server_close)
+        self.addCleanup(self.receiver.shutdown)
+        self.team1, self.team2 = baker.make(Team, _quantity=2)
+        self.tournament = baker.make(Tournament, start_date="2024-03-01", end_date="2024-03-10")
+        self.subscription = WebhookSubscription.objects.create(url=self.receiver.url, secret="s3cret")
+
+    def make_match(self, **kwargs):
+        return baker.make(Match, tournament=self.tournament, team1=self.team1, team2=self.team2, **kwargs)
+
+    def delivered_events(self):
+        return [event for _, body in self.receiver.requests for event in json.loads(body)["events"]]
+
+    def test_outbox_is_written_in_match_transaction(self):
+        """Тест: событие в очереди появляется только вместе с сохранённым матчем"""
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.make_match()
+                raise RuntimeError
+        self.assertFalse(WebhookEvent.objects.filter(event_type__startswith="match.").exists())
+        match = self.make_match(team1_score=2)
+        event = WebhookEvent.objects.get(event_type="match.created")
+        self.assertEqual(event.payload["id"], match.id)
+        self.assertEqual(event.tournament_id, self.tournament.id)
+
+    def test_events_are_batched_and_signed(self):
+        """Тест: события подписки уходят одной подписанной пачкой, курсор сдвигается"""
+        match = self.make_match()
+        self.make_match()
+        match.team1_score = 3
+        match.save()
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        headers, body = self.receiver.requests[0]
+        timestamp, signature = [part.split("=", 1)[1] for part in headers["X-Webhook-Signature"].split(",")]
+        self.assertEqual(signature, sign("s3cret", timestamp, body))
+        self.assertEqual([e["type"] for e in self.delivered_events()], ["match.created", "match.created", "match.score"])
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.cursor, WebhookEvent.objects.latest("id").id)
+
+    def test_subscription_filters(self):
+        """Тест: фильтры по типу события и турниру"""
+        other = baker.make(Tournament, start_date="2024-03-01", end_date="2024-03-10")
+        self.subscription.delete()
+        WebhookSubscription.objects.create(
+            url=self.receiver.url, secret="x", event_types=["match.score"], tournament=self.tournament,
+        )
+        match = self.make_match()
+        match.team2_score = 1
+        match.save()
+        foreign = baker.make(Match, tournament=other, team1=self.team1, team2=self.team2)
+        foreign.team1_score = 1
+        foreign.save()
+        deliver_pending()
+        self.assertEqual([(e["type"], e["data"]["id"]) for e in self.delivered_events()], [("match.score", match.id)])
+
+    @override_settings(WEBHOOK_RETRY_DELAY=60, WEBHOOK_MAX_ATTEMPTS=2)
+    def test_failed_batch_is_retried_with_backoff(self):
+        """Тест: при ошибке пачка повторяется после задержки, после лимита подписка отключается"""
+        self.make_match()
+        self.receiver.status = 500
+        with self.assertLogs("tournaments.webhooks", "WARNING"):
+            self.assertEqual(deliver_pending(), (0, 1))
+        self.subscription.refresh_from_db()
+        self.assertEqual((self.subscription.attempts, self.subscription.last_error), (1, "HTTP 500"))
+        self.assertGreater(self.subscription.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        WebhookSubscription.objects.update(next_attempt_at=timezone.now())
+        self.receiver.status = 204
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(len(self.receiver.requests), 2)
+        self.assertEqual(self.receiver.requests[0][0]["X-Webhook-Delivery"], self.receiver.requests[1][0]["X-Webhook-Delivery"])
+
+        self.make_match()
+        self.receiver.status = 500
+        for _ in range(2):
+            WebhookSubscription.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs("tournaments.webhooks", "WARNING"):
+                deliver_pending()
+        self.subscription.refresh_from_db()
+        self.assertFalse(self.subscription.active)
+
+    @override_settings(WEBHOOK_HOST_CONCURRENCY=1)
+    def test_concurrency_per_host(self):
+        """Тест: на один хост не больше WEBHOOK_HOST_CONCURRENCY запросов одновременно"""
+        for _ in range(3):
+            WebhookSubscription.objects.create(url=self.receiver.url, secret="x")
+        self.make_match()
+        self.receiver.delay = 0.05
+        # Захватывается только пачка, которая сразу получит слот хоста: аренда не истекает в очереди
+        self.assertEqual([deliver_pending() for _ in range(5)], [(1, 0)] * 4 + [(0, 0)])
+        self.assertEqual(len(self.receiver.requests), 4)
+        self.assertEqual(self.receiver.max_active, 1)
+
+    def test_delivered_events_are_pruned(self):
+        """Тест: события, полученные всеми подписками, удаляются из очереди"""
+        self.make_match()
+        call_command("deliver_webhooks", once=True, stdout=io.StringIO())
+        self.assertEqual(len(self.receiver.requests), 1)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_disabled_subscription_holds_events_for_limited_time(self):
+        """Тест: отключённая подписка не останавливает очистку очереди навсегда"""
+        active = WebhookSubscription.objects.create(url=self.receiver.url, secret="x")
+        WebhookSubscription.objects.filter(id=self.subscription.id).update(active=False)
+        self.make_match()
+        self.assertEqual(deliver_pending(), (1, 0))
+        active.refresh_from_db()
+        self.assertEqual(active.cursor, WebhookEvent.objects.latest("id").id)
+
+        prune_events()
+        self.assertTrue(WebhookEvent.objects.filter(event_type="match.created").exists())
+        later = timezone.now() + timedelta(seconds=settings.WEBHOOK_DISABLED_RETENTION + 1)
+        prune_events(now=later)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+class RequestProfilingTestCase(TestCase):
+    def setUp(self):
+        self.profiles_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profiles_dir.cleanup)
+        overrides = override_settings(PROFILES_DIR=self.profiles_dir.name, PROFILES_MAX_CAPTURES=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.admin = baker.make(User, is_staff=True)
+        baker.make(Team, _quantity=3)
+
+    def test_switch_is_ignored_without_staff(self):
+        """Тест: без переключателя или не администратору профиль не снимается"""
+        self.client.force_login(self.admin)
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/teams/"))
+        self.client.force_login(baker.make(User))
+        response = self.client.get("/api/teams/", {"_profile": "cpu"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(list(Path(self.profiles_dir.name).iterdir()), [])
+        self.assertEqual(self.client.get("/api/profiles/").status_code, 403)
+
+    def test_capture_list_and_download(self):
+        """Тест: снимок cpu и mem по заголовку, сводка и скачивание дампа pstats"""
+        self.client.force_login(self.admin)
+        response = self.client.get("/api/teams/", HTTP_X_PROFILE="cpu,mem")
+        self.assertEqual(response.status_code, 200)
+        capture_id = response["X-Profile-Id"]
+
+        captures = self.client.get("/api/profiles/").json()
+        self.assertEqual([c["id"] for c in captures], [capture_id])
+        self.assertEqual((captures[0]["path"], captures[0]["status"]), ("/api/teams/", 200))
+
+        detail = self.client.get(f"/api/profiles/{capture_id}/").json()
+        self.assertIn("list", detail["cpu_summary"])
+        self.assertTrue(detail["mem_summary"].startswith("Пик:"))
+
+        download = self.client.get(f"/api/profiles/{capture_id}/download/cpu/")
+        dump = Path(self.profiles_dir.name) / "download.prof"
+        dump.write_bytes(b"".join(download.streaming_content))
+        self.assertGreater(pstats.Stats(str(dump)).total_calls, 0)
+        self.assertEqual(self.client.get(f"/api/profiles/{'0' * 32}/").status_code, 404)
+
+    def test_ring_buffer_keeps_latest_captures(self):
+        """Тест: хранятся только PROFILES_MAX_CAPTURES последних снимков"""
+        self.client.force_login(self.admin)
+        ids = [self.client.get("/api/teams/", {"_profile": "cpu"})["X-Profile-Id"] for _ in range(3)]
+        self.assertEqual([c["id"] for c in self.client.get("/api/profiles/").json()], ids[:0:-1])
+        self.assertEqual(len(list(Path(self.profiles_dir.name).iterdir())), 4)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        for target in ("tournaments.metrics.registry", "tournaments.views.registry"):
+            patcher = patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        baker.make(Team, _quantity=2)
+
+    def metrics(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_request_metrics_per_action(self):
+        """Тест: счётчик, гистограммы времени, запросов и размера ответа по действию вьюсета"""
+        self.client.get("/api/teams/")
+        self.client.get("/api/teams/")
+        text = self.metrics()
+        self.assertIn('tournaments_requests_total{method="GET",status="2xx",view="TeamsViewSet.list"} 2', text)
+        self.assertIn('tournaments_request_duration_seconds_count{view="TeamsViewSet.list"} 2', text)
+        self.assertIn('tournaments_request_queries_bucket{view="TeamsViewSet.list",le="+Inf"} 2', text)
+        self.assertIn('tournaments_response_size_bytes_count{view="TeamsViewSet.list"} 2', text)
+        self.assertIn("# TYPE tournaments_request_duration_seconds histogram", text)
+
+    def test_cache_hit_rate(self):
+        """Тест: чтения кеша считаются как попадания и промахи"""
+        cache.get("metrics-test")
+        cache.set("metrics-test", 1)
+        cache.get("metrics-test")
+        cache.get("metrics-test")
+        text = self.metrics()
+        self.assertIn('tournaments_cache_requests_total{cache="default",result="hit"} 2', text)
+        self.assertIn('tournaments_cache_requests_total{cache="default",result="miss"} 1', text)
+
+    def test_processes_are_aggregated_through_files(self):
+        """Тест: /metrics суммирует значения других процессов из METRICS_DIR"""
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            other = MetricsRegistry()
+            other.inc("tournaments_requests_total", {"view": "TeamsViewSet.list", "method": "GET", "status": "2xx"}, 5)
+            other.observe("tournaments_request_duration_seconds", {"view": "TeamsViewSet.list"}, 0.02)
+            other.flush()
+            self.client.get("/api/teams/")
+            text = self.metrics()
+        self.assertIn('tournaments_requests_total{method="GET",status="2xx",view="TeamsViewSet.list"} 6', text)
+        self.assertIn('tournaments_request_duration_seconds_bucket{view="TeamsViewSet.list",le="0.025"}', text)
+        self.assertIn('tournaments_request_duration_seconds_count{view="TeamsViewSet.list"} 2', text)
+
+    def test_registry_is_thread_safe(self):
+        """Тест: параллельные обновления из потоков не теряются"""
+        def work():
+            for _ in range(1000):
+                self.registry.inc("tournaments_requests_total", {"view": "x", "method": "GET", "status": "2xx"})
+                self.registry.observe("tournaments_request_queries", {"view": "x"}, 3)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        text = self.metrics()
+        self.assertIn('tournaments_requests_total{method="GET",status="2xx",view="x"} 8000', text)
+        self.assertIn('tournaments_request_queries_bucket{view="x",le="3.0"} 8000', text)
+
+    def test_metrics_are_not_public(self):
+        """Тест: с чужого адреса /metrics доступен только администратору"""
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.5").status_code, 404)
+
+
+class SlowQueryLogTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        team1, team2 = baker.make(Team, _quantity=2)
+        baker.make(Match, tournament=baker.make(Tournament), team1=team1, team2=team2, _quantity=2)
+
+    def test_fingerprint_drops_values(self):
+        """Тест: отпечаток не зависит от значений и длины списков IN"""
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'x\' LIMIT 21'),
+            fingerprint('SELECT *  FROM "t" WHERE "id" IN (%s) AND "name" = \'yy\' LIMIT 5'),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s) RETURNING "t"."id"'),
+            'INSERT INTO "t" ("a", "b") VALUES (...) RETURNING "t"."id"',
+        )
+        self.assertIn('"team1_id"', fingerprint('SELECT "team1_id" FROM "tournaments_match"'))
+
+    def test_slow_queries_are_logged_with_plan(self):
+        """Тест: запросы дольше порога пишутся с действием, типами параметров и планом; EXPLAIN не считается"""
+        baseline = self.client.get("/api/matches/", {"date_from": "2020-01-01"}).query_count
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0), self.assertLogs("tournaments.slow_queries", "WARNING") as logs:
+            response = self.client.get("/api/matches/", {"date_from": "2020-01-01"})
+        self.assertEqual(response.query_count, baseline)
+
+        records = [json.loads(message.split(":", 2)[2]) for message in logs.output]
+        record = next(r for r in records if r["view"] == "MatchesViewSet.list" and "tournaments_match" in r["fingerprint"])
+        self.assertEqual(record["path"], "/api/matches/")
+        self.assertEqual(record["params_shape"], ["str"])
+        self.assertTrue(any("tournaments_match" in line for line in record["plan"]))
+
+    def test_summary_ranks_fingerprints_by_total_time(self):
+        """Тест: команда slow_queries суммирует записи по отпечаткам, включая ротированные файлы"""
+        def line(fp, duration, view="TeamsViewSet.list"):
+            return json.dumps({"fingerprint": fp, "duration_ms": duration, "view": view, "plan": ["SCAN t"]}) + "\n"
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            path = Path(log_dir) / "slow.log"
+            path.write_text(line("SELECT a", 300) + line("SELECT b", 500), encoding="utf-8")
+            Path(f"{path}.1").write_text(line("SELECT a", 400, "StatsViewSet.list"), encoding="utf-8")
+            out = io.StringIO()
+            call_command("slow_queries", path=str(path), plans=True, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[2].strip(), "SELECT a")
+        self.assertIn("StatsViewSet.list, TeamsViewSet.list", lines[1])
+        self.assertIn("700.0", lines[1])
+        self.assertIn("SCAN t", lines[3])
+
+
+class StartupImportTimeTestCase(SimpleTestCase):
+    def test_parse_importtime(self):
+        """Тест: в сумму входят только модули верхнего уровня"""
+        report = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |     json.decoder\n"
+            "import time:       200 |        300 |   json\n"
+            "import time:        50 |        350 | app.urls\n"
+            "import time:        70 |         70 | tournaments\n"
+        )
+        self.assertEqual(report.total_us, 420)
+        self.assertEqual(report.modules["json"], (200, 300))
+        self.assertEqual(report.top(1), [("json", (200, 300))])
+
+    def test_app_urls_within_budget(self):
+        """Тест: старт воркера (django.setup() и app.urls) укладывается в бюджет без тяжёлых модулей"""
+        report = best_import_time("app.urls")
+        self.assertEqual([name for name in HEAVY_MODULES if name in report.modules], [])
+        self.assertLessEqual(
+            report.total_ms, settings.IMPORT_TIME_BUDGET_MS,
+            f"Импорт при старте {report.total_ms:.0f} мс при бюджете {settings.IMPORT_TIME_BUDGET_MS} мс",
+        )
+
+
+class ConcurrencyLimitTestCase(TestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.lock_dir.cleanup)
+        overrides = override_settings(CONCURRENCY_LOCK_DIR=self.lock_dir.name, CONCURRENCY_LIMITS={
+            "export": {"limit": 1, "timeout": 0},
+            "stats": {"limit": 1, "timeout": 2},
+        })
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        team1, team2 = baker.make(Team, _quantity=2)
+        self.match = baker.make(Match, tournament=baker.make(Tournament), team1=team1, team2=team2)
+
+    def hold(self, cost_class):
+        """Занимает слот так же, как другой процесс: отдельный файловый дескриптор под flock"""
+        import fcntl
+
+        lock_file = open(Path(self.lock_dir.name) / f"{cost_class}.0.lock", "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def test_saturated_class_is_shed_and_cheap_reads_pass(self):
+        """Тест: занятая выгрузка - 503 с Retry-After, дешёвые запросы отвечают"""
+        holder = self.hold("export")
+        response = self.client.get("/api/matches/export-excel/")
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(self.client.get(f"/api/matches/{self.match.id}/").status_code, 200)
+        self.assertEqual(self.client.get("/api/teams/").status_code, 200)
+
+        holder.close()
+        self.assertEqual(self.client.get("/api/matches/export-excel/").status_code, 200)
+        # Слот освобождается после ответа
+        self.assertEqual(self.client.get("/api/matches/export-excel/").status_code, 200)
+
+    def test_rejected_requests_do_not_take_slots(self):
+        """Тест: анонимный и не имеющий прав запрос получают отказ сразу, не дожидаясь слота"""
+        holder = self.hold("stats")
+        self.addCleanup(holder.close)
+        started = time.monotonic()
+        self.assertEqual(APIClient().get("/api/matches/stats/").status_code, 403)
+        self.assertLess(time.monotonic() - started, 1)
+
+        holder = self.hold("export")
+        self.addCleanup(holder.close)
+        client = APIClient()
+        client.force_authenticate(baker.make(User))
+        tournament = baker.make(Tournament, start_date="2024-03-01", end_date="2024-03-10")
+        response = client.post(f"/api/tournaments/{tournament.id}/schedule/", {}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_request_waits_for_slot(self):
+        """Тест: запрос ждёт освобождения слота в пределах timeout класса"""
+        holder = self.hold("stats")
+        threading.Timer(0.2, holder.close).start()
+        started = time.monotonic()
+        response = self.client.get("/api/matches/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_limit_adapts_to_latency(self):
+        """Тест: медленные запросы уменьшают число слотов, быстрые - возвращают"""
+        limiter = ConcurrencyLimiter("test", limit=4, target=0.1)
+        limiter.observe(1.0)
+        limiter.observe(1.0)
+        self.assertEqual(limiter.limit, 2)
+        slots = [limiter.acquire(), limiter.acquire()]
+        self.assertIsNone(limiter.acquire())
+        for slot in slots:
+            limiter.slots.release(slot)
+        for _ in range(20):
+            limiter.observe(0.01)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.retry_after(), 1)
+
+
+@override_settings(FORECAST_SIMULATIONS=4000, FORECAST_PROCESSES=1)
+class TournamentForecastTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User))
+        self.strong, self.middle, self.weak = baker.make(Team, _quantity=3)
+        past = timezone.now() - timedelta(days=30)
+        # История другого турнира: strong обыгрывает всех, middle обыгрывает weak
+        history = baker.make(Tournament)
+        for _ in range(5):
+            baker.make(Match, tournament=history, team1=self.strong, team2=self.middle, match_date=past, team1_score=2, team2_score=0)
+            baker.make(Match, tournament=history, team1=self.strong, team2=self.weak, match_date=past, team1_score=3, team2_score=1)
+            baker.make(Match, tournament=history, team1=self.middle, team2=self.weak, match_date=past, team1_score=1, team2_score=0)
+        self.tournament = baker.make(Tournament)
+        self.played = baker.make(
+            Match, tournament=self.tournament, team1=self.middle, team2=self.weak,
+            match_date=timezone.now() - timedelta(days=1), team1_score=1, team2_score=1,
+        )
+        future = timezone.now() + timedelta(days=7)
+        self.fixture = baker.make(Match, tournament=self.tournament, team1=self.weak, team2=self.strong, match_date=future)
+        baker.make(Match, tournament=self.tournament, team1=self.strong, team2=self.middle, match_date=future)
+        baker.make(Match, tournament=self.tournament, team1=self.middle, team2=self.weak, match_date=future)
+
+    def test_forecast_favours_stronger_team(self):
+        """Тест: вероятности в сумме дают 1, сильная команда - фаворит матча и турнира"""
+        response = self.client.get(f"/api/tournaments/{self.tournament.id}/forecast/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["played"], data["remaining"], data["simulations"]), (1, 3, 4000))
+        self.assertAlmostEqual(sum(team["win_probability"] for team in data["teams"]), 1, places=3)
+        self.assertEqual(data["teams"][0]["team"], self.strong.id)
+        points = {team["team"]: team["points"] for team in data["teams"]}
+        self.assertEqual(points, {self.strong.id: 0, self.middle.id: 1, self.weak.id: 1})
+
+        match = next(match for match in data["matches"] if match["id"] == self.fixture.id)
+        self.assertAlmostEqual(match["team1_win"] + match["draw"] + match["team2_win"], 1, places=3)
+        self.assertGreater(match["team2_win"], match["team1_win"])
+
+    def test_forecast_is_cached_until_match_result_changes(self):
+        """Тест: повторный запрос берёт прогноз из кеша, изменение счёта его обновляет"""
+        url = f"/api/tournaments/{self.tournament.id}/forecast/"
+        first = self.client.get(url).json()
+        self.assertEqual(self.client.get(url).json()["generated_at"], first["generated_at"])
+
+        self.played.team1_score = 2
+        self.played.save()
+        refreshed = self.client.get(url).json()
+        self.assertNotEqual(refreshed["generated_at"], first["generated_at"])
+        points = {team["team"]: team["points"] for team in refreshed["teams"]}
+        self.assertEqual((points[self.middle.id], points[self.weak.id]), (3, 0))
+
+    def test_simulation_memory_bounded_by_chunk_cells(self):
+        """Тест: пик памяти симуляции задаётся числом ячеек блока и не растёт с числом матчей"""
+        import tracemalloc
+
+        import numpy as np
+
+        peaks = []
+        for teams in (16, 64):
+            pairs = [pair for pairs in round_robin(list(range(teams)), legs=2) for pair in pairs]
+            home, away = (np.array(side) for side in zip(*pairs))
+            tracemalloc.start()
+            titles, _ = simulate(np.zeros(teams), home, away, np.full(len(pairs), 0.45), 0.1, 500, 1, 100000)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            self.assertEqual(titles.sum(), 500)
+        # 240 и 4032 матча: около 30 байт на ячейку блока в обоих случаях
+        self.assertLess(max(peaks), 100000 * 40)
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+
+    def test_simulation_shards_across_processes(self):
+        """Тест: прогоны делятся между процессами, итоги суммируются"""
+        forecast = build_forecast(self.tournament, simulations=3001, processes=2, seed=7)
+        self.assertEqual(forecast["simulations"], 3001)
+        self.assertAlmostEqual(sum(team["win_probability"] for team in forecast["teams"]), 1, places=3)
+        self.assertEqual(forecast["teams"][0]["team"], self.strong.id)
+
+
+class TournamentScheduleTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(baker.make(User, is_staff=True))
+        self.teams = [team.id for team in baker.make(Team, _quantity=8)]
+        # Турнир в прошлом: созданные туры сразу считаются сыгранными
+        today = timezone.localdate()
+        self.tournament = baker.make(Tournament, start_date=today - timedelta(days=30), end_date=today - timedelta(days=2))
+
+    def schedule(self, **data):
+        return self.client.post(f"/api/tournaments/{self.tournament.id}/schedule/", data, format="json")
+
+    def play(self, matches, winners):
+        """Проставляет победителей созданного тура: winners - id команд или None для ничьей"""
+        for match, winner in zip(matches, winners):
+            team1_score, team2_score = (1, 1) if winner is None else (2, 0) if winner == match["team1"] else (0, 2)
+            Match.objects.filter(id=match["id"]).update(team1_score=team1_score, team2_score=team2_score, winner_id=winner)
+
+    def test_round_robin_creates_every_pair_across_tournament_dates(self):
+        """Тест: круговая система - каждая пара один раз, туры от start_date до end_date"""
+        response = self.schedule(format="round_robin", teams=self.teams[:5])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data["created"], data["total_rounds"], data["rounds"]), (10, 5, [1, 2, 3, 4, 5]))
+        pairs = {frozenset((match["team1"], match["team2"])) for match in data["matches"]}
+        self.assertEqual(len(pairs), 10)
+        dates = sorted(Match.objects.filter(tournament=self.tournament).values_list("match_date", flat=True))
+        self.assertEqual(timezone.localtime(dates[0]).date(), self.tournament.start_date)
+        self.assertEqual(timezone.localtime(dates[-1]).date(), self.tournament.end_date)
+        self.assertEqual(ChangeLog.objects.filter(model="match").count(), 10)
+        self.assertEqual(WebhookEvent.objects.filter(event_type="match.created").count(), 10)
+
+        self.assertEqual(self.schedule(format="round_robin", teams=self.teams[:5]).status_code, 400)
+        self.assertEqual(self.schedule(format="round_robin", teams=self.teams[:5], legs=2).status_code, 400)
+
+    def test_schedule_requires_admin_and_valid_teams(self):
+        """Тест: расписание создаёт только администратор, команды проверяются"""
+        self.assertEqual(self.schedule(format="swiss", teams=[self.teams[0], self.teams[0]]).status_code, 400)
+        self.assertEqual(self.schedule(format="swiss", teams=[self.teams[0], 0]).status_code, 400)
+        self.client.force_authenticate(baker.make(User))
+        self.assertEqual(self.schedule(format="swiss", teams=self.teams).status_code, 403)
+        self.assertFalse(Match.objects.exists())
+
+    def test_swiss_pairs_by_score_without_rematches(self):
+        """Тест: швейцарская система - следующий тур по очкам и без повторных встреч"""
+        first = self.schedule(format="swiss", teams=self.teams, rounds=3).json()
+        self.assertEqual((first["rounds"], first["created"]), ([1], 4))
+        # Первый тур: посев 1-2, 3-4, ...; побеждают первые номера пар
+        self.play(first["matches"], [min(m["team1"], m["team2"], key=self.teams.index) for m in first["matches"]])
+
+        second = self.schedule(format="swiss", teams=self.teams, rounds=3).json()
+        self.assertEqual(second["rounds"], [2])
+        winners = {self.teams[0], self.teams[2], self.teams[4], self.teams[6]}
+        played = {frozenset((m["team1"], m["team2"])) for m in first["matches"]}
+        for match in second["matches"]:
+            self.assertNotIn(frozenset((match["team1"], match["team2"])), played)
+            self.assertEqual(match["team1"] in winners, match["team2"] in winners)
+
+        self.play(second["matches"], [None] * 4)
+        self.assertEqual(self.schedule(format="swiss", teams=self.teams, rounds=3).status_code, 201)
+        self.assertEqual(self.schedule(format="swiss", teams=self.teams, rounds=3).status_code, 400)
+
+    def test_swiss_pairing_scales_to_hundreds_of_teams(self):
+        """Тест: 300 команд, 8 туров без повторных встреч"""
+        teams = list(range(1, 301))
+        results = []
+        for number in range(1, 9):
+            round_number, pairs = swiss_round(teams, results, 8)
+            self.assertEqual((round_number, len(pairs)), (number, 150))
+            results += [(home, away, min(home, away), True) for home, away in pairs]
+        self.assertEqual(len({frozenset(result[:2]) for result in results}), len(results))
+
+    def test_bracket_gives_byes_to_top_seeds_and_advances_winners(self):
+        """Тест: сетка на 6 команд - первые посевы без игры, следующий тур из победителей"""
+        teams = self.teams[:6]
+        first = self.schedule(format="bracket", teams=teams).json()
+        self.assertEqual((first["rounds"], first["total_rounds"]), ([1], 3))
+        pairs = {frozenset((m["team1"], m["team2"])) for m in first["matches"]}
+        self.assertEqual(pairs, {frozenset((teams[3], teams[4])), frozenset((teams[2], teams[5]))})
+        # Второй тур нельзя составить, пока нет победителей
+        self.play(first["matches"], [None, None])
+        self.assertEqual(self.schedule(format="bracket", teams=teams).status_code, 400)
+
+        winners = {frozenset((teams[3], teams[4])): teams[4], frozenset((teams[2], teams[5])): teams[2]}
+        self.play(first["matches"], [winners[frozenset((m["team1"], m["team2"]))] for m in first["matches"]])
+        second = self.schedule(format="bracket", teams=teams).json()
+        self.assertEqual(second["rounds"], [2])
+        pairs = {frozenset((m["team1"], m["team2"])) for m in second["matches"]}
+        self.assertEqual(pairs, {frozenset((teams[0], teams[4])), frozenset((teams[1], teams[2]))})
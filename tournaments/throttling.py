@@ -0,0 +1,133 @@
+import hashlib
+import math
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Корзины блокируются по полосам: файлов блокировок не больше LOCK_STRIPES при любом числе ключей
+LOCK_STRIPES = 64
+thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60): ёмкость корзины и за сколько секунд она наполняется полностью"""
+    if rate is None:
+        return None, None
+    number, period = rate.split("/")
+    return int(number), PERIODS[period[0]]
+
+
+@contextmanager
+def bucket_lock(key):
+    """
+    Блокировка корзины на время чтения и записи: потоки процесса - threading.Lock,
+    процессы - flock на THROTTLE_LOCK_DIR/throttle.<полоса>.lock
+    """
+    stripe = zlib.crc32(key.encode()) % LOCK_STRIPES
+    with thread_locks[stripe]:
+        lock_dir = settings.THROTTLE_LOCK_DIR
+        if not lock_dir or fcntl is None:
+            yield
+            return
+        os.makedirs(lock_dir, exist_ok=True)
+        fd = os.open(os.path.join(lock_dir, f"throttle.{stripe}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Корзина токенов в кеше: позволяет всплеск до ёмкости корзины, дальше - не чаще
+    заданной скорости. Проверяется в initial() до вызова действия, то есть до
+    authenticate() и хеширования пароля. Кеш throttle должен быть общим для всех
+    воркеров (в production - файловый), иначе лимит умножается на число процессов.
+    """
+    scope = None
+    cache_alias = "throttle"
+
+    def __init__(self):
+        self.capacity, self.period = parse_rate(settings.LOGIN_THROTTLE_RATES.get(self.scope))
+        self.wait_seconds = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError(".get_cache_key() must be overridden")
+
+    def make_key(self, ident):
+        digest = hashlib.sha256(str(ident).encode()).hexdigest()
+        return f"throttle_{self.scope}_{digest}"
+
+    def allow_request(self, request, view):
+        if self.capacity is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        refill = self.capacity / self.period
+        # Без блокировки параллельные запросы прочитали бы одну корзину и потратили один токен дважды
+        with bucket_lock(key):
+            now = time.time()
+            tokens, updated = self.cache.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * refill)
+            if tokens < 1:
+                self.wait_seconds = (1 - tokens) / refill
+                return False
+            self.cache.set(key, (tokens - 1, now), math.ceil(self.period))
+            return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.make_key(self.get_ident(request))
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    scope = "login_username"
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username")
+        if not username:
+            return None
+        return self.make_key(str(username).lower())
+
+
+class TotpUserThrottle(TokenBucketThrottle):
+    scope = "totp_user"
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+        return self.make_key(request.user.pk)
+
+
+class TotpIPThrottle(TokenBucketThrottle):
+    scope = "totp_ip"
+
+    def get_cache_key(self, request, view):
+        return self.make_key(self.get_ident(request))
@@ -0,0 +1,212 @@
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .changes import record_changes
+from .db import retry_on_locked
+from .events import hub, match_payload
+from .models import Team, Tournament, Match, ArchivedMatch
+from .webhooks import record_events, tournament_payload
+from .serializers import TeamsFeedSerializer, TournamentsFeedSerializer, MatchesFeedSerializer
+
+# Идемпотентная запись пачек из внешних лент результатов по external_id:
+# один запрос на поиск существующих записей (и по одному на каждую таблицу ссылок),
+# затем bulk_create для новых и bulk_update для изменившихся. Строки без изменений
+# ничего не пишут, поэтому повторная отправка той же пачки не стоит ни одной записи.
+
+
+@dataclass
+class UpsertResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+
+class Upsert:
+    model = None
+    serializer_class = None
+    # Поля модели, которыми управляет лента
+    fields = []
+    # Поля строки со ссылками по внешнему ID: поле -> модель
+    references = {}
+
+    def __init__(self, rows):
+        if not isinstance(rows, list):
+            raise ValidationError("Ожидается список записей")
+        if len(rows) > settings.UPSERT_MAX_BATCH:
+            raise ValidationError(f"Не больше {settings.UPSERT_MAX_BATCH} записей за запрос")
+        self.rows = rows
+        self.result = UpsertResult()
+
+    def add_error(self, index, row, errors):
+        external_id = row.get("external_id") if isinstance(row, dict) else None
+        self.result.errors.append({"index": index, "external_id": external_id, "errors": errors})
+
+    def validate(self):
+        """Проверяет строки; при повторе external_id в пачке побеждает последняя строка"""
+        valid = {}
+        for index, row in enumerate(self.rows):
+            serializer = self.serializer_class(data=row)
+            if not serializer.is_valid():
+                self.add_error(index, row, dict(serializer.errors))
+                continue
+            data = serializer.validated_data
+            valid[data["external_id"]] = (index, row, data)
+        return valid
+
+    def resolve_references(self, valid):
+        keys = {}
+        for name, model in self.references.items():
+            keys.setdefault(model, set()).update(data[name] for _, _, data in valid.values() if data.get(name))
+        return {
+            model: dict(model.objects.filter(external_id__in=model_keys).values_list("external_id", "id"))
+            for model, model_keys in keys.items() if model_keys
+        }
+
+    def build(self, data, lookups):
+        """Значения полей модели из строки; ValueError - ссылка не найдена"""
+        values = {name: data[name] for name in self.fields if name in data}
+        for name, model in self.references.items():
+            key = data.get(name)
+            if key is None:
+                values[f"{name}_id"] = None
+                continue
+            if key not in lookups.get(model, {}):
+                raise ValueError(f"{name}: {model._meta.verbose_name} с external_id {key!r} не найден(а)")
+            values[f"{name}_id"] = lookups[model][key]
+        return values
+
+    def skipped_keys(self, keys):
+        return set()
+
+    def run(self):
+        valid = self.validate()
+        lookups = self.resolve_references(valid)
+        self.validation_errors = len(self.result.errors)
+        created, updated = self.write(valid, lookups)
+        self.result.created = len(created)
+        self.result.updated = len(updated)
+        return self.result
+
+    def plan(self, valid, lookups):
+        """Делит строки на новые и изменившиеся по текущему состоянию таблицы"""
+        # При повторе транзакции план строится заново: сбрасываем то, что насчитала прошлая попытка
+        self.result.unchanged = self.result.skipped = 0
+        del self.result.errors[self.validation_errors:]
+        existing = {obj.external_id: obj for obj in self.model.objects.filter(external_id__in=list(valid))}
+        skipped = self.skipped_keys(set(valid) - set(existing))
+
+        created, updated = [], []
+        for external_id, (index, row, data) in valid.items():
+            if external_id in skipped:
+                self.result.skipped += 1
+                continue
+            try:
+                values = self.build(data, lookups)
+            except ValueError as e:
+                self.add_error(index, row, [str(e)])
+                continue
+            obj = existing.get(external_id)
+            if obj is None:
+                created.append(self.model(external_id=external_id, **values))
+                continue
+            changed = {name: value for name, value in values.items() if getattr(obj, name) != value}
+            if not changed:
+                self.result.unchanged += 1
+                continue
+            previous = {name: getattr(obj, name) for name in values}
+            for name, value in changed.items():
+                setattr(obj, name, value)
+            updated.append((obj, previous))
+        return created, updated
+
+    @retry_on_locked
+    def write(self, valid, lookups):
+        """
+        Поиск существующих записей и запись - в одной транзакции: повтор той же пачки
+        параллельным запросом видит уже вставленные строки. Если вставка всё же
+        пересеклась с чужой (другая СУБД, уровень изоляции), конфликт по external_id
+        становится обновлением, а не IntegrityError.
+        """
+        created, updated = self.plan(valid, lookups)
+        if created:
+            self.model.objects.bulk_create(
+                created, update_conflicts=True, unique_fields=["external_id"], update_fields=self.update_fields(),
+            )
+        if updated:
+            self.model.objects.bulk_update([obj for obj, _ in updated], self.update_fields())
+        record_changes(self.model, [obj.pk for obj in created] + [obj.pk for obj, _ in updated])
+        self.after_write(created, updated)
+        return created, updated
+
+    def update_fields(self):
+        return self.fields + [f"{name}_id" for name in self.references]
+
+    def after_write(self, created, updated):
+        pass
+
+
+class TeamUpsert(Upsert):
+    model = Team
+    serializer_class = TeamsFeedSerializer
+    fields = ["name"]
+
+
+class TournamentUpsert(Upsert):
+    model = Tournament
+    serializer_class = TournamentsFeedSerializer
+    fields = ["name", "start_date", "end_date"]
+
+    def after_write(self, created, updated):
+        record_events(
+            [("tournament.created", tournament_payload(obj)) for obj in created]
+            + [("tournament.updated", tournament_payload(obj)) for obj, _ in updated]
+        )
+
+
+class MatchUpsert(Upsert):
+    model = Match
+    serializer_class = MatchesFeedSerializer
+    fields = ["match_date", "team1_score", "team2_score"]
+    references = {"tournament": Tournament, "team1": Team, "team2": Team}
+
+    def build(self, data, lookups):
+        values = super().build(data, lookups)
+        # bulk-операции не вызывают Match.save(), победитель считается здесь
+        if values["team1_score"] > values["team2_score"]:
+            values["winner_id"] = values["team1_id"]
+        elif values["team2_score"] > values["team1_score"]:
+            values["winner_id"] = values["team2_id"]
+        else:
+            values["winner_id"] = None
+        return values
+
+    def update_fields(self):
+        return super().update_fields() + ["winner_id"]
+
+    def skipped_keys(self, keys):
+        # Матчи, уже перенесённые в архив, не создаются заново
+        if not keys:
+            return set()
+        return set(ArchivedMatch.objects.filter(external_id__in=keys).values_list("external_id", flat=True))
+
+    def after_write(self, created, updated):
+        # Сигналы post_save при bulk-операциях не срабатывают: события ленты и вебхуков отправляем сами
+        events = [("match.created", match_payload(match)) for match in created]
+        for match, previous in updated:
+            scores_changed = (previous["team1_score"], previous["team2_score"]) != (match.team1_score, match.team2_score)
+            events.append(("match.score" if scores_changed else "match.updated", match_payload(match)))
+
+        if events:
+            record_events(events)
+
+        def publish():
+            for event_type, data in events:
+                hub.publish(event_type, data)
+
+        if events:
+            transaction.on_commit(publish)
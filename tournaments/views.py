@@ -1,4 +1,17 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
 from django.views.generic import TemplateView
+from .metrics import registry, render_prometheus
 from .models import Tournament, Match
 
 class ShowTournamentsView(TemplateView):
@@ -8,4 +21,136 @@ class ShowTournamentsView(TemplateView):
         context = super().get_context_data(**kwargs)
         context['tournaments'] = Tournament.objects.all()
         context['matches'] = Match.objects.all()
-        return context
\ No newline at end of file
+        return context
+
+
+# Имена файлов из ContentAddressedStorage: содержимое по такому имени никогда не меняется
+HASHED_NAME = re.compile(r"(?:^|/)([0-9a-f]{64})\.[\w]+$")
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном. Возвращает (start, end) включительно,
+    None - если заголовка нет или он не поддерживается, и False - если диапазон невыполним.
+    """
+    match = RANGE_HEADER.match(header or "")
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500: последние 500 байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Отдаёт файлы из MEDIA_ROOT с валидаторами кеша (ETag, Last-Modified), условными
+    запросами и диапазонами байт. При MEDIA_ACCEL = "x-accel-redirect" или "x-sendfile"
+    сами байты отдаёт фронтовой прокси, а приложение только проверяет запрос.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Файл не найден")
+    if any(part.startswith(".") for part in path.split("/")) or not os.path.isfile(full_path):
+        raise Http404("Файл не найден")
+
+    stat = os.stat(full_path)
+    hashed = HASHED_NAME.search(path)
+    etag = f'"{hashed.group(1)}"' if hashed else f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        set_cache_headers(not_modified, etag, last_modified, hashed)
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+    accel = settings.MEDIA_ACCEL
+
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        if accel == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + quote(path)
+        else:
+            response["X-Sendfile"] = full_path
+    else:
+        byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+        if byte_range and not if_range_matches(request, etag, last_modified):
+            byte_range = None
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                read_range(full_path, start, length) if request.method == "GET" else [],
+                status=206, content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(length)
+        else:
+            response = FileResponse(open(full_path, "rb"), content_type=content_type)
+            response["Content-Length"] = str(stat.st_size)
+        response["Accept-Ranges"] = "bytes"
+
+    if encoding:
+        response["Content-Encoding"] = encoding
+    set_cache_headers(response, etag, last_modified, hashed)
+    return response
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def set_cache_headers(response, etag, last_modified, hashed):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if hashed:
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+
+@require_safe
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus"""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        raise Http404
+    return HttpResponse(
+        render_prometheus(registry.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
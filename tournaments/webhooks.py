@@ -0,0 +1,212 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Вебхуки по transactional outbox: сигналы матчей и турниров пишут WebhookEvent в транзакции
+# изменения, воркер deliver_webhooks после коммита рассылает события пачками по подписке.
+# Каждая подписка хранит курсор - id последнего доставленного события, поэтому порядок
+# событий сохраняется, а упавшая пачка повторяется целиком (получатель дедуплицирует по id).
+
+
+def date_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def tournament_payload(tournament):
+    return {
+        "id": tournament.id,
+        "name": tournament.name,
+        "category": tournament.category_id,
+        "start_date": date_value(tournament.start_date),
+        "end_date": date_value(tournament.end_date),
+    }
+
+
+def event_row(event_type, data):
+    WebhookEvent = apps.get_model("tournaments", "WebhookEvent")
+    tournament_id = data["id"] if event_type.startswith("tournament.") else data.get("tournament")
+    return WebhookEvent(event_type=event_type, tournament_id=tournament_id, payload=data)
+
+
+def record_event(event_type, data):
+    """Кладёт событие в очередь вебхуков; вызывать внутри транзакции изменения"""
+    event_row(event_type, data).save()
+
+
+def record_events(events):
+    """То же для bulk-операций: events - список (тип, данные)"""
+    WebhookEvent = apps.get_model("tournaments", "WebhookEvent")
+    WebhookEvent.objects.bulk_create([event_row(event_type, data) for event_type, data in events])
+
+
+def sign(secret, timestamp, body):
+    return hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+
+
+def signature_header(secret, body, timestamp=None):
+    """Заголовок X-Webhook-Signature: t=<unix time>,v1=<HMAC-SHA256 от "t." + тело>"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return f"t={timestamp},v1={sign(secret, timestamp, body)}"
+
+
+def claim_batches(now, limit):
+    """
+    Берёт подписки, которым пора отправлять, и собирает для каждой пачку событий.
+    Подписка захватывается сдвигом next_attempt_at, чтобы её не взял второй воркер.
+    За проход берётся не больше WEBHOOK_HOST_CONCURRENCY пачек на хост и WEBHOOK_WORKERS всего:
+    каждая захваченная пачка отправляется сразу, без очереди, и аренда WEBHOOK_TIMEOUT * 2
+    покрывает всю её доставку. Остальные подписки хоста ждут следующего прохода.
+    """
+    WebhookSubscription = apps.get_model("tournaments", "WebhookSubscription")
+    WebhookEvent = apps.get_model("tournaments", "WebhookEvent")
+    latest = WebhookEvent.objects.aggregate(cursor=Max("id"))["cursor"] or 0
+    lease = now + timedelta(seconds=settings.WEBHOOK_TIMEOUT * 2)
+    batches = []
+    hosts = Counter()
+    subscriptions = WebhookSubscription.objects.filter(
+        active=True, next_attempt_at__lte=now, cursor__lt=latest,
+    ).order_by("next_attempt_at")[:limit]
+    for subscription in subscriptions:
+        if len(batches) >= settings.WEBHOOK_WORKERS:
+            break
+        host = urlsplit(subscription.url).netloc
+        if hosts[host] >= settings.WEBHOOK_HOST_CONCURRENCY:
+            continue
+        # Верхняя граница latest: события, записанные после начала прохода, дождутся следующего
+        events = WebhookEvent.objects.filter(id__gt=subscription.cursor, id__lte=latest).order_by("id")
+        if subscription.event_types:
+            events = events.filter(event_type__in=subscription.event_types)
+        if subscription.tournament_id:
+            events = events.filter(tournament_id=subscription.tournament_id)
+        events = list(events[:settings.WEBHOOK_BATCH_SIZE])
+        if not events:
+            # Подходящих событий нет - курсор просто догоняет очередь
+            WebhookSubscription.objects.filter(id=subscription.id, cursor=subscription.cursor).update(cursor=latest)
+            continue
+        claimed = WebhookSubscription.objects.filter(
+            id=subscription.id, next_attempt_at=subscription.next_attempt_at,
+        ).update(next_attempt_at=lease)
+        if claimed:
+            hosts[host] += 1
+            batches.append((subscription, events))
+    return batches
+
+
+def batch_body(subscription, events):
+    return json.dumps({
+        "subscription": subscription.id,
+        "events": [
+            {
+                "id": event.id,
+                "type": event.event_type,
+                "created_at": event.created_at.isoformat(),
+                "data": event.payload,
+            }
+            for event in events
+        ],
+    }, ensure_ascii=False).encode()
+
+
+def post_batch(subscription, events):
+    """Отправляет пачку; возвращает None при ответе 2xx, иначе текст ошибки"""
+    # urllib.request (с http.client и ssl) нужен только воркеру deliver_webhooks
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    body = batch_body(subscription, events)
+    request = Request(subscription.url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "User-Agent": "tournaments-webhooks",
+        "X-Webhook-Signature": signature_header(subscription.secret, body),
+        # Одинаков при повторе той же пачки
+        "X-Webhook-Delivery": f"{subscription.id}-{events[0].id}-{events[-1].id}",
+    })
+    try:
+        with urlopen(request, timeout=settings.WEBHOOK_TIMEOUT) as response:
+            response.read()
+    except HTTPError as e:
+        return f"HTTP {e.code}"
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def retry_delay(attempts):
+    return min(settings.WEBHOOK_RETRY_DELAY * 2 ** (attempts - 1), settings.WEBHOOK_MAX_RETRY_DELAY)
+
+
+def record_result(subscription, events, error):
+    WebhookSubscription = apps.get_model("tournaments", "WebhookSubscription")
+    now = timezone.now()
+    if error is None:
+        WebhookSubscription.objects.filter(id=subscription.id).update(
+            cursor=events[-1].id, attempts=0, last_error="", next_attempt_at=now,
+        )
+        return
+    attempts = subscription.attempts + 1
+    logger.warning("Вебхук %s: ошибка доставки (попытка %s): %s", subscription.url, attempts, error)
+    WebhookSubscription.objects.filter(id=subscription.id).update(
+        attempts=attempts, last_error=error,
+        next_attempt_at=now + timedelta(seconds=retry_delay(attempts)),
+        # После WEBHOOK_MAX_ATTEMPTS неудач подряд подписка отключается, события ждут её включения
+        active=attempts < settings.WEBHOOK_MAX_ATTEMPTS,
+    )
+
+
+def deliver_pending(limit=100):
+    """
+    Один проход воркера: пачки разных подписок отправляются параллельно,
+    не больше WEBHOOK_HOST_CONCURRENCY одновременно на один хост (см. claim_batches).
+    Возвращает (доставлено пачек, с ошибкой).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    batches = claim_batches(timezone.now(), limit)
+    if not batches:
+        return 0, 0
+
+    # Потоки только отправляют HTTP-запросы, все записи в БД - в основном потоке
+    with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+        futures = [(subscription, events, pool.submit(post_batch, subscription, events)) for subscription, events in batches]
+        results = [(subscription, events, future.result()) for subscription, events, future in futures]
+
+    failed = 0
+    for subscription, events, error in results:
+        record_result(subscription, events, error)
+        failed += error is not None
+    return len(results) - failed, failed
+
+
+def prune_events(now=None):
+    """
+    Удаляет события, которые уже получили все активные подписки. Отключённая подписка
+    удерживает недоставленные события не дольше WEBHOOK_DISABLED_RETENTION секунд,
+    иначе одна отключённая подписка навсегда останавливала бы очистку очереди.
+    """
+    WebhookSubscription = apps.get_model("tournaments", "WebhookSubscription")
+    WebhookEvent = apps.get_model("tournaments", "WebhookEvent")
+    now = timezone.now() if now is None else now
+    if WebhookSubscription.objects.filter(active=True).exists():
+        cursor = WebhookSubscription.objects.filter(active=True).aggregate(cursor=Min("cursor"))["cursor"]
+    else:
+        cursor = WebhookEvent.objects.aggregate(cursor=Max("id"))["cursor"]
+    if not cursor:
+        return 0
+    events = WebhookEvent.objects.filter(id__lte=cursor)
+    disabled = WebhookSubscription.objects.filter(active=False).aggregate(cursor=Min("cursor"))["cursor"]
+    if disabled is not None and disabled < cursor:
+        expired = now - timedelta(seconds=settings.WEBHOOK_DISABLED_RETENTION)
+        events = events.filter(Q(id__lte=disabled) | Q(created_at__lt=expired))
+    return events.delete()[0]